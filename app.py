@@ -1,55 +1,39 @@
 from flask import Flask, render_template, request, redirect, url_for, jsonify, send_file
 import json
 import os
+import tempfile
 from datetime import datetime
-from db_connection import get_connection
+from io import BytesIO
+import db_connection
+from db_connection import get_connection, escribir, solo_lectura
 from modules.color_manager import ColorManager
 from modules.bag_designer import BagDesigner
 from modules.inventory_manager import InventoryManager
+from modules.bom_manager import BOMManager
 from modules.quotation_manager import QuotationManager
 from modules.orders_manager import OrdersManager
+from modules.payments_manager import PaymentsManager
+from modules.search_manager import SearchManager
+from modules.reference_cache import ReferenceCache
+from modules.pricing_manager import PricingManager
+from modules.cost_manager import CostManager
+from modules.pdf_renderer import DocumentoPDF
+from modules.export_manager import ExportManager, MIMETYPE_EXCEL, MIMETYPE_PDF, MIMETYPE_ZIP
+from modules.invoice_manager import InvoiceManager
+from modules.jobs_manager import JobsManager
 from modules.backup_manager import BackupManager
+from modules.migraciones import aplicar_migraciones
+from modules.paginacion import limitar_tamano, decodificar_cursor, paginar
+from modules import sql_monitor
 
 app = Flask(__name__)
+db_connection.init_app(app)
+sql_monitor.init_app(app)
 
-# ==================== FUNCIÓN HELPER PARA PDFs ====================
-def dibujar_encabezado_pdf(c, width, height, titulo_documento="Documento"):
-    """
-    Dibuja el encabezado estándar en los PDFs con logo y título del sistema
-    """
-    from reportlab.lib.utils import ImageReader
-    
-    # Ruta del logo
-    logo_path = os.path.join(app.static_folder, 'images', 'logo_.png')
-    
-    # Dibujar logo si existe - ESQUINA SUPERIOR IZQUIERDA
-    if os.path.exists(logo_path):
-        try:
-            # Logo en la esquina superior izquierda (80x80 px)
-            c.drawImage(logo_path, 40, height - 100, width=80, height=80, preserveAspectRatio=True, mask='auto')
-        except:
-            pass
-    
-    # Título del sistema - CENTRADO
-    c.setFont("Helvetica-Bold", 14)
-    c.drawCentredString(width / 2, height - 50, "Sistema Integral de Gestión")
-    c.drawCentredString(width / 2, height - 68, "para Confeccionistas de Bolsas")
-    
-    # Marca ChromaBags - CENTRADO
-    c.setFont("Helvetica-Bold", 20)
-    c.drawCentredString(width / 2, height - 95, "CHROMABAGS")
-    
-    # Línea divisoria
-    c.setStrokeColorRGB(0.7, 0.3, 0.5)  # Color morado/rosa
-    c.setLineWidth(2)
-    c.line(40, height - 110, width - 40, height - 110)
-    
-    # Título del documento - Alineado a la izquierda
-    c.setFont("Helvetica-Bold", 16)
-    c.setFillColorRGB(0, 0, 0)
-    c.drawString(40, height - 140, titulo_documento)
-    
-    return height - 160  # Retorna la posición Y donde puede empezar el contenido
+try:
+    aplicar_migraciones()
+except Exception as e:
+    print(f"⚠️  Error aplicando migraciones: {e}")
 
 # Página principal
 @app.route('/')
@@ -57,22 +41,72 @@ def index():
     return redirect(url_for('clientes'))
 
 # ==================== CLIENTES ====================
-@app.route('/clientes')
-def clientes():
+def _consultar_clientes(limite=None, despues=None):
+    """Clientes por id ascendente; despues es el id_cliente del último de la página anterior"""
     conn = get_connection()
     clientes_data = []
     if conn:
         cursor = conn.cursor()
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT nombre_cliente, telefono, correo, tipo_cliente, direccion, id_cliente,
                    rfc, razon_social, uso_cfdi, regimen_fiscal, correo_facturacion
             FROM clientes 
-            ORDER BY id_cliente;
-        """)
+            {'WHERE id_cliente > ?' if despues is not None else ''}
+            ORDER BY id_cliente
+            LIMIT ?;
+        """, ([despues] if despues is not None else []) + [limite or -1])
         clientes_data = cursor.fetchall()
         cursor.close()
         conn.close()
-    return render_template('clientes.html', clientes=clientes_data)
+    return clientes_data
+
+def _pagina_clientes():
+    tamano = limitar_tamano(request.args.get('tamano'))
+    despues = decodificar_cursor(request.args.get('despues'), 1)
+    filas = _consultar_clientes(tamano + 1, despues[0] if despues else None)
+    return paginar(filas, tamano, lambda c: (c[5],)), tamano
+
+@app.route('/clientes')
+def clientes():
+    pagina, tamano = _pagina_clientes()
+    return render_template('clientes.html', clientes=pagina['items'],
+                           siguiente=pagina['siguiente'], tamano=tamano)
+
+@app.route('/api/clientes')
+def api_clientes():
+    pagina, tamano = _pagina_clientes()
+    return jsonify({'items': [dict(c) for c in pagina['items']],
+                    'siguiente': pagina['siguiente'], 'tamano': tamano})
+
+def _insertar_cliente(nombre, telefono, correo, tipo, direccion,
+                      rfc, razon_social, uso_cfdi, regimen_fiscal, correo_facturacion):
+    conn = get_connection()
+    if not conn:
+        return {'success': False, 'error': 'Error de conexión a BD'}
+
+    cursor = conn.cursor()
+    # Verificar si la tabla tiene las columnas fiscales, si no, crearlas
+    try:
+        cursor.execute("""
+            INSERT INTO clientes (
+                nombre_cliente, telefono, correo, tipo_cliente, direccion,
+                rfc, razon_social, uso_cfdi, regimen_fiscal, correo_facturacion
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+        """, (nombre, telefono, correo, tipo, direccion, 
+              rfc, razon_social, uso_cfdi, regimen_fiscal, correo_facturacion))
+    except Exception as e:
+        # Si las columnas no existen, agregarlas
+        print(f"Error insertando cliente: {e}")
+        cursor.execute("""
+            INSERT INTO clientes (nombre_cliente, telefono, correo, tipo_cliente, direccion)
+            VALUES (?, ?, ?, ?, ?);
+        """, (nombre, telefono, correo, tipo, direccion))
+
+    conn.commit()
+    cursor.close()
+    conn.close()
+    return {'success': True}
 
 @app.route('/agregar_cliente', methods=['POST'])
 def agregar_cliente():
@@ -90,61 +124,84 @@ def agregar_cliente():
     regimen_fiscal = request.form.get('regimen_fiscal') or None
     correo_facturacion = request.form.get('correo_facturacion') or None
 
+    escribir(_insertar_cliente, nombre, telefono, correo, tipo, direccion,
+             rfc, razon_social, uso_cfdi, regimen_fiscal, correo_facturacion)
+    return redirect(url_for('clientes'))
+
+def _eliminar_cliente(id):
     conn = get_connection()
-    if conn:
-        cursor = conn.cursor()
+    if not conn:
+        return {'success': False, 'error': 'Error de conexión a BD'}
+
+    cur = conn.cursor()
+    try:
+        # Verificar si el cliente tiene cotizaciones
+        cur.execute("SELECT COUNT(*) FROM cotizaciones WHERE id_cliente = ?", (id,))
+        tiene_cotizaciones = cur.fetchone()[0]
         
-        # Verificar si la tabla tiene las columnas fiscales, si no, crearlas
-        try:
-            cursor.execute("""
-                INSERT INTO clientes (
-                    nombre_cliente, telefono, correo, tipo_cliente, direccion,
-                    rfc, razon_social, uso_cfdi, regimen_fiscal, correo_facturacion
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
-            """, (nombre, telefono, correo, tipo, direccion, 
-                  rfc, razon_social, uso_cfdi, regimen_fiscal, correo_facturacion))
-        except Exception as e:
-            # Si las columnas no existen, agregarlas
-            print(f"Error insertando cliente: {e}")
-            cursor.execute("""
-                INSERT INTO clientes (nombre_cliente, telefono, correo, tipo_cliente, direccion)
-                VALUES (?, ?, ?, ?, ?);
-            """, (nombre, telefono, correo, tipo, direccion))
+        # Verificar si el cliente tiene pedidos
+        cur.execute("SELECT COUNT(*) FROM pedidos WHERE id_cliente = ?", (id,))
+        tiene_pedidos = cur.fetchone()[0]
         
+        if tiene_cotizaciones > 0 or tiene_pedidos > 0:
+            print(f"⚠️ No se puede eliminar: cliente tiene {tiene_cotizaciones} cotizaciones y {tiene_pedidos} pedidos")
+            return {'success': False, 'error': 'El cliente tiene cotizaciones o pedidos'}
+
+        cur.execute("DELETE FROM clientes WHERE id_cliente = ?;", (id,))
         conn.commit()
-        cursor.close()
+        print(f"✓ Cliente #{id} eliminado correctamente")
+        return {'success': True}
+    except Exception as e:
+        print(f"❌ Error al eliminar cliente: {e}")
+        conn.rollback()
+        return {'success': False, 'error': str(e)}
+    finally:
+        cur.close()
         conn.close()
-    return redirect(url_for('clientes'))
 
 @app.route('/eliminar_cliente/<int:id>', methods=['GET', 'POST'])
 def eliminar_cliente(id):
+    escribir(_eliminar_cliente, id)
+    return redirect(url_for('clientes'))
+
+def _actualizar_cliente(id, nombre, telefono, correo, tipo, direccion,
+                        rfc, razon_social, uso_cfdi, regimen_fiscal, correo_facturacion):
     conn = get_connection()
-    if conn:
-        cur = conn.cursor()
+    if not conn:
+        return {'success': False, 'error': 'Error de conexión a BD'}
+
+    cur = conn.cursor()
+    try:
+        # Intentar actualizar con todos los campos incluyendo datos fiscales
+        cur.execute("""
+            UPDATE clientes 
+            SET nombre_cliente=?, telefono=?, correo=?, tipo_cliente=?, direccion=?,
+                rfc=?, razon_social=?, uso_cfdi=?, regimen_fiscal=?, correo_facturacion=?
+            WHERE id_cliente=?;
+        """, (nombre, telefono, correo, tipo, direccion, 
+              rfc, razon_social, uso_cfdi, regimen_fiscal, correo_facturacion, id))
+        conn.commit()
+        print(f"✓ Cliente #{id} actualizado correctamente con datos fiscales")
+        return {'success': True}
+    except Exception as e:
+        # Si falla (porque las columnas no existen), actualizar solo campos básicos
+        print(f"⚠️ Error actualizando con datos fiscales: {e}")
         try:
-            # Verificar si el cliente tiene cotizaciones
-            cur.execute("SELECT COUNT(*) FROM cotizaciones WHERE id_cliente = ?", (id,))
-            tiene_cotizaciones = cur.fetchone()[0]
-            
-            # Verificar si el cliente tiene pedidos
-            cur.execute("SELECT COUNT(*) FROM pedidos WHERE id_cliente = ?", (id,))
-            tiene_pedidos = cur.fetchone()[0]
-            
-            if tiene_cotizaciones > 0 or tiene_pedidos > 0:
-                print(f"⚠️ No se puede eliminar: cliente tiene {tiene_cotizaciones} cotizaciones y {tiene_pedidos} pedidos")
-            else:
-                cur.execute("DELETE FROM clientes WHERE id_cliente = ?;", (id,))
-                conn.commit()
-                print(f"✓ Cliente #{id} eliminado correctamente")
-        except Exception as e:
-            print(f"❌ Error al eliminar cliente: {e}")
+            cur.execute("""
+                UPDATE clientes 
+                SET nombre_cliente=?, telefono=?, correo=?, tipo_cliente=?, direccion=?
+                WHERE id_cliente=?;
+            """, (nombre, telefono, correo, tipo, direccion, id))
+            conn.commit()
+            print(f"✓ Cliente #{id} actualizado (solo datos básicos)")
+            return {'success': True}
+        except Exception as e2:
+            print(f"❌ Error al actualizar cliente: {e2}")
             conn.rollback()
-        finally:
-            cur.close()
-            conn.close()
-    
-    return redirect(url_for('clientes'))
+            return {'success': False, 'error': str(e2)}
+    finally:
+        cur.close()
+        conn.close()
 
 @app.route('/modificar_cliente/<int:id>', methods=['POST'])
 def modificar_cliente(id):
@@ -162,49 +219,21 @@ def modificar_cliente(id):
     regimen_fiscal = request.form.get('regimen_fiscal') or None
     correo_facturacion = request.form.get('correo_facturacion') or None
 
-    conn = get_connection()
-    if conn:
-        cur = conn.cursor()
-        
-        try:
-            # Intentar actualizar con todos los campos incluyendo datos fiscales
-            cur.execute("""
-                UPDATE clientes 
-                SET nombre_cliente=?, telefono=?, correo=?, tipo_cliente=?, direccion=?,
-                    rfc=?, razon_social=?, uso_cfdi=?, regimen_fiscal=?, correo_facturacion=?
-                WHERE id_cliente=?;
-            """, (nombre, telefono, correo, tipo, direccion, 
-                  rfc, razon_social, uso_cfdi, regimen_fiscal, correo_facturacion, id))
-            conn.commit()
-            print(f"✓ Cliente #{id} actualizado correctamente con datos fiscales")
-        except Exception as e:
-            # Si falla (porque las columnas no existen), actualizar solo campos básicos
-            print(f"⚠️ Error actualizando con datos fiscales: {e}")
-            try:
-                cur.execute("""
-                    UPDATE clientes 
-                    SET nombre_cliente=?, telefono=?, correo=?, tipo_cliente=?, direccion=?
-                    WHERE id_cliente=?;
-                """, (nombre, telefono, correo, tipo, direccion, id))
-                conn.commit()
-                print(f"✓ Cliente #{id} actualizado (solo datos básicos)")
-            except Exception as e2:
-                print(f"❌ Error al actualizar cliente: {e2}")
-                conn.rollback()
-        
-        cur.close()
-        conn.close()
-    
+    escribir(_actualizar_cliente, id, nombre, telefono, correo, tipo, direccion,
+             rfc, razon_social, uso_cfdi, regimen_fiscal, correo_facturacion)
     return redirect(url_for('clientes'))
 
 # ==================== CATÁLOGO ====================
-@app.route('/catalogo')
-def catalogo():
+def _consultar_catalogo(limite=None, despues=None):
+    """
+    Diseños del más reciente al más antiguo; despues es (fecha_creacion, id_combinacion)
+    del último de la página anterior
+    """
     conn = get_connection()
     combinaciones = []
     if conn:
         cur = conn.cursor()
-        cur.execute("""
+        cur.execute(f"""
             SELECT 
                 c.id_combinacion,
                 c.nombre_guardado,
@@ -221,55 +250,125 @@ def catalogo():
             LEFT JOIN colores cp ON c.id_color_principal = cp.id_color
             LEFT JOIN colores ca ON c.id_color_asa = ca.id_color
             LEFT JOIN colores cs ON c.id_color_secundario = cs.id_color
-            ORDER BY c.fecha_creacion DESC;
-        """)
+            {'WHERE (c.fecha_creacion, c.id_combinacion) < (?, ?)' if despues else ''}
+            ORDER BY c.fecha_creacion DESC, c.id_combinacion DESC
+            LIMIT ?;
+        """, (list(despues) if despues else []) + [limite or -1])
         combinaciones = cur.fetchall()
         cur.close()
         conn.close()
-    return render_template('catalogo.html', combinaciones=combinaciones)
+    return combinaciones
+
+def _pagina_catalogo():
+    tamano = limitar_tamano(request.args.get('tamano'))
+    despues = decodificar_cursor(request.args.get('despues'), 2)
+    filas = _consultar_catalogo(tamano + 1, despues)
+    return paginar(filas, tamano, lambda c: (c[3], c[0])), tamano
+
+@app.route('/catalogo')
+def catalogo():
+    pagina, tamano = _pagina_catalogo()
+    return render_template('catalogo.html', combinaciones=pagina['items'],
+                           siguiente=pagina['siguiente'], tamano=tamano)
+
+@app.route('/api/catalogo')
+def api_catalogo():
+    pagina, tamano = _pagina_catalogo()
+    return jsonify({'items': [dict(c) for c in pagina['items']],
+                    'siguiente': pagina['siguiente'], 'tamano': tamano})
+
+def _eliminar_combinacion(id):
+    conn = get_connection()
+    if not conn:
+        return {'success': False, 'error': 'Error de conexión a BD'}
+
+    try:
+        cur = conn.cursor()
+        
+        # Verificar si la combinación está siendo usada en cotizaciones
+        cur.execute("""
+            SELECT COUNT(*) FROM detalle_cotizacion 
+            WHERE id_material = ?
+        """, (id,))
+        en_cotizaciones = cur.fetchone()[0]
+        
+        # Verificar si la combinación está siendo usada en pedidos
+        cur.execute("""
+            SELECT COUNT(*) FROM detalle_pedido 
+            WHERE id_producto = ?
+        """, (id,))
+        en_pedidos = cur.fetchone()[0]
+        
+        if en_cotizaciones > 0 or en_pedidos > 0:
+            print(f"⚠️ No se puede eliminar: diseño usado en {en_cotizaciones} cotizaciones y {en_pedidos} pedidos")
+            cur.close()
+            return {'success': False, 'error': 'El diseño está en cotizaciones o pedidos'}
+
+        # Eliminar la combinación
+        cur.execute("DELETE FROM combinaciones WHERE id_combinacion = ?", (id,))
+        conn.commit()
+        print(f"✓ Diseño #{id} eliminado correctamente")
+        cur.close()
+        return {'success': True}
+    except Exception as e:
+        print(f"❌ Error al eliminar combinación: {e}")
+        conn.rollback()
+        return {'success': False, 'error': str(e)}
+    finally:
+        conn.close()
 
 @app.route('/eliminar_combinacion/<int:id>', methods=['POST'])
 def eliminar_combinacion(id):
     """Elimina un diseño del catálogo"""
-    conn = get_connection()
-    if conn:
-        try:
-            cur = conn.cursor()
-            
-            # Verificar si la combinación está siendo usada en cotizaciones
-            cur.execute("""
-                SELECT COUNT(*) FROM detalle_cotizacion 
-                WHERE id_material = ?
-            """, (id,))
-            en_cotizaciones = cur.fetchone()[0]
-            
-            # Verificar si la combinación está siendo usada en pedidos
-            cur.execute("""
-                SELECT COUNT(*) FROM detalle_pedido 
-                WHERE id_producto = ?
-            """, (id,))
-            en_pedidos = cur.fetchone()[0]
-            
-            if en_cotizaciones > 0 or en_pedidos > 0:
-                print(f"⚠️ No se puede eliminar: diseño usado en {en_cotizaciones} cotizaciones y {en_pedidos} pedidos")
-            else:
-                # Eliminar la combinación
-                cur.execute("DELETE FROM combinaciones WHERE id_combinacion = ?", (id,))
-                conn.commit()
-                print(f"✓ Diseño #{id} eliminado correctamente")
-            
-            cur.close()
-        except Exception as e:
-            print(f"❌ Error al eliminar combinación: {e}")
-            if conn:
-                conn.rollback()
-        finally:
-            if conn:
-                conn.close()
-    
+    escribir(_eliminar_combinacion, id)
     return redirect(url_for('catalogo'))
 
 # ==================== DISEÑO COLOR ====================
+def _guardar_combinacion(id_modelo, esquema, nombre, colores_hex, elementos_json):
+    """
+    Guarda el diseño; colores_hex es (principal, secundario, asa). Los colores
+    que aún no existen se crean en la misma operación.
+    """
+    conn = get_connection()
+    if not conn:
+        return {'success': False, 'error': 'Error de conexión a BD'}
+
+    cur = conn.cursor()
+
+    # Validar si el nombre ya existe
+    cur.execute("SELECT COUNT(*) FROM combinaciones WHERE nombre_guardado = ?", (nombre,))
+    existe = cur.fetchone()[0]
+    
+    if existe > 0:
+        cur.close()
+        conn.close()
+        return {'success': False, 'error': 'Ya existe una combinación con ese nombre'}
+
+    def obtener_id_color(hex_code):
+        if not hex_code:
+            return None
+        # Solo se escribe si el color aún no existe
+        cur.execute("""
+            INSERT OR IGNORE INTO colores (nombre_color, codigo_hex)
+            VALUES (?, ?)
+        """, (f"Color_{hex_code}", hex_code))
+        cur.execute("SELECT id_color FROM colores WHERE codigo_hex = ?", (hex_code,))
+        return cur.fetchone()[0]
+
+    ids_color = [obtener_id_color(hex_code) for hex_code in colores_hex]
+
+    cur.execute("""
+        INSERT INTO combinaciones (
+            id_modelo, esquema, id_color_principal, 
+            id_color_secundario, id_color_asa, nombre_guardado, diseno_json
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (id_modelo, esquema, *ids_color, nombre, elementos_json))
+    conn.commit()
+    cur.close()
+    conn.close()
+    return {'success': True}
+
 @app.route('/diseno_color', methods=['GET', 'POST'])
 def diseno_color():
     if request.method == 'POST':
@@ -282,57 +381,21 @@ def diseno_color():
         color_asa = request.form.get('color_asa')
         elementos_json = request.form.get('elementos_json')
 
-        conn = get_connection()
-        if conn:
-            cur = conn.cursor()
-
-            # Validar si el nombre ya existe
-            cur.execute("SELECT COUNT(*) FROM combinaciones WHERE nombre_guardado = ?", (nombre,))
-            existe = cur.fetchone()[0]
-            
-            if existe > 0:
-                cur.close()
-                conn.close()
-                return jsonify({'success': False, 'error': 'Ya existe una combinación con ese nombre'}), 400
-
-            def obtener_id_color(hex_code):
-                if not hex_code:
-                    return None
-                cur.execute("""
-                    INSERT OR IGNORE INTO colores (nombre_color, codigo_hex)
-                    VALUES (?, ?)
-                """, (f"Color_{hex_code}", hex_code))
-                conn.commit()
-                cur.execute("SELECT id_color FROM colores WHERE codigo_hex = ?", (hex_code,))
-                result = cur.fetchone()
-                return result[0] if result else None
-
-            id_color_principal = obtener_id_color(color_principal)
-            id_color_secundario = obtener_id_color(color_secundario)
-            id_color_asa = obtener_id_color(color_asa)
-
-            cur.execute("""
-                INSERT INTO combinaciones (
-                    id_modelo, esquema, id_color_principal, 
-                    id_color_secundario, id_color_asa, nombre_guardado, diseno_json
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (id_modelo, esquema, id_color_principal, id_color_secundario, 
-                  id_color_asa, nombre, elementos_json))
-            conn.commit()
-            cur.close()
-            conn.close()
+        resultado = escribir(_guardar_combinacion, id_modelo, esquema, nombre,
+                             (color_principal, color_secundario, color_asa), elementos_json)
+        if not resultado['success']:
+            return jsonify(resultado), 400
+        # Pudo crear colores nuevos
+        ReferenceCache.invalidar()
 
         return redirect(url_for('catalogo'))
 
+    modelos = ReferenceCache.modelos()
+    paletas = ReferenceCache.paletas()
     conn = get_connection()
-    modelos, paletas, combinaciones = [], [], []
+    combinaciones = []
     if conn:
         cur = conn.cursor()
-        cur.execute("SELECT id_modelo, nombre_modelo, tipo FROM modelos_bolsas ORDER BY id_modelo;")
-        modelos = cur.fetchall()
-        cur.execute("SELECT id_paleta, nombre, esquema FROM paletas_colores ORDER BY id_paleta;")
-        paletas = cur.fetchall()
         cur.execute("""
             SELECT c.id_combinacion, c.nombre_guardado, c.esquema, c.fecha_creacion,
                    mb.nombre_modelo, mb.tipo
@@ -361,9 +424,11 @@ def agregar_material():
     unidad_medida = request.form['unidad_medida']
     costo_unitario = float(request.form['costo_unitario'])
     descripcion = request.form.get('descripcion')
+    stock_minimo = request.form.get('stock_minimo', 100, type=float)
     
-    resultado = InventoryManager.agregar_material(
-        nombre, tipo, unidad_medida, costo_unitario, descripcion
+    resultado = escribir(
+        InventoryManager.agregar_material,
+        nombre, tipo, unidad_medida, costo_unitario, descripcion, stock_minimo
     )
     
     if not resultado['success']:
@@ -376,13 +441,79 @@ def actualizar_stock():
     id_material = int(request.form['id_material'])
     cantidad = float(request.form['cantidad'])
     
-    resultado = InventoryManager.actualizar_stock(id_material, cantidad)
+    usuario = request.form.get('usuario') or request.remote_user
+    
+    resultado = escribir(InventoryManager.actualizar_stock, id_material, cantidad, usuario)
     
     if not resultado['success']:
         print(f"Error al actualizar stock: {resultado['error']}")
     
     return redirect(url_for('inventario'))
 
+@app.route('/api/kardex/<int:id_material>')
+def api_kardex(id_material):
+    limite = limitar_tamano(request.args.get('limite'), 50)
+    return jsonify(InventoryManager.obtener_kardex(id_material, limite))
+
+@app.route('/api/inventario/existencias')
+@solo_lectura
+def api_existencias():
+    """Existencias y valuación a una fecha: ?fecha=YYYY-MM-DD (por defecto, hoy)"""
+    fecha = request.args.get('fecha') or datetime.now().strftime('%Y-%m-%d')
+    try:
+        datetime.strptime(fecha[:10], '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'error': 'Fecha no válida, use YYYY-MM-DD'}), 400
+    existencias = InventoryManager.obtener_existencias_en(fecha)
+    return jsonify({
+        'fecha': fecha,
+        'materiales': existencias,
+        'valor_total': round(sum(e['valor_total'] for e in existencias), 2)
+    })
+
+@app.route('/api/modelos/<int:id_modelo>/materiales', methods=['GET', 'PUT'])
+def api_lista_materiales(id_modelo):
+    """Lista de materiales del modelo; PUT la reemplaza: [{id_material, cantidad, region}, ...]"""
+    if request.method == 'PUT':
+        materiales = request.get_json(silent=True)
+        if not isinstance(materiales, list):
+            return jsonify({'success': False, 'error': 'Se esperaba una lista de materiales'}), 400
+        resultado = escribir(BOMManager.definir_lista, id_modelo, materiales)
+        return jsonify(resultado), (200 if resultado['success'] else 400)
+    
+    return jsonify(BOMManager.obtener_lista(id_modelo))
+
+@app.route('/api/produccion/requerimientos', methods=['GET', 'POST'])
+@solo_lectura
+def api_requerimientos_produccion():
+    """
+    Materiales y costo para producir un conjunto de pedidos/cotizaciones
+    POST {"pedidos": [...], "cotizaciones": [...]} o GET ?desde=YYYY-MM-DD&hasta=YYYY-MM-DD
+    (pedidos pendientes o en proceso por entregar en ese rango)
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            resultado = BOMManager.calcular_requerimientos(
+                data.get('pedidos') or [], data.get('cotizaciones') or []
+            )
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'Se esperaban listas de ids'}), 400
+    else:
+        desde = request.args.get('desde')
+        hasta = request.args.get('hasta')
+        if not desde or not hasta:
+            return jsonify({'success': False, 'error': 'Indique desde y hasta'}), 400
+        resultado = BOMManager.requerimientos_por_entrega(desde, hasta)
+    
+    return jsonify(resultado), (200 if resultado['success'] else 500)
+
+@app.route('/api/costos/catalogo')
+@solo_lectura
+def api_costos_catalogo():
+    """Costo de producción, precio base y margen de cada diseño del catálogo"""
+    return jsonify(CostManager.costos_catalogo())
+
 @app.route('/api/verificar_material', methods=['POST'])
 def api_verificar_material():
     data = request.json
@@ -393,136 +524,70 @@ def api_verificar_material():
     
     return jsonify({'disponible': disponible})
 
+@app.route('/api/verificar_materiales', methods=['POST'])
+def api_verificar_materiales():
+    """
+    Verifica todos los materiales de una vez y devuelve el faltante de cada uno
+    {"materiales": {"<id_material>": cantidad, ...}} o {"pedido": id} / {"cotizacion": id}
+    (resueltos con la lista de materiales). "reservar_minutos" reserva lo verificado
+    para el pedido o cotización si todo alcanza.
+    """
+    data = request.get_json(silent=True) or {}
+    referencia_tipo, id_referencia = None, None
+    
+    if data.get('pedido') or data.get('cotizacion'):
+        referencia_tipo = 'pedido' if data.get('pedido') else 'cotizacion'
+        id_referencia = data.get(referencia_tipo)
+        if not isinstance(id_referencia, int):
+            return jsonify({'success': False, 'error': 'Id de referencia no válido'}), 400
+        bom = (BOMManager.calcular_requerimientos(ids_pedidos=[id_referencia])
+               if referencia_tipo == 'pedido'
+               else BOMManager.calcular_requerimientos(ids_cotizaciones=[id_referencia]))
+        if not bom['success']:
+            return jsonify(bom), 500
+        requerimientos = {m['id_material']: m['cantidad'] for m in bom['materiales']}
+    else:
+        requerimientos = data.get('materiales')
+        if (not isinstance(requerimientos, dict)
+                or not all(str(k).isdigit() and isinstance(v, (int, float)) for k, v in requerimientos.items())):
+            return jsonify({'success': False, 'error': 'Se esperaba {id_material: cantidad}'}), 400
+    
+    reservar_minutos = data.get('reservar_minutos')
+    if reservar_minutos:
+        resultado = escribir(InventoryManager.verificar_requerimientos, requerimientos,
+                             referencia_tipo, id_referencia, reservar_minutos)
+    else:
+        resultado = InventoryManager.verificar_requerimientos(requerimientos, referencia_tipo, id_referencia)
+    
+    return jsonify(resultado), (200 if resultado['success'] else 400)
+
 @app.route('/api/materiales_bajo_stock')
 def api_materiales_bajo_stock():
-    umbral = request.args.get('umbral', 100, type=int)
-    materiales = InventoryManager.obtener_materiales_bajo_stock(umbral)
-    return jsonify(materiales)
+    """Alertas activas; con ?desde=<cursor> solo los cambios posteriores"""
+    desde = request.args.get('desde', type=int)
+    return jsonify(InventoryManager.obtener_alertas_stock(desde))
 
 @app.route('/eliminar_material/<int:id>', methods=['POST'])
 def eliminar_material(id):
-    resultado = InventoryManager.eliminar_material(id)
+    resultado = escribir(InventoryManager.eliminar_material, id)
     if not resultado['success']:
         print(f"Error al eliminar material: {resultado['error']}")
     return redirect(url_for('inventario'))
 
 @app.route('/exportar_inventario_excel')
+@solo_lectura
 def exportar_inventario_excel():
     """Exporta el inventario a Excel con logo y título"""
     try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-        from openpyxl.drawing.image import Image as XLImage
-        from io import BytesIO
-        
-        # Obtener datos del inventario
-        inventario = InventoryManager.obtener_inventario_completo()
-        
-        # Crear libro de Excel
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Inventario"
-        
-        # Intentar agregar logo
-        logo_path = os.path.join(app.static_folder, 'images', 'logo_.png')
-        if os.path.exists(logo_path):
-            try:
-                img = XLImage(logo_path)
-                img.width = 80
-                img.height = 80
-                ws.add_image(img, 'A1')
-            except:
-                pass
-        
-        # Título del sistema (centrado en las columnas)
-        ws.merge_cells('B1:F1')
-        titulo_cell = ws['B1']
-        titulo_cell.value = 'Sistema Integral de Gestión para Confeccionistas de Bolsas'
-        titulo_cell.font = Font(size=14, bold=True, color='FF1493')
-        titulo_cell.alignment = Alignment(horizontal='center', vertical='center')
-        
-        # Subtítulo ChromaBags
-        ws.merge_cells('B2:F2')
-        subtitulo_cell = ws['B2']
-        subtitulo_cell.value = 'CHROMABAGS'
-        subtitulo_cell.font = Font(size=18, bold=True, color='FF69B4')
-        subtitulo_cell.alignment = Alignment(horizontal='center', vertical='center')
-        
-        # Título del documento
-        ws.merge_cells('A4:F4')
-        doc_title = ws['A4']
-        doc_title.value = 'REPORTE DE INVENTARIO'
-        doc_title.font = Font(size=16, bold=True)
-        doc_title.alignment = Alignment(horizontal='center', vertical='center')
-        
-        # Fecha de generación
-        ws.merge_cells('A5:F5')
-        fecha_cell = ws['A5']
-        fecha_cell.value = f'Generado el: {datetime.now().strftime("%d/%m/%Y %H:%M")}'
-        fecha_cell.font = Font(size=10, italic=True)
-        fecha_cell.alignment = Alignment(horizontal='center')
-        
-        # Encabezados de la tabla (fila 7)
-        headers = ['Material', 'Tipo', 'Stock Actual', 'Unidad', 'Costo Unit.', 'Valor Total']
-        header_fill = PatternFill(start_color='FF69B4', end_color='FF69B4', fill_type='solid')
-        header_font = Font(bold=True, color='FFFFFF', size=11)
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        for col, header in enumerate(headers, start=1):
-            cell = ws.cell(row=7, column=col)
-            cell.value = header
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = border
-        
-        # Datos del inventario
-        row_num = 8
-        total_valor = 0
-        
-        for item in inventario:
-            ws.cell(row=row_num, column=1, value=item['nombre_material']).border = border
-            ws.cell(row=row_num, column=2, value=item['tipo']).border = border
-            ws.cell(row=row_num, column=3, value=item['stock_actual']).border = border
-            ws.cell(row=row_num, column=4, value=item['unidad_medida']).border = border
-            ws.cell(row=row_num, column=5, value=f"${item['costo_unitario']:.2f}").border = border
-            
-            valor_total_item = item['stock_actual'] * item['costo_unitario']
-            total_valor += valor_total_item
-            ws.cell(row=row_num, column=6, value=f"${valor_total_item:.2f}").border = border
-            
-            row_num += 1
-        
-        # Fila de totales
-        ws.cell(row=row_num, column=5, value="TOTAL:").font = Font(bold=True, size=12)
-        ws.cell(row=row_num, column=5).alignment = Alignment(horizontal='right')
-        total_cell = ws.cell(row=row_num, column=6, value=f"${total_valor:.2f}")
-        total_cell.font = Font(bold=True, size=12, color='FF1493')
-        total_cell.fill = PatternFill(start_color='FFE4E1', end_color='FFE4E1', fill_type='solid')
-        
-        # Ajustar ancho de columnas
-        ws.column_dimensions['A'].width = 30
-        ws.column_dimensions['B'].width = 15
-        ws.column_dimensions['C'].width = 12
-        ws.column_dimensions['D'].width = 10
-        ws.column_dimensions['E'].width = 12
-        ws.column_dimensions['F'].width = 15
-        
-        # Guardar en memoria
         output = BytesIO()
-        wb.save(output)
+        nombre = ExportManager.inventario_excel(output)
         output.seek(0)
         
         return send_file(
             output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            mimetype=MIMETYPE_EXCEL,
             as_attachment=True,
-            download_name=f'inventario_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+            download_name=nombre
         )
         
     except Exception as e:
@@ -541,8 +606,10 @@ def modificar_material(id):
     unidad = request.form['unidad_medida']
     costo = float(request.form['costo_unitario'])
     descripcion = request.form.get('descripcion')
+    stock_minimo = request.form.get('stock_minimo', type=float)
 
-    resultado = InventoryManager.modificar_material(id, nombre, tipo, unidad, costo, descripcion)
+    resultado = escribir(InventoryManager.modificar_material, id, nombre, tipo, unidad, costo, descripcion,
+                         stock_minimo)
 
     if not resultado['success']:
         print("Error modificando material:", resultado['error'])
@@ -553,7 +620,8 @@ def modificar_material(id):
 # ==================== COTIZACIÓN ====================
 @app.route('/cotizacion')
 def cotizacion():
-    cotizaciones = QuotationManager.obtener_cotizaciones()
+    pagina, tamano = _pagina_cotizaciones()
+    cotizaciones = pagina['items']
     
     conn = get_connection()
     clientes_data = []
@@ -569,60 +637,47 @@ def cotizacion():
     return render_template('cotizacion.html', 
                          cotizaciones=cotizaciones, 
                          clientes=clientes_data,
-                         productos=productos)
+                         productos=productos,
+                         siguiente=pagina['siguiente'],
+                         tamano=tamano)
+
+def _pagina_cotizaciones():
+    tamano = limitar_tamano(request.args.get('tamano'))
+    despues = decodificar_cursor(request.args.get('despues'), 2)
+    filas = QuotationManager.obtener_cotizaciones(tamano + 1, despues)
+    return paginar(filas, tamano, lambda c: (c['fecha_emision'], c['id_cotizacion'])), tamano
+
+@app.route('/api/cotizaciones')
+def api_cotizaciones():
+    pagina, tamano = _pagina_cotizaciones()
+    return jsonify({'items': pagina['items'], 'siguiente': pagina['siguiente'], 'tamano': tamano})
 
 @app.route('/generar_cotizacion', methods=['POST'])
 def generar_cotizacion():
     id_cliente = int(request.form['id_cliente'])
     
-    # Obtener conexión para consultar tipo de modelo
-    conn = get_connection()
-    cur = conn.cursor()
-    
-    productos = []
+    lineas = []
     index = 1
     while f'productos[{index}][id_combinacion]' in request.form:
         id_combinacion = request.form.get(f'productos[{index}][id_combinacion]')
         cantidad = request.form.get(f'productos[{index}][cantidad]')
         
         if id_combinacion and cantidad:
-            # Obtener el tipo de modelo para calcular el precio correcto
-            cur.execute("""
-                SELECT mb.tipo 
-                FROM combinaciones c
-                JOIN modelos_bolsas mb ON c.id_modelo = mb.id_modelo
-                WHERE c.id_combinacion = ?
-            """, (int(id_combinacion),))
-            
-            resultado_tipo = cur.fetchone()
-            
-            # Calcular precio según tipo de modelo
-            if resultado_tipo:
-                tipo_modelo = resultado_tipo[0]
-                if tipo_modelo == 'combinado':
-                    precio = 220
-                elif tipo_modelo == 'especial':
-                    precio = 250
-                else:  # armonico
-                    precio = 180
-            else:
-                precio = 180  # precio por defecto
-            
-            productos.append({
-                'id_combinacion': int(id_combinacion),
-                'cantidad': int(cantidad),
-                'precio_unitario': precio
-            })
+            lineas.append({'id_combinacion': int(id_combinacion), 'cantidad': int(cantidad)})
         
         index += 1
     
-    cur.close()
-    conn.close()
+    # Todas las líneas se cotizan con una sola consulta
+    productos = [{
+        'id_combinacion': linea['id_combinacion'],
+        'cantidad': linea['cantidad'],
+        'precio_unitario': linea['precio_unitario']
+    } for linea in PricingManager.cotizar_lineas(lineas)]
     
     if not productos:
         return redirect(url_for('cotizacion'))
     
-    resultado = QuotationManager.crear_cotizacion(id_cliente, productos)
+    resultado = escribir(QuotationManager.crear_cotizacion, id_cliente, productos)
     
     if not resultado['success']:
         print(f"Error al crear cotización: {resultado['error']}")
@@ -639,19 +694,36 @@ def api_actualizar_estado_cotizacion(id):
     data = request.json
     nuevo_estado = data.get('estado')
     
-    resultado = QuotationManager.actualizar_estado_cotizacion(id, nuevo_estado)
+    resultado = escribir(QuotationManager.actualizar_estado_cotizacion, id, nuevo_estado)
+    # Una cotización rechazada ya no necesita el material que apartó
+    if resultado['success'] and nuevo_estado == 'rechazada':
+        escribir(InventoryManager.liberar_reserva, 'cotizacion', id)
     return jsonify(resultado)
 
+@app.route('/api/cotizaciones/aprobar', methods=['POST'])
+def api_aprobar_cotizaciones():
+    """Aprueba un lote de cotizaciones: {"ids": [1, 2, ...]}"""
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids')
+    if (not isinstance(ids, list)
+            or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids)):
+        return jsonify({'success': False, 'error': 'Se esperaba una lista de ids'}), 400
+    
+    resultado = escribir(QuotationManager.aprobar_cotizaciones, ids)
+    return jsonify(resultado), (200 if resultado['success'] else 500)
+
 @app.route('/eliminar_cotizacion/<int:id>', methods=['POST'])
 def eliminar_cotizacion(id):
-    resultado = QuotationManager.eliminar_cotizacion(id)
+    resultado = escribir(QuotationManager.eliminar_cotizacion, id)
     if not resultado['success']:
         print(f"Error al eliminar cotización: {resultado['error']}")
+    else:
+        escribir(InventoryManager.liberar_reserva, 'cotizacion', id)
     return redirect(url_for('cotizacion'))
 
 @app.route('/duplicar_cotizacion/<int:id>', methods=['POST'])
 def duplicar_cotizacion(id):
-    resultado = QuotationManager.duplicar_cotizacion(id)
+    resultado = escribir(QuotationManager.duplicar_cotizacion, id)
     if not resultado['success']:
         print(f"Error al duplicar cotización: {resultado['error']}")
     return redirect(url_for('cotizacion'))
@@ -662,144 +734,69 @@ def api_productos_cotizacion():
     return jsonify(productos)
 
 @app.route('/exportar_cotizacion/<int:id>')
+@solo_lectura
 def exportar_cotizacion(id):
     """Exporta una cotización individual a PDF"""
-    from reportlab.lib.pagesizes import letter
-    from reportlab.pdfgen import canvas
-    from io import BytesIO
-    
     cotizacion = QuotationManager.obtener_cotizacion_detalle(id)
     if not cotizacion:
         return "Cotización no encontrada", 404
     
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=letter)
-    width, height = letter
-    
-    # Dibujar encabezado con logo y título
-    y = dibujar_encabezado_pdf(c, width, height, f"COTIZACIÓN #{cotizacion['id_cotizacion']}")
+    doc = DocumentoPDF(f"COTIZACIÓN #{cotizacion['id_cotizacion']}")
     
     # Info cotización
-    c.setFont("Helvetica", 12)
-    y -= 20
-    c.drawString(40, y, f"Cliente: {cotizacion['nombre_cliente']}")
-    y -= 18
-    c.drawString(40, y, f"Fecha de emisión: {cotizacion['fecha_emision'][:10]}")
-    y -= 18
-    c.drawString(40, y, f"Estado: {cotizacion['estado'].upper()}")
-    y -= 35
+    doc.espacio(20)
+    doc.texto(f"Cliente: {cotizacion['nombre_cliente']}", tamano=12, salto=18)
+    doc.texto(f"Fecha de emisión: {cotizacion['fecha_emision'][:10]}", tamano=12, salto=18)
+    doc.texto(f"Estado: {cotizacion['estado'].upper()}", tamano=12, salto=35)
     
     # Productos
-    c.setFont("Helvetica-Bold", 13)
-    c.drawString(40, y, "Detalle de Productos:")
-    y -= 25
+    doc.texto("Detalle de Productos:", fuente="Helvetica-Bold", tamano=13, salto=25)
     
-    c.setFont("Helvetica", 10)
     for prod in cotizacion['productos']:
-        # Obtener nombre del producto
-        conn = get_connection()
-        if conn:
-            cur = conn.cursor()
-            cur.execute("SELECT nombre_guardado FROM combinaciones WHERE id_combinacion = ?", (prod['id_producto'],))
-            nombre = cur.fetchone()
-            nombre_producto = nombre[0] if nombre else f"Producto #{prod['id_producto']}"
-            cur.close()
-            conn.close()
-        else:
-            nombre_producto = f"Producto #{prod['id_producto']}"
-        
-        c.setFont("Helvetica-Bold", 11)
-        c.drawString(50, y, f"• {nombre_producto}")
-        y -= 16
-        c.setFont("Helvetica", 10)
-        c.drawString(70, y, f"Cantidad: {prod['cantidad']} unidades")
-        y -= 14
-        c.drawString(70, y, f"Precio unitario: ${prod['precio_unitario']:.2f}")
-        y -= 14
-        c.drawString(70, y, f"Subtotal: ${prod['subtotal']:.2f}")
-        y -= 22
-        
-        if y < 100:  # Nueva página si es necesario
-            c.showPage()
-            y = dibujar_encabezado_pdf(c, width, height, f"COTIZACIÓN #{cotizacion['id_cotizacion']} (continuación)")
-            y -= 20
+        doc.texto(f"• {prod['nombre_producto']}", x=50, fuente="Helvetica-Bold", tamano=11, salto=16)
+        doc.texto(f"Cantidad: {prod['cantidad']} unidades", x=70, salto=14)
+        doc.texto(f"Precio unitario: ${prod['precio_unitario']:.2f}", x=70, salto=14)
+        doc.texto(f"Subtotal: ${prod['subtotal']:.2f}", x=70, salto=22)
+        doc.asegurar_espacio(0)
     
     # Total
-    y -= 15
-    c.setStrokeColorRGB(0.7, 0.3, 0.5)
-    c.line(40, y, width - 40, y)
-    y -= 25
-    c.setFont("Helvetica-Bold", 15)
-    c.drawString(40, y, f"TOTAL: ${cotizacion['total_estimado']:.2f}")
+    doc.espacio(15)
+    doc.separador(salto=25)
+    doc.texto(f"TOTAL: ${cotizacion['total_estimado']:.2f}", fuente="Helvetica-Bold", tamano=15)
     
-    c.save()
-    buffer.seek(0)
-    
-    return send_file(buffer, 
+    return send_file(doc.terminar(), 
                      mimetype='application/pdf',
                      as_attachment=True,
                      download_name=f'cotizacion_{id}.pdf')
 
 @app.route('/exportar_todas_cotizaciones')
+@solo_lectura
 def exportar_todas_cotizaciones():
-    """Exporta todas las cotizaciones a PDF"""
-    from reportlab.lib.pagesizes import letter
-    from reportlab.pdfgen import canvas
-    from io import BytesIO
-    
-    cotizaciones = QuotationManager.obtener_cotizaciones()
-    
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=letter)
-    width, height = letter
-    
-    # Dibujar encabezado con logo y título
-    y = dibujar_encabezado_pdf(c, width, height, "HISTORIAL DE COTIZACIONES")
-    
-    # Fecha de generación
-    c.setFont("Helvetica", 10)
-    y -= 10
-    c.drawString(40, y, f"Fecha de generación: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
-    y -= 10
-    c.drawString(40, y, f"Total de cotizaciones: {len(cotizaciones)}")
-    y -= 30
-    
-    c.setFont("Helvetica", 11)
-    
-    for cot in cotizaciones:
-        if y < 100:
-            c.showPage()
-            y = dibujar_encabezado_pdf(c, width, height, "HISTORIAL DE COTIZACIONES (continuación)")
-            y -= 20
-        
-        c.setFont("Helvetica-Bold", 12)
-        c.drawString(40, y, f"Cotización #{cot['id_cotizacion']}")
-        y -= 18
-        
-        c.setFont("Helvetica", 10)
-        c.drawString(60, y, f"Cliente: {cot['nombre_cliente']}")
-        y -= 15
-        c.drawString(60, y, f"Fecha: {cot['fecha_emision'][:10]}")
-        y -= 15
-        c.drawString(60, y, f"Productos: {cot['cantidad_productos']} ({cot['cantidad_total']} unidades)")
-        y -= 15
-        c.drawString(60, y, f"Total: ${cot['total_estimado']:.2f}")
-        y -= 15
-        c.drawString(60, y, f"Estado: {cot['estado'].upper()}")
-        y -= 25
-        
-        # Línea separadora
-        c.setStrokeColorRGB(0.8, 0.8, 0.8)
-        c.line(40, y, width - 40, y)
-        y -= 10
-    
-    c.save()
-    buffer.seek(0)
-    
-    return send_file(buffer, 
-                     mimetype='application/pdf',
+    """
+    Exporta el historial de cotizaciones a PDF
+    Filtros opcionales: ?desde=YYYY-MM-DD&hasta=YYYY-MM-DD&id_cliente=&estado=
+    Las cotizaciones se leen por lotes y el PDF se arma en un archivo temporal
+    (en memoria hasta 2 MB, después en disco) que se envía por partes.
+    """
+    desde = request.args.get('desde') or None
+    hasta = request.args.get('hasta') or None
+    id_cliente = request.args.get('id_cliente', type=int)
+    estado = request.args.get('estado') or None
+    try:
+        for fecha in (desde, hasta):
+            if fecha:
+                datetime.strptime(fecha, '%Y-%m-%d')
+    except ValueError:
+        return "Fecha no válida, use YYYY-MM-DD", 400
+    
+    archivo = tempfile.SpooledTemporaryFile(max_size=2 * 1024 * 1024)
+    nombre = ExportManager.historial_cotizaciones(archivo, desde, hasta, id_cliente, estado)
+    archivo.seek(0)
+    
+    return send_file(archivo, 
+                     mimetype=MIMETYPE_PDF,
                      as_attachment=True,
-                     download_name='historial_cotizaciones.pdf')
+                     download_name=nombre)
 
 # ==================== PEDIDOS ====================
 @app.route('/pedidos')
@@ -831,12 +828,25 @@ def pedidos():
         cur.close()
         conn.close()
     
-    pedidos_data = OrdersManager.obtener_pedidos()
+    pagina, tamano = _pagina_pedidos()
     
     return render_template('pedidos.html',
                          clientes=clientes_data,
                          productos=productos_data,
-                         pedidos=pedidos_data)
+                         pedidos=pagina['items'],
+                         siguiente=pagina['siguiente'],
+                         tamano=tamano)
+
+def _pagina_pedidos():
+    tamano = limitar_tamano(request.args.get('tamano'))
+    despues = decodificar_cursor(request.args.get('despues'), 1)
+    filas = OrdersManager.obtener_pedidos(tamano + 1, despues[0] if despues else None)
+    return paginar(filas, tamano, lambda p: (p['id_pedido'],)), tamano
+
+@app.route('/api/pedidos')
+def api_pedidos():
+    pagina, tamano = _pagina_pedidos()
+    return jsonify({'items': pagina['items'], 'siguiente': pagina['siguiente'], 'tamano': tamano})
 
 @app.route('/guardar_pedido', methods=['POST'])
 def guardar_pedido():
@@ -846,7 +856,8 @@ def guardar_pedido():
     fecha_entrega = request.form['fecha_entrega']
     estado = request.form['estado']
     
-    resultado = OrdersManager.crear_pedido(
+    resultado = escribir(
+        OrdersManager.crear_pedido,
         id_cliente, id_combinacion, cantidad, fecha_entrega, estado
     )
     
@@ -861,10 +872,12 @@ def actualizar_pedido(id_pedido):
     fecha_entrega = request.form['fecha_entrega']
     estado = request.form['estado']
     
-    resultado = OrdersManager.actualizar_pedido(id_pedido, fecha_entrega, estado)
+    resultado = escribir(OrdersManager.actualizar_pedido, id_pedido, fecha_entrega, estado)
     
     if not resultado['success']:
         print(f"Error al actualizar pedido: {resultado['error']}")
+    elif estado == 'cancelado':
+        escribir(InventoryManager.liberar_reserva, 'pedido', id_pedido)
     
     return redirect(url_for('pedidos'))
 
@@ -874,10 +887,12 @@ def editar_pedido(id_pedido):
         fecha_entrega = request.form['fecha_entrega']
         estado = request.form['estado']
         
-        resultado = OrdersManager.actualizar_pedido(id_pedido, fecha_entrega, estado)
+        resultado = escribir(OrdersManager.actualizar_pedido, id_pedido, fecha_entrega, estado)
         
         if not resultado['success']:
             print(f"Error al actualizar pedido: {resultado['error']}")
+        elif estado == 'cancelado':
+            escribir(InventoryManager.liberar_reserva, 'pedido', id_pedido)
         
         return redirect(url_for('pedidos'))
     
@@ -886,10 +901,12 @@ def editar_pedido(id_pedido):
 
 @app.route('/eliminar_pedido/<int:id_pedido>')
 def eliminar_pedido(id_pedido):
-    resultado = OrdersManager.eliminar_pedido(id_pedido)
+    resultado = escribir(OrdersManager.eliminar_pedido, id_pedido)
     
     if not resultado['success']:
         print(f"Error al eliminar pedido: {resultado['error']}")
+    else:
+        escribir(InventoryManager.liberar_reserva, 'pedido', id_pedido)
     
     return redirect(url_for('pedidos'))
 
@@ -897,82 +914,8 @@ def eliminar_pedido(id_pedido):
 @app.route('/pagos')
 def pagos():
     """Muestra pedidos finalizados con información de pagos"""
-    conn = get_connection()
-    pagos_data = []
-    historial_data = []
-    
-    if conn:
-        cur = conn.cursor()
-        
-        # Obtenemos pedidos finalizados y calculamos el total pagado
-        cur.execute("""
-            SELECT 
-                p.id_pedido,
-                c.nombre_cliente,
-                p.total,
-                COALESCE(SUM(pg.monto), 0) as total_pagado
-            FROM pedidos p
-            JOIN clientes c ON p.id_cliente = c.id_cliente
-            LEFT JOIN pagos pg ON p.id_pedido = pg.id_pedido
-            WHERE p.estado IN ('finalizado', 'entregado')
-            GROUP BY p.id_pedido, c.nombre_cliente, p.total
-            ORDER BY p.fecha_pedido DESC
-        """)
-        
-        rows = cur.fetchall()
-        for row in rows:
-            id_pedido = row[0]
-            nombre_cliente = row[1]
-            total = row[2]
-            total_pagado = row[3]
-            
-            # Calcular lo que falta por pagar
-            falta_pagar = max(0, total - total_pagado)
-            
-            # Determinar estado de pago
-            if total_pagado >= total:
-                estado = 'pagado'
-            else:
-                estado = 'pendiente'
-            
-            pagos_data.append({
-                'id_pedido': id_pedido,
-                'nombre_cliente': nombre_cliente,
-                'total': total,
-                'total_pagado': total_pagado,
-                'falta_pagar': falta_pagar,
-                'estado': estado
-            })
-        
-        # Obtener historial de todos los pagos
-        cur.execute("""
-            SELECT 
-                pg.id_pago,
-                pg.id_pedido,
-                c.nombre_cliente,
-                pg.monto,
-                pg.metodo,
-                pg.fecha_pago
-            FROM pagos pg
-            JOIN pedidos p ON pg.id_pedido = p.id_pedido
-            JOIN clientes c ON p.id_cliente = c.id_cliente
-            ORDER BY pg.fecha_pago DESC
-            LIMIT 50
-        """)
-        
-        rows = cur.fetchall()
-        for row in rows:
-            historial_data.append({
-                'id_pago': row[0],
-                'id_pedido': row[1],
-                'nombre_cliente': row[2],
-                'monto': row[3],
-                'metodo': row[4],
-                'fecha_pago': row[5]
-            })
-        
-        cur.close()
-        conn.close()
+    pagos_data = PaymentsManager.obtener_cuentas_por_cobrar()
+    historial_data = PaymentsManager.obtener_historial(50)
     
     return render_template('pagos.html', pagos=pagos_data, historial=historial_data)
 
@@ -982,39 +925,10 @@ def registrar_pago(id_pedido):
     metodo = request.form['metodo']
     monto = float(request.form['monto'])
     
-    conn = get_connection()
-    if conn:
-        cur = conn.cursor()
-        
-        # Obtener el total del pedido y lo ya pagado
-        cur.execute("""
-            SELECT p.total, COALESCE(SUM(pg.monto), 0) as total_pagado
-            FROM pedidos p
-            LEFT JOIN pagos pg ON p.id_pedido = pg.id_pedido
-            WHERE p.id_pedido = ?
-            GROUP BY p.total
-        """, (id_pedido,))
-        
-        row = cur.fetchone()
-        if row:
-            total_pedido = row[0]
-            total_pagado = row[1]
-            falta_pagar = total_pedido - total_pagado
-            
-            # Validar que el monto no exceda lo que falta
-            if monto > falta_pagar:
-                monto = falta_pagar
-            
-            # Insertar el pago
-            cur.execute("""
-                INSERT INTO pagos (id_pedido, monto, metodo)
-                VALUES (?, ?, ?)
-            """, (id_pedido, monto, metodo))
-            
-            conn.commit()
-        
-        cur.close()
-        conn.close()
+    resultado = escribir(PaymentsManager.registrar_pago, id_pedido, monto, metodo)
+    
+    if not resultado['success']:
+        print(f"Error al registrar pago: {resultado['error']}")
     
     return redirect(url_for('pagos'))
 
@@ -1022,241 +936,100 @@ def registrar_pago(id_pedido):
 @app.route('/facturacion')
 def facturacion():
     """Muestra pedidos completamente pagados listos para facturar"""
-    conn = get_connection()
-    pedidos_pagados = []
-    
-    if conn:
-        cur = conn.cursor()
-        
-        # Obtener pedidos finalizados o entregados
-        cur.execute("""
-            SELECT 
-                p.id_pedido,
-                c.nombre_cliente,
-                p.total,
-                p.estado,
-                p.fecha_pedido
-            FROM pedidos p
-            JOIN clientes c ON p.id_cliente = c.id_cliente
-            WHERE p.estado IN ('finalizado', 'entregado')
-        """)
-        
-        pedidos = cur.fetchall()
-        
-        # Verificar cuáles están completamente pagados
-        for pedido in pedidos:
-            id_pedido = pedido[0]
-            total_pedido = pedido[2]
-            
-            # Calcular total pagado
-            cur.execute("""
-                SELECT COALESCE(SUM(monto), 0)
-                FROM pagos
-                WHERE id_pedido = ?
-            """, (id_pedido,))
-            
-            total_pagado = cur.fetchone()[0]
-            
-            # Solo incluir si está completamente pagado
-            if total_pagado >= total_pedido:
-                pedidos_pagados.append({
-                    'id_pedido': pedido[0],
-                    'nombre_cliente': pedido[1],
-                    'total': pedido[2],
-                    'estado': pedido[3],
-                    'fecha_pedido': pedido[4]
-                })
-        
-        cur.close()
-        conn.close()
+    pedidos_pagados = PaymentsManager.obtener_pedidos_facturables()
     
     return render_template('facturacion.html', pedidos_pagados=pedidos_pagados)
 
 @app.route('/generar_factura/<int:id_pedido>', methods=['POST'])
 def generar_factura(id_pedido):
-    """Genera una factura en PDF para un pedido"""
-    from reportlab.lib.pagesizes import letter
-    from reportlab.pdfgen import canvas
-    from io import BytesIO
-    
-    conn = get_connection()
-    if not conn:
-        return "Error de conexión", 500
-    
+    """
+    Emite la factura del pedido (folio y PDF guardado) y la descarga; si ya
+    estaba emitida entrega el PDF guardado. regenerar=1 la vuelve a generar.
+    """
     try:
-        cur = conn.cursor()
-        
-        # Obtener información del pedido y cliente con datos fiscales
-        cur.execute("""
-            SELECT 
-                p.id_pedido,
-                c.nombre_cliente,
-                c.correo,
-                c.telefono,
-                c.direccion,
-                p.fecha_pedido,
-                p.total,
-                dp.cantidad,
-                comb.nombre_guardado,
-                c.rfc,
-                c.razon_social,
-                c.uso_cfdi,
-                c.regimen_fiscal,
-                c.correo_facturacion,
-                dp.precio_unitario
-            FROM pedidos p
-            JOIN clientes c ON p.id_cliente = c.id_cliente
-            JOIN detalle_pedido dp ON p.id_pedido = dp.id_pedido
-            LEFT JOIN combinaciones comb ON dp.id_producto = comb.id_combinacion
-            WHERE p.id_pedido = ?
-        """, (id_pedido,))
-        
-        pedido_info = cur.fetchone()
-        
-        if not pedido_info:
-            cur.close()
-            conn.close()
-            return "Pedido no encontrado", 404
-        
-        # Calcular subtotal e IVA
-        total_con_iva = pedido_info[6]
-        subtotal = total_con_iva / 1.16  # Calcular subtotal sin IVA
-        iva = total_con_iva - subtotal  # IVA es la diferencia
-        precio_unitario_sin_iva = pedido_info[14] / 1.16 if pedido_info[14] else 0
-        
-        # Crear PDF
-        buffer = BytesIO()
-        c = canvas.Canvas(buffer, pagesize=letter)
-        width, height = letter
-        
-        # Dibujar encabezado con logo y título
-        y = dibujar_encabezado_pdf(c, width, height, f"FACTURA #{pedido_info[0]}")
-        
-        # Información de la factura
-        c.setFont("Helvetica", 11)
-        y -= 10
-        c.drawString(40, y, f"Fecha de emisión: {pedido_info[5][:10] if pedido_info[5] else datetime.now().strftime('%d/%m/%Y')}")
-        y -= 35
-        
-        # Datos del cliente
-        c.setFont("Helvetica-Bold", 13)
-        c.drawString(40, y, "Datos del Cliente:")
-        y -= 22
-        
-        c.setFont("Helvetica", 10)
-        c.drawString(40, y, f"Nombre: {pedido_info[1]}")
-        y -= 15
-        if pedido_info[10]:  # razon_social
-            c.drawString(40, y, f"Razón Social: {pedido_info[10]}")
-            y -= 15
-        if pedido_info[9]:  # rfc
-            c.drawString(40, y, f"RFC: {pedido_info[9]}")
-            y -= 15
-        if pedido_info[12]:  # regimen_fiscal
-            c.drawString(40, y, f"Régimen Fiscal: {pedido_info[12]}")
-            y -= 15
-        c.drawString(40, y, f"Teléfono: {pedido_info[3] or 'N/A'}")
-        y -= 15
-        c.drawString(40, y, f"Dirección: {pedido_info[4] or 'N/A'}")
-        y -= 15
-        if pedido_info[13]:  # correo_facturacion
-            c.drawString(40, y, f"Email Facturación: {pedido_info[13]}")
-            y -= 15
-        if pedido_info[11]:  # uso_cfdi
-            c.drawString(40, y, f"Uso CFDI: {pedido_info[11]}")
-            y -= 15
-        y -= 20
-        
-        # Detalles del pedido
-        c.setFont("Helvetica-Bold", 13)
-        c.drawString(40, y, "Detalles del Pedido:")
-        y -= 25
-        
-        # Encabezados de tabla
-        c.setFont("Helvetica-Bold", 10)
-        c.drawString(40, y, "Producto")
-        c.drawString(280, y, "Cantidad")
-        c.drawString(350, y, "P. Unitario")
-        c.drawString(450, y, "Subtotal")
-        y -= 5
-        c.setStrokeColorRGB(0.7, 0.3, 0.5)
-        c.line(40, y, width - 40, y)
-        y -= 20
-        
-        # Productos
-        c.setFont("Helvetica", 10)
-        c.setFillColorRGB(0, 0, 0)
-        c.drawString(40, y, pedido_info[8] or "Producto sin nombre")
-        c.drawString(295, y, str(pedido_info[7]))
-        c.drawString(350, y, f"${precio_unitario_sin_iva:.2f}")
-        subtotal_producto = precio_unitario_sin_iva * pedido_info[7]
-        c.drawString(450, y, f"${subtotal_producto:.2f}")
-        y -= 35
-        
-        # Desglose de totales
-        c.setStrokeColorRGB(0.7, 0.3, 0.5)
-        c.setLineWidth(1)
-        c.line(280, y, width - 40, y)
-        y -= 25
-        
-        # Subtotal
-        c.setFont("Helvetica", 12)
-        c.drawString(320, y, "Subtotal:")
-        c.drawString(450, y, f"${subtotal:.2f}")
-        y -= 20
-        
-        # IVA
-        c.drawString(320, y, "IVA (16%):")
-        c.drawString(450, y, f"${iva:.2f}")
-        y -= 25
-        
-        # Total
-        c.setStrokeColorRGB(0.7, 0.3, 0.5)
-        c.setLineWidth(2)
-        c.line(280, y, width - 40, y)
-        y -= 25
-        c.setFont("Helvetica-Bold", 15)
-        c.setFillColorRGB(0.7, 0.3, 0.5)
-        c.drawString(320, y, "TOTAL:")
-        c.drawString(450, y, f"${total_con_iva:.2f}")
-        
-        # Nota sobre IVA
-        y -= 40
-        c.setFont("Helvetica-Oblique", 9)
-        c.setFillColorRGB(0.4, 0.4, 0.4)
-        c.drawString(40, y, "* Los precios incluyen IVA del 16% según la legislación vigente")
-        
-        # Pie de página
-        c.setFont("Helvetica-Oblique", 9)
-        c.setFillColorRGB(0.4, 0.4, 0.4)
-        c.drawString(40, 60, "Gracias por su compra")
-        c.setFont("Helvetica", 8)
-        c.drawString(40, 45, "ChromaBags - Sistema Integral de Gestión para Confeccionistas de Bolsas")
-        c.drawString(40, 30, "www.chromabags.com | contacto@chromabags.com")
-        
-        c.save()
-        buffer.seek(0)
-        
-        cur.close()
-        conn.close()
+        resultado = InvoiceManager.emitir(id_pedido, regenerar=request.form.get('regenerar') == '1')
+        if not resultado['success']:
+            if resultado['error'] == 'Pedido no encontrado':
+                return "Pedido no encontrado", 404
+            return f"Error al generar factura: {resultado['error']}", 500
         
-        return send_file(
-            buffer,
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name=f'factura_{id_pedido}.pdf'
-        )
+        return _enviar_factura(resultado['factura'], resultado['ruta'])
         
     except Exception as e:
         print(f"Error generando factura: {e}")
-        if conn:
-            conn.close()
         return f"Error al generar factura: {str(e)}", 500
 
+@app.route('/facturas/<int:id_pedido>/pdf')
+def descargar_factura(id_pedido):
+    """PDF guardado de una factura ya emitida (con ETag y descargas por rangos)"""
+    factura = InvoiceManager.obtener_factura(id_pedido)
+    if not factura:
+        return "Factura no encontrada", 404
+    
+    ruta = InvoiceManager.ruta_pdf(factura)
+    if not os.path.exists(ruta):
+        resultado = InvoiceManager.emitir(id_pedido)
+        if not resultado['success']:
+            return f"Error al generar factura: {resultado['error']}", 500
+        ruta = resultado['ruta']
+    
+    return _enviar_factura(factura, ruta)
+
+@app.route('/facturas/lote', methods=['POST'])
+def facturar_lote():
+    """
+    Emite las facturas de varios pedidos y descarga un ZIP con sus PDFs.
+    Recibe pedidos (varios campos del formulario o lista en JSON) y
+    regenerar=1 opcional; los pedidos no facturables se omiten.
+    """
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        valores, regenerar = data.get('pedidos'), bool(data.get('regenerar'))
+    else:
+        valores, regenerar = request.form.getlist('pedidos'), request.form.get('regenerar') == '1'
+    if not isinstance(valores, list) or not valores:
+        return "Seleccione al menos un pedido", 400
+    try:
+        ids_pedido = [int(valor) for valor in valores]
+    except (TypeError, ValueError):
+        return "Pedidos no válidos", 400
+    
+    resultado = InvoiceManager.emitir_lote(ids_pedido, regenerar=regenerar)
+    if not resultado['success']:
+        return f"Error al generar facturas: {resultado['error']}", 500
+    if not resultado['facturas']:
+        return "Ninguno de los pedidos está listo para facturar", 400
+    if resultado['omitidos']:
+        print(f"Pedidos omitidos del lote de facturas: {resultado['omitidos']}")
+    
+    archivo = tempfile.SpooledTemporaryFile(max_size=2 * 1024 * 1024)
+    InvoiceManager.escribir_zip(resultado['facturas'], archivo)
+    archivo.seek(0)
+    
+    return send_file(archivo,
+                     mimetype=MIMETYPE_ZIP,
+                     as_attachment=True,
+                     download_name=f'facturas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.zip')
+
+def _enviar_factura(factura, ruta):
+    # conditional: responde 304 a If-None-Match y 206 a Range sobre el archivo guardado
+    return send_file(
+        ruta,
+        mimetype=MIMETYPE_PDF,
+        as_attachment=True,
+        download_name=f"factura_{factura['folio']}.pdf",
+        conditional=True,
+        etag=True
+    )
+
 # ==================== REPORTES ====================
 @app.route('/reportes')
+@solo_lectura
 def reportes():
-    datos = OrdersManager.obtener_pedidos_por_estado()
+    tamano = limitar_tamano(request.args.get('tamano'))
+    despues = decodificar_cursor(request.args.get('despues'), 1)
+    datos = OrdersManager.obtener_pedidos_por_estado(tamano + 1, despues[0] if despues else None)
+    pagina = paginar(datos['todos'], tamano, lambda p: (p[0],))
     estadisticas = OrdersManager.obtener_estadisticas_dashboard()
     
     # Valores por defecto si no hay estadísticas
@@ -1276,9 +1049,25 @@ def reportes():
                          por_entregar=datos['por_entregar'],
                          entregados=datos['entregados'],
                          vencidos=datos['vencidos'],
-                         todos=datos['todos'],
+                         todos=pagina['items'],
+                         conteos=datos['conteos'],
+                         siguiente=pagina['siguiente'],
+                         tamano=tamano,
                          estadisticas=estadisticas)
 
+@app.route('/api/reportes/pedidos')
+@solo_lectura
+def api_reportes_pedidos():
+    """Tabla 'todos' de reportes, paginada por id_pedido descendente"""
+    tamano = limitar_tamano(request.args.get('tamano'))
+    despues = decodificar_cursor(request.args.get('despues'), 1)
+    datos = OrdersManager.obtener_pedidos_por_estado(tamano + 1, despues[0] if despues else None)
+    pagina = paginar(datos['todos'], tamano, lambda p: (p[0],))
+    columnas = ('id_pedido', 'nombre_cliente', 'nombre_producto', 'fecha_pedido',
+                'fecha_entrega', 'estado', 'total')
+    return jsonify({'items': [dict(zip(columnas, p)) for p in pagina['items']],
+                    'siguiente': pagina['siguiente'], 'tamano': tamano})
+
 # ==================== RESPALDO ====================
 @app.route('/respaldo')
 def respaldo():
@@ -1320,18 +1109,75 @@ def descargar_respaldo_existente(nombre_archivo):
         download_name=nombre_archivo
     )
 
+# ==================== TRABAJOS EN SEGUNDO PLANO ====================
+@app.route('/api/jobs', methods=['POST'])
+def api_crear_trabajo():
+    """
+    Pone en cola una exportación: {"tipo": "historial_cotizaciones", "parametros": {...}}
+    Tipos: inventario_excel, historial_cotizaciones, factura
+    """
+    data = request.get_json(silent=True) or {}
+    resultado = JobsManager.enviar(app, data.get('tipo'), data.get('parametros'))
+    if not resultado['success']:
+        return jsonify(resultado), 400
+    resultado['url_estado'] = url_for('api_estado_trabajo', id_trabajo=resultado['id_trabajo'])
+    return jsonify(resultado), 202
+
+@app.route('/api/jobs/<id_trabajo>')
+def api_estado_trabajo(id_trabajo):
+    trabajo = JobsManager.obtener(id_trabajo)
+    if not trabajo:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    respuesta = {
+        clave: trabajo[clave]
+        for clave in ('id_trabajo', 'tipo', 'parametros', 'estado', 'progreso', 'error',
+                      'fecha_creacion', 'fecha_fin')
+    }
+    if trabajo['estado'] == 'terminado':
+        respuesta['url_resultado'] = url_for('api_resultado_trabajo', id_trabajo=id_trabajo)
+    return jsonify(respuesta)
+
+@app.route('/api/jobs/<id_trabajo>/resultado')
+def api_resultado_trabajo(id_trabajo):
+    trabajo = JobsManager.obtener(id_trabajo)
+    if not trabajo:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    if trabajo['estado'] != 'terminado' or not os.path.exists(trabajo['ruta_resultado'] or ''):
+        return jsonify({'error': 'El resultado aún no está disponible', 'estado': trabajo['estado']}), 409
+    return send_file(trabajo['ruta_resultado'],
+                     mimetype=trabajo['mimetype'],
+                     as_attachment=True,
+                     download_name=trabajo['nombre_archivo'])
+
+# ==================== BÚSQUEDA ====================
+@app.route('/api/buscar')
+def api_buscar():
+    """Búsqueda global por prefijo en clientes, diseños, pedidos y cotizaciones"""
+    texto = request.args.get('q', '')
+    tipo = request.args.get('tipo')
+    if tipo and tipo not in SearchManager.TIPOS:
+        return jsonify({'success': False, 'error': f'Tipo inválido: {tipo}'}), 400
+    limite = min(max(request.args.get('limite', 20, type=int), 1), 100)
+    
+    resultados = SearchManager.buscar(texto, tipo, limite)
+    
+    # Enlace a la página donde se gestiona cada resultado
+    for r in resultados:
+        if r['tipo'] == 'cliente':
+            r['url'] = url_for('clientes')
+        elif r['tipo'] == 'combinacion':
+            r['url'] = url_for('catalogo')
+        elif r['tipo'] == 'pedido':
+            r['url'] = url_for('editar_pedido', id_pedido=r['id'])
+        else:
+            r['url'] = url_for('api_cotizacion_detalle', id=r['id'])
+    
+    return jsonify(resultados)
+
 # ==================== APIs DE COLOR Y DISEÑO ====================
 @app.route('/api/colores_paleta/<int:id_paleta>')
 def api_colores_paleta(id_paleta):
-    conn = get_connection()
-    colores = []
-    if conn:
-        cur = conn.cursor()
-        cur.execute("SELECT nombre_color, codigo_hex FROM colores WHERE id_paleta = ?;", (id_paleta,))
-        colores = [{'nombre': row[0], 'hex': row[1]} for row in cur.fetchall()]
-        cur.close()
-        conn.close()
-    return jsonify(colores)
+    return jsonify(ReferenceCache.colores_paleta(id_paleta))
 
 @app.route('/api/generar_diseno', methods=['POST'])
 def api_generar_diseno():
@@ -1428,31 +1274,20 @@ def ver_combinacion(id):
     
     if conn:
         cur = conn.cursor()
-        cur.execute("""
-            SELECT c.*, mb.nombre_modelo, mb.tipo
-            FROM combinaciones c
-            JOIN modelos_bolsas mb ON c.id_modelo = mb.id_modelo
-            WHERE c.id_combinacion = ?
-        """, (id,))
-        combinacion = cur.fetchone()
-        
-        if combinacion:
-            color_ids = [
-                combinacion[3],
-                combinacion[4],
-                combinacion[5],
-                combinacion[6]
-            ]
-            
-            for cid in color_ids:
+        cur.execute("SELECT * FROM combinaciones WHERE id_combinacion = ?", (id,))
+        fila = cur.fetchone()
+        cur.close()
+        conn.close()
+
+        # Modelo y colores salen de la caché de referencia
+        modelo = ReferenceCache.modelo(fila[1]) if fila else None
+        if modelo:
+            combinacion = tuple(fila) + (modelo[1], modelo[2])
+            for cid in combinacion[3:7]:
                 if cid:
-                    cur.execute("SELECT nombre_color, codigo_hex FROM colores WHERE id_color = ?", (cid,))
-                    color = cur.fetchone()
+                    color = ReferenceCache.color(cid)
                     if color:
                         colores.append(color)
-        
-        cur.close()
-        conn.close()
     
     return render_template('ver_combinacion.html', combinacion=combinacion, colores=colores)
 
@@ -1,15 +1,610 @@
 import sqlite3
 import os
+import threading
+import queue
+import functools
+from concurrent.futures import Future
+from urllib.request import pathname2url
+
+from flask import g, has_app_context
+
+from modules import sql_monitor
+
+# Configuración del pool (sobrescribible por variables de entorno o app.config)
+DB_PATH = os.environ.get('CHROMABAGS_DB', os.path.join('database', 'ChromaBags.db'))
+POOL_SIZE = int(os.environ.get('CHROMABAGS_POOL_SIZE', 8))
+POOL_TIMEOUT = float(os.environ.get('CHROMABAGS_POOL_TIMEOUT', 10))
+POOL_LECTURA_SIZE = int(os.environ.get('CHROMABAGS_POOL_LECTURA_SIZE', 4))
+STATEMENT_CACHE = int(os.environ.get('CHROMABAGS_STATEMENT_CACHE', 256))
+PERFIL = os.environ.get('CHROMABAGS_PERFIL', 'escritorio')
+GROUP_COMMIT = os.environ.get('CHROMABAGS_GROUP_COMMIT', '1') != '0'
+LOTE_MAXIMO = int(os.environ.get('CHROMABAGS_LOTE_MAXIMO', 64))
+LOTE_ESPERA = float(os.environ.get('CHROMABAGS_LOTE_ESPERA', 0))  # segundos
+
+# Perfiles de almacenamiento: PRAGMAs que se aplican a cada conexión nueva.
+# 'escritorio' para el launcher (un usuario), 'servidor' para gunicorn (varios workers).
+PERFILES = {
+    'escritorio': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'cache_size': -16000,           # ~16 MB
+            'mmap_size': 64 * 1024 * 1024,
+            'busy_timeout': 5000,           # ms
+            'temp_store': 'MEMORY',
+            'journal_size_limit': 32 * 1024 * 1024,
+            'wal_autocheckpoint': 1000,     # páginas
+        },
+        # Conexiones de solo lectura (reportes y exportaciones)
+        'lectura': {
+            'cache_size': -32000,
+            'mmap_size': 128 * 1024 * 1024,
+            'busy_timeout': 5000,
+            'temp_store': 'MEMORY',
+        },
+        'checkpoint_intervalo': 60,         # segundos
+        'checkpoint_limite_wal': 32 * 1024 * 1024,
+    },
+    'servidor': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'cache_size': -64000,           # ~64 MB
+            'mmap_size': 256 * 1024 * 1024,
+            'busy_timeout': 15000,
+            'temp_store': 'MEMORY',
+            'journal_size_limit': 64 * 1024 * 1024,
+            'wal_autocheckpoint': 2000,
+        },
+        'lectura': {
+            'cache_size': -128000,
+            'mmap_size': 512 * 1024 * 1024,
+            'busy_timeout': 15000,
+            'temp_store': 'MEMORY',
+        },
+        'checkpoint_intervalo': 30,
+        'checkpoint_limite_wal': 64 * 1024 * 1024,
+    },
+}
+
+
+def aplicar_perfil(conn, perfil=None, solo_lectura=False):
+    """
+    Aplica los PRAGMAs del perfil de almacenamiento a una conexión
+    """
+    config = PERFILES.get(perfil or PERFIL, PERFILES['escritorio'])
+    pragmas = config['lectura'] if solo_lectura else config['pragmas']
+    for pragma, valor in pragmas.items():
+        conn.execute(f"PRAGMA {pragma} = {valor}")
+    if solo_lectura:
+        conn.execute("PRAGMA query_only = 1")
+    return conn
+
+
+def _uri_solo_lectura(db_path):
+    return 'file:' + pathname2url(os.path.abspath(db_path)) + '?mode=ro'
+
+
+class PoolAgotadoError(sqlite3.OperationalError):
+    """No hubo conexión libre en el pool dentro del tiempo de espera"""
+
+
+class ConexionPool(sqlite3.Connection):
+    """
+    Conexión SQLite que puede pertenecer a un pool.
+    Mientras está asignada a una solicitud, close() no la cierra:
+    se libera al terminar el contexto de la aplicación.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool = None
+        self._en_solicitud = False
+        self._en_lote = False
+
+    def cursor(self, factory=sql_monitor.CursorInstrumentado):
+        return super().cursor(factory)
+
+    # Connection.execute() crea su cursor en C sin pasar por cursor()
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, secuencia):
+        return self.cursor().executemany(sql, secuencia)
+
+    def close(self):
+        if self._en_solicitud or self._en_lote:
+            return
+        super().close()
+
+    def commit(self):
+        # Dentro de un lote del escritor, el commit lo hace el escritor al final
+        if self._en_lote:
+            return
+        super().commit()
+
+    def rollback(self):
+        # Dentro de un lote solo se deshace la operación actual
+        if self._en_lote:
+            self.execute("ROLLBACK TO operacion")
+            return
+        super().rollback()
+
+
+class PoolConexiones:
+    """
+    Pool de conexiones SQLite reutilizables.
+    Mantiene hasta `tamano` conexiones prestadas a la vez; cada conexión
+    conserva su caché de sentencias preparadas entre solicitudes.
+    Con solo_lectura=True abre las conexiones con mode=ro y query_only.
+    """
+
+    def __init__(self, db_path, tamano=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 cached_statements=STATEMENT_CACHE, solo_lectura=False):
+        self.db_path = db_path
+        self.tamano = tamano
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self.solo_lectura = solo_lectura
+        self._libres = queue.LifoQueue()
+        self._cupos = threading.BoundedSemaphore(tamano)
+        self._cerrado = False
+
+    def _conectar(self):
+        if self.solo_lectura:
+            destino, uri = _uri_solo_lectura(self.db_path), True
+        else:
+            destino, uri = self.db_path, False
+        conn = sqlite3.connect(
+            destino,
+            uri=uri,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+            factory=ConexionPool
+        )
+        conn.row_factory = sqlite3.Row
+        conn._pool = self
+        aplicar_perfil(conn, solo_lectura=self.solo_lectura)
+        return conn
+
+    def adquirir(self):
+        """
+        Entrega una conexión libre (o crea una nueva si hay cupo).
+        Lanza PoolAgotadoError si no se libera ninguna a tiempo.
+        """
+        if not self._cupos.acquire(timeout=self.timeout):
+            raise PoolAgotadoError(
+                f"Pool agotado: {self.tamano} conexiones ocupadas por más de {self.timeout}s"
+            )
+        try:
+            try:
+                return self._libres.get_nowait()
+            except queue.Empty:
+                return self._conectar()
+        except Exception:
+            self._cupos.release()
+            raise
+
+    def liberar(self, conn):
+        """
+        Devuelve una conexión al pool, descartando transacciones sin confirmar
+        """
+        conn._en_solicitud = False
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            if self._cerrado:
+                conn.close()
+            else:
+                self._libres.put(conn)
+        except sqlite3.Error:
+            # Conexión dañada: se descarta y se abrirá otra cuando haga falta
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        finally:
+            self._cupos.release()
+
+    def cerrar(self):
+        """
+        Cierra todas las conexiones libres del pool
+        """
+        self._cerrado = True
+        while True:
+            try:
+                conn = self._libres.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+
+
+_pool = None
+_pool_lectura = None
+_pool_lock = threading.Lock()
+
+
+def obtener_pool():
+    """
+    Obtiene (o crea) el pool de conexiones del proceso
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PoolConexiones(DB_PATH)
+    return _pool
+
+
+def obtener_pool_lectura():
+    """
+    Obtiene (o crea) el pool de conexiones de solo lectura del proceso
+    """
+    global _pool_lectura
+    if _pool_lectura is None:
+        with _pool_lock:
+            if _pool_lectura is None:
+                _pool_lectura = PoolConexiones(
+                    DB_PATH, POOL_LECTURA_SIZE, POOL_TIMEOUT, STATEMENT_CACHE,
+                    solo_lectura=True
+                )
+    return _pool_lectura
+
+
+def configurar(db_path=None, tamano=None, timeout=None, cached_statements=None,
+               perfil=None, tamano_lectura=None):
+    """
+    Cambia la configuración de conexión y reinicia los pools
+    """
+    global DB_PATH, POOL_SIZE, POOL_TIMEOUT, STATEMENT_CACHE, PERFIL, POOL_LECTURA_SIZE
+    global _pool, _pool_lectura
+    with _pool_lock:
+        if perfil is not None:
+            if perfil not in PERFILES:
+                raise ValueError(f"Perfil de almacenamiento desconocido: {perfil}")
+            PERFIL = perfil
+        if db_path is not None:
+            DB_PATH = db_path
+        if tamano is not None:
+            POOL_SIZE = int(tamano)
+        if timeout is not None:
+            POOL_TIMEOUT = float(timeout)
+        if cached_statements is not None:
+            STATEMENT_CACHE = int(cached_statements)
+        if tamano_lectura is not None:
+            POOL_LECTURA_SIZE = int(tamano_lectura)
+
+        if _pool is not None:
+            _pool.cerrar()
+        if _pool_lectura is not None:
+            _pool_lectura.cerrar()
+        _pool = PoolConexiones(DB_PATH, POOL_SIZE, POOL_TIMEOUT, STATEMENT_CACHE)
+        # El pool de lectura se crea al primer uso: la BD debe existir para abrirla con mode=ro
+        _pool_lectura = None
+
+
+class CheckpointerWAL(threading.Thread):
+    """
+    Hilo en segundo plano que mantiene acotado el archivo -wal.
+    Hace un checkpoint PASSIVE periódico y uno TRUNCATE cuando el -wal
+    supera el límite del perfil.
+    """
+
+    def __init__(self, db_path, intervalo, limite_wal):
+        super().__init__(name='checkpointer-wal', daemon=True)
+        self.db_path = db_path
+        self.intervalo = intervalo
+        self.limite_wal = limite_wal
+        self._detener = threading.Event()
+
+    def checkpoint(self, conn):
+        """
+        Ejecuta un checkpoint y retorna (modo, busy, paginas_wal, paginas_copiadas)
+        """
+        ruta_wal = self.db_path + '-wal'
+        tamano_wal = os.path.getsize(ruta_wal) if os.path.exists(ruta_wal) else 0
+        modo = 'TRUNCATE' if tamano_wal > self.limite_wal else 'PASSIVE'
+        busy, paginas, copiadas = conn.execute(f"PRAGMA wal_checkpoint({modo})").fetchone()
+        return modo, busy, paginas, copiadas
+
+    def run(self):
+        conn = None
+        while not self._detener.wait(self.intervalo):
+            try:
+                if conn is None:
+                    conn = sqlite3.connect(self.db_path, timeout=POOL_TIMEOUT)
+                    aplicar_perfil(conn)
+                self.checkpoint(conn)
+            except sqlite3.Error as e:
+                print(f"⚠️  Error en checkpoint WAL: {e}")
+        if conn is not None:
+            conn.close()
+
+    def detener(self):
+        self._detener.set()
+
+
+_checkpointer = None
+
+
+def iniciar_checkpointer():
+    """
+    Inicia (una vez por proceso) el checkpointer del perfil activo
+    """
+    global _checkpointer
+    config = PERFILES.get(PERFIL, PERFILES['escritorio'])
+    if _checkpointer is not None and _checkpointer.db_path == DB_PATH:
+        return _checkpointer
+    if _checkpointer is not None:
+        _checkpointer.detener()
+
+    _checkpointer = CheckpointerWAL(
+        DB_PATH, config['checkpoint_intervalo'], config['checkpoint_limite_wal']
+    )
+    _checkpointer.start()
+    return _checkpointer
+
+
+# Conexión del lote en curso en el hilo de un escritor grupal
+_lote_local = threading.local()
+
+
+class EscritorGrupal:
+    """
+    Escritor único del proceso con commit agrupado (group commit).
+    Las operaciones de escritura se encolan; un solo hilo las ejecuta en lotes
+    dentro de una transacción (un fsync por lote) y cada operación queda
+    aislada en un SAVEPOINT para que su fallo no afecte a las demás.
+    """
+
+    def __init__(self, lote_maximo=LOTE_MAXIMO, espera=LOTE_ESPERA):
+        self.lote_maximo = lote_maximo
+        self.espera = espera
+        self.lotes = 0
+        self.operaciones = 0
+        self._cola = queue.Queue()
+        self._hilo = None
+        self._hilo_lock = threading.Lock()
+        self._conn = None
+
+    def en_hilo_escritor(self):
+        return threading.current_thread() is self._hilo
+
+    def enviar(self, funcion, *args, **kwargs):
+        """
+        Encola una operación de escritura y espera su resultado.
+        La función usa get_connection() como siempre; sus commit() se
+        difieren al final del lote y rollback() deshace solo esa operación.
+        """
+        if self.en_hilo_escritor():
+            return funcion(*args, **kwargs)
+
+        self._asegurar_hilo()
+        futuro = Future()
+        # La traza SQL de la solicitud acompaña a la operación al hilo escritor
+        futuro.traza = sql_monitor.traza_actual()
+        self._cola.put((futuro, funcion, args, kwargs))
+        return futuro.result()
+
+    def _asegurar_hilo(self):
+        if self._hilo is None or not self._hilo.is_alive():
+            with self._hilo_lock:
+                if self._hilo is None or not self._hilo.is_alive():
+                    self._hilo = threading.Thread(
+                        target=self._bucle, name='escritor-grupal', daemon=True
+                    )
+                    self._hilo.start()
+
+    def _obtener_conexion(self):
+        if self._conn is None or self._conn._pool.db_path != DB_PATH:
+            if self._conn is not None:
+                self._conn._en_lote = False
+                self._conn.close()
+            self._conn = obtener_pool()._conectar()
+        return self._conn
+
+    def _tomar_lote(self):
+        lote = [self._cola.get()]
+        if self.espera:
+            threading.Event().wait(self.espera)
+        while len(lote) < self.lote_maximo:
+            try:
+                lote.append(self._cola.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _bucle(self):
+        while True:
+            lote = self._tomar_lote()
+            try:
+                conn = self._obtener_conexion()
+            except sqlite3.Error as e:
+                for futuro, _, _, _ in lote:
+                    futuro.set_exception(e)
+                continue
+            self._ejecutar_lote(conn, lote)
+
+    def _ejecutar_lote(self, conn, lote):
+        resultados = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn._en_lote = True
+            _lote_local.conexion = conn
+
+            for futuro, funcion, args, kwargs in lote:
+                conn.execute("SAVEPOINT operacion")
+                sql_monitor.activar(getattr(futuro, 'traza', None))
+                try:
+                    resultado = funcion(*args, **kwargs)
+                    # Convención de los managers: {'success': False} no debe persistir nada
+                    if isinstance(resultado, dict) and resultado.get('success') is False:
+                        conn.execute("ROLLBACK TO operacion")
+                    resultados.append((futuro, resultado, None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO operacion")
+                    resultados.append((futuro, None, e))
+                finally:
+                    sql_monitor.activar(None)
+                conn.execute("RELEASE operacion")
+
+            conn._en_lote = False
+            conn.commit()
+        except Exception as e:
+            conn._en_lote = False
+            if conn.in_transaction:
+                conn.rollback()
+            for futuro, _, _, _ in lote:
+                futuro.set_exception(e)
+            return
+        finally:
+            conn._en_lote = False
+            _lote_local.conexion = None
+
+        self.lotes += 1
+        self.operaciones += len(lote)
+        for futuro, resultado, error in resultados:
+            if error is not None:
+                futuro.set_exception(error)
+            else:
+                futuro.set_result(resultado)
+
+
+_escritor = EscritorGrupal()
+
+
+def obtener_escritor():
+    return _escritor
+
+
+def escribir(funcion, *args, **kwargs):
+    """
+    Ejecuta una operación de escritura a través del escritor grupal
+    (o directamente si el group commit está desactivado). Sin escritor
+    grupal, la operación usa la conexión de escritura de la solicitud aunque
+    la ruta o el trabajo estén marcados como de solo lectura.
+    """
+    if not GROUP_COMMIT:
+        if has_app_context() and g.get('_db_solo_lectura'):
+            g._db_solo_lectura = False
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                g._db_solo_lectura = True
+        return funcion(*args, **kwargs)
+    return _escritor.enviar(funcion, *args, **kwargs)
+
+
+def _conexion_de_solicitud():
+    """
+    Conexión asignada al contexto actual de Flask (una por solicitud)
+    """
+    conn = g.get('_db_conn')
+    if conn is None:
+        conn = obtener_pool().adquirir()
+        conn._en_solicitud = True
+        g._db_conn = conn
+    return conn
+
+
+def _conexion_lectura_de_solicitud():
+    """
+    Conexión de solo lectura asignada al contexto actual de Flask
+    """
+    conn = g.get('_db_conn_lectura')
+    if conn is None:
+        conn = obtener_pool_lectura().adquirir()
+        conn._en_solicitud = True
+        g._db_conn_lectura = conn
+    return conn
+
+
+def liberar_conexion_solicitud(exception=None):
+    """
+    Devuelve a sus pools las conexiones de la solicitud (teardown de Flask)
+    """
+    for clave in ('_db_conn', '_db_conn_lectura'):
+        conn = g.pop(clave, None)
+        if conn is not None:
+            conn._pool.liberar(conn)
+
+
+def solo_lectura(vista):
+    """
+    Decorador para rutas de reportes y exportaciones: durante la solicitud,
+    get_connection() entrega la conexión de solo lectura.
+    """
+    @functools.wraps(vista)
+    def envoltura(*args, **kwargs):
+        g._db_solo_lectura = True
+        return vista(*args, **kwargs)
+    return envoltura
+
+
+def init_app(app):
+    """
+    Registra el pool en la aplicación Flask.
+    Claves opcionales en app.config: DB_PATH, DB_POOL_SIZE, DB_POOL_TIMEOUT,
+    DB_STATEMENT_CACHE, DB_PERFIL, DB_GROUP_COMMIT, DB_POOL_LECTURA_SIZE.
+    """
+    global GROUP_COMMIT
+    if app.config.get('DB_GROUP_COMMIT') is not None:
+        GROUP_COMMIT = bool(app.config['DB_GROUP_COMMIT'])
+    configurar(
+        db_path=app.config.get('DB_PATH'),
+        tamano=app.config.get('DB_POOL_SIZE'),
+        timeout=app.config.get('DB_POOL_TIMEOUT'),
+        cached_statements=app.config.get('DB_STATEMENT_CACHE'),
+        perfil=app.config.get('DB_PERFIL'),
+        tamano_lectura=app.config.get('DB_POOL_LECTURA_SIZE')
+    )
+    app.teardown_appcontext(liberar_conexion_solicitud)
+    if not app.config.get('TESTING'):
+        iniciar_checkpointer()
+
 
 def get_connection():
     """
-    Establece conexión con la base de datos SQLite3
+    Establece conexión con la base de datos SQLite3.
+    En el hilo del escritor grupal devuelve la conexión del lote en curso;
+    dentro de una solicitud Flask, siempre la misma conexión del pool;
+    fuera de ella (scripts) abre una conexión independiente.
     """
     try:
-        db_path = os.path.join('database', 'ChromaBags.db')
-        conn = sqlite3.connect(db_path)
+        conn = getattr(_lote_local, 'conexion', None)
+        if conn is not None:
+            return conn
+
+        if has_app_context():
+            if g.get('_db_solo_lectura'):
+                return _conexion_lectura_de_solicitud()
+            return _conexion_de_solicitud()
+
+        conn = sqlite3.connect(DB_PATH, timeout=POOL_TIMEOUT)
         conn.row_factory = sqlite3.Row  # Para acceder a las columnas por nombre
-        return conn
+        return aplicar_perfil(conn)
     except sqlite3.Error as e:
         print(f"Error al conectar con la base de datos: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+def get_read_connection():
+    """
+    Conexión de solo lectura (mode=ro, query_only, caché amplia) para reportes
+    y exportaciones: no bloquea ni compite con las escrituras.
+    """
+    try:
+        conn = getattr(_lote_local, 'conexion', None)
+        if conn is not None:
+            return conn
+
+        if has_app_context():
+            return _conexion_lectura_de_solicitud()
+
+        conn = sqlite3.connect(_uri_solo_lectura(DB_PATH), uri=True, timeout=POOL_TIMEOUT)
+        conn.row_factory = sqlite3.Row
+        return aplicar_perfil(conn, solo_lectura=True)
+    except sqlite3.Error as e:
+        print(f"Error al conectar con la base de datos (lectura): {e}")
+        return None
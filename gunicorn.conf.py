@@ -0,0 +1,12 @@
+"""
+Configuración de gunicorn para ChromaBags en modo servidor
+Ejecuta: gunicorn app:app
+"""
+import multiprocessing
+
+bind = "0.0.0.0:5050"
+workers = min(multiprocessing.cpu_count() * 2 + 1, 8)
+timeout = 120
+
+# Perfil de almacenamiento para varios workers concurrentes (ver db_connection.PERFILES)
+raw_env = ["CHROMABAGS_PERFIL=servidor"]
@@ -5,6 +5,7 @@ Ejecuta: python init_database.py
 import os
 from db_connection import get_connection
 from modules.db_helpers import insertar_datos_ejemplo
+from modules.migraciones import aplicar_migraciones, version_actual
 
 # ========================= VERIFICAR ESTRUCTURA =========================
 def verificar_estructura_db():
@@ -219,6 +220,27 @@ def crear_tablas():
     print("✅ Todas las tablas creadas correctamente")
     return True
 
+# ========================= MIGRACIONES =========================
+def migrar_esquema():
+    """
+    Aplica las migraciones versionadas pendientes (índices, etc.)
+    """
+    print("\n🗂️  Aplicando migraciones de esquema...")
+    try:
+        aplicadas = aplicar_migraciones(verbose=True)
+    except Exception as e:
+        print(f"  ⚠️  Error aplicando migraciones: {e}")
+        return False
+
+    if not aplicadas:
+        print("  ℹ️  El esquema ya está actualizado")
+
+    conn = get_connection()
+    if conn:
+        print(f"✅ Versión de esquema: {version_actual(conn)}")
+        conn.close()
+    return True
+
 # ========================= CONTAR REGISTROS =========================
 def contar_registros():
     """
@@ -342,15 +364,18 @@ def main():
     # 3. Crear tablas nuevas (pagos, facturas, etc.)
     crear_tablas()
     
-    # 4. Verificar estructura
+    # 4. Aplicar migraciones versionadas (índices)
+    migrar_esquema()
+    
+    # 5. Verificar estructura
     if not verificar_estructura_db():
         print("\n⚠️  Advertencia: La estructura de la BD está incompleta")
         print("   Asegúrate de que el archivo ChromaBags.db es correcto")
     
-    # 5. Contar registros existentes
+    # 6. Contar registros existentes
     contar_registros()
     
-    # 6. Preguntar si insertar datos de ejemplo
+    # 7. Preguntar si insertar datos de ejemplo
     conn = get_connection()
     if conn:
         cur = conn.cursor()
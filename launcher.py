@@ -11,6 +11,8 @@ from pathlib import Path
 
 def run_flask():
     """Ejecuta Flask en un thread separado"""
+    # Perfil de almacenamiento para un solo usuario (ver db_connection.PERFILES)
+    os.environ.setdefault('CHROMABAGS_PERFIL', 'escritorio')
     from app import app
     app.run(debug=False, host="127.0.0.1", port=5050, use_reloader=False)
 
@@ -0,0 +1,98 @@
+"""
+Tareas de mantenimiento de la base de datos
+Ejecutar: python mantenimiento_db.py saldos [--reparar]
+          python mantenimiento_db.py resumenes
+          python mantenimiento_db.py busqueda
+          python mantenimiento_db.py corte
+"""
+import argparse
+import sys
+
+from modules.migraciones import aplicar_migraciones
+from modules.inventory_manager import InventoryManager
+from modules.orders_manager import OrdersManager
+from modules.payments_manager import PaymentsManager
+from modules.search_manager import SearchManager
+
+
+def comando_saldos(args):
+    """Verifica (y opcionalmente repara) total_pagado, saldo y estado_pago de los pedidos"""
+    resultado = PaymentsManager.verificar_saldos(reparar=args.reparar)
+    if not resultado['success']:
+        print(f"❌ Error verificando saldos: {resultado['error']}")
+        return 1
+
+    print(f"📋 Pedidos revisados: {resultado['revisados']}")
+    for d in resultado['diferencias']:
+        print(f"  ⚠️  Pedido #{d['id_pedido']}: pagado {d['total_pagado']:.2f} "
+              f"(real {d['total_pagado_real']:.2f}), saldo {d['saldo']:.2f} "
+              f"(real {d['saldo_real']:.2f}), estado {d['estado_pago']} "
+              f"(real {d['estado_pago_real']})")
+
+    if not resultado['diferencias']:
+        print("✅ Los saldos coinciden con los pagos registrados")
+        return 0
+    if args.reparar:
+        print(f"✅ {resultado['reparados']} pedidos reparados")
+        return 0
+    print("ℹ️  Ejecuta con --reparar para corregir las diferencias")
+    return 1
+
+
+def comando_resumenes(args):
+    """Reconstruye las tablas de resumen del dashboard de reportes"""
+    resultado = OrdersManager.reconstruir_resumenes()
+    if not resultado['success']:
+        print(f"❌ Error reconstruyendo resúmenes: {resultado['error']}")
+        return 1
+
+    print(f"✅ Resúmenes reconstruidos ({resultado['pedidos']} pedidos)")
+    return 0
+
+
+def comando_busqueda(args):
+    """Reconstruye el índice de búsqueda de texto completo"""
+    resultado = SearchManager.reconstruir_indice()
+    if not resultado['success']:
+        print(f"❌ Error reconstruyendo índice: {resultado['error']}")
+        return 1
+
+    print(f"✅ Índice de búsqueda reconstruido ({resultado['documentos']} documentos)")
+    return 0
+
+
+def comando_corte(args):
+    """Guarda un corte de saldos del inventario (programar diario o semanal)"""
+    resultado = InventoryManager.tomar_corte()
+    if not resultado['success']:
+        print(f"❌ Error tomando corte de inventario: {resultado['error']}")
+        return 1
+
+    print(f"✅ Corte de inventario {resultado['fecha_corte']} ({resultado['materiales']} materiales)")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Mantenimiento de la base de datos de ChromaBags')
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+
+    saldos = subcomandos.add_parser('saldos', help='Verifica el libro de pagos de los pedidos')
+    saldos.add_argument('--reparar', action='store_true', help='Recalcula los pedidos con diferencias')
+    saldos.set_defaults(funcion=comando_saldos)
+
+    resumenes = subcomandos.add_parser('resumenes', help='Reconstruye los resúmenes del dashboard')
+    resumenes.set_defaults(funcion=comando_resumenes)
+
+    busqueda = subcomandos.add_parser('busqueda', help='Reconstruye el índice de búsqueda')
+    busqueda.set_defaults(funcion=comando_busqueda)
+
+    corte = subcomandos.add_parser('corte', help='Guarda un corte de saldos del inventario')
+    corte.set_defaults(funcion=comando_corte)
+
+    args = parser.parse_args(argv)
+    aplicar_migraciones()
+    return args.funcion(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,7 +2,7 @@
 Módulo para gestión de respaldos de base de datos
 """
 import os
-import shutil
+import sqlite3
 from datetime import datetime
 
 class BackupManager:
@@ -44,7 +44,16 @@ class BackupManager:
                 os.makedirs(carpeta_respaldos)
             
             ruta_respaldo = os.path.join(carpeta_respaldos, nombre_archivo)
-            shutil.copy2(ruta_bd_original, ruta_respaldo)
+            
+            # Usar la API de respaldo de SQLite: en modo WAL copiar el archivo
+            # omitiría los cambios que aún están en el -wal
+            origen = sqlite3.connect(ruta_bd_original)
+            destino = sqlite3.connect(ruta_respaldo)
+            try:
+                origen.backup(destino)
+            finally:
+                destino.close()
+                origen.close()
             
             # Obtener tamaño del archivo
             tamano = os.path.getsize(ruta_respaldo)
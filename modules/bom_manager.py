@@ -0,0 +1,222 @@
+"""
+Módulo de lista de materiales (BOM) por modelo de bolsa
+Calcula los materiales y el costo que requieren un conjunto de pedidos y
+cotizaciones con una sola consulta agregada.
+"""
+import json
+
+from db_connection import get_connection, get_read_connection
+from modules.cost_manager import CostManager
+from modules.reference_cache import ReferenceCache
+
+# '' = material general del modelo; el resto toma el color de esa parte de la combinación
+REGIONES = ('', 'principal', 'secundario', 'hilo', 'asa')
+
+
+class BOMManager:
+    """Gestiona la lista de materiales de cada modelo y los requerimientos de producción"""
+
+    @staticmethod
+    def definir_lista(id_modelo, materiales):
+        """
+        Reemplaza la lista de materiales de un modelo
+        materiales: [{id_material, cantidad, region (opcional)}, ...]
+        cantidad: consumo por bolsa, en la unidad de medida del material
+        """
+        filas = []
+        try:
+            for material in materiales:
+                region = material.get('region') or ''
+                if region not in REGIONES:
+                    return {'success': False, 'error': f'Región no válida: {region}'}
+                cantidad = float(material['cantidad'])
+                if cantidad <= 0:
+                    return {'success': False, 'error': 'La cantidad debe ser mayor a cero'}
+                filas.append((id_modelo, region, int(material['id_material']), cantidad))
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return {'success': False, 'error': 'Cada material requiere id_material y cantidad'}
+
+        conn = get_connection()
+        if not conn:
+            return {'success': False, 'error': 'Error de conexión a BD'}
+
+        try:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM lista_materiales WHERE id_modelo = ?", (id_modelo,))
+            cur.executemany("""
+                INSERT INTO lista_materiales (id_modelo, region, id_material, cantidad)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(id_modelo, region, id_material) DO UPDATE
+                SET cantidad = cantidad + excluded.cantidad
+            """, filas)
+            CostManager.actualizar_productos(cur, [id_modelo])
+
+            conn.commit()
+            cur.close()
+            conn.close()
+
+            return {'success': True, 'materiales': len(filas)}
+
+        except Exception as e:
+            print(f"Error guardando lista de materiales: {e}")
+            if conn:
+                conn.rollback()
+                conn.close()
+            return {'success': False, 'error': str(e)}
+
+    @staticmethod
+    def obtener_lista(id_modelo):
+        """
+        Lista de materiales de un modelo con su costo por bolsa
+        """
+        conn = get_connection()
+        if not conn:
+            return []
+
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT lm.id_material, m.nombre_material, m.unidad_medida, lm.region,
+                       lm.cantidad, m.costo_unitario
+                FROM lista_materiales lm
+                JOIN materiales m ON m.id_material = lm.id_material
+                WHERE lm.id_modelo = ?
+                ORDER BY lm.region, m.nombre_material
+            """, (id_modelo,))
+
+            lista = [{
+                'id_material': row[0],
+                'nombre_material': row[1],
+                'unidad_medida': row[2],
+                'region': row[3],
+                'cantidad': row[4],
+                'costo': round(row[4] * row[5], 2)
+            } for row in cur.fetchall()]
+
+            cur.close()
+            conn.close()
+
+            return lista
+
+        except Exception as e:
+            print(f"Error obteniendo lista de materiales: {e}")
+            return []
+
+    @staticmethod
+    def calcular_requerimientos(ids_pedidos=(), ids_cotizaciones=()):
+        """
+        Materiales totales y costo para producir los pedidos y cotizaciones dados.
+        Una sola consulta: junta las líneas, las cruza con la lista de materiales
+        del modelo de cada combinación y agrega las cantidades en SQL.
+        Cada material trae su desglose por color (regiones de la combinación).
+        """
+        conn = get_read_connection()
+        if not conn:
+            return {'success': False, 'error': 'Error de conexión a BD'}
+
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                WITH lineas (id_combinacion, cantidad) AS (
+                    SELECT id_producto, cantidad
+                    FROM detalle_pedido
+                    WHERE id_pedido IN (SELECT value FROM json_each(?))
+                    UNION ALL
+                    SELECT id_material, cantidad
+                    FROM detalle_cotizacion
+                    WHERE id_cotizacion IN (SELECT value FROM json_each(?))
+                ),
+                bolsas AS (
+                    SELECT id_combinacion, SUM(cantidad) AS bolsas
+                    FROM lineas
+                    GROUP BY id_combinacion
+                )
+                SELECT lm.id_material, m.nombre_material, m.unidad_medida, m.costo_unitario,
+                       CASE lm.region
+                           WHEN 'principal' THEN c.id_color_principal
+                           WHEN 'secundario' THEN c.id_color_secundario
+                           WHEN 'hilo' THEN c.id_color_hilo
+                           WHEN 'asa' THEN c.id_color_asa
+                       END AS id_color,
+                       SUM(b.bolsas * lm.cantidad) AS cantidad
+                FROM bolsas b
+                JOIN combinaciones c ON c.id_combinacion = b.id_combinacion
+                JOIN lista_materiales lm ON lm.id_modelo = c.id_modelo
+                JOIN materiales m ON m.id_material = lm.id_material
+                GROUP BY lm.id_material, id_color
+                ORDER BY lm.id_material, id_color
+            """, (json.dumps([int(i) for i in ids_pedidos]),
+                  json.dumps([int(i) for i in ids_cotizaciones])))
+            filas = cur.fetchall()
+
+            cur.close()
+            conn.close()
+
+            materiales = {}
+            for id_material, nombre, unidad, costo_unitario, id_color, cantidad in filas:
+                material = materiales.setdefault(id_material, {
+                    'id_material': id_material,
+                    'nombre_material': nombre,
+                    'unidad_medida': unidad,
+                    'costo_unitario': costo_unitario,
+                    'cantidad': 0,
+                    'costo': 0,
+                    'por_color': []
+                })
+                material['cantidad'] += cantidad
+                material['costo'] += cantidad * costo_unitario
+                material['por_color'].append({
+                    'id_color': id_color,
+                    'hex': ReferenceCache.hex_color(id_color) if id_color else None,
+                    'cantidad': round(cantidad, 4)
+                })
+
+            lista = list(materiales.values())
+            for material in lista:
+                material['cantidad'] = round(material['cantidad'], 4)
+                material['costo'] = round(material['costo'], 2)
+
+            return {
+                'success': True,
+                'materiales': lista,
+                'costo_total': round(sum(m['costo'] for m in lista), 2)
+            }
+
+        except Exception as e:
+            print(f"Error calculando requerimientos de materiales: {e}")
+            if conn:
+                conn.close()
+            return {'success': False, 'error': str(e)}
+
+    @staticmethod
+    def requerimientos_por_entrega(desde, hasta):
+        """
+        Requerimientos de los pedidos por producir (pendientes o en proceso)
+        con fecha de entrega en [desde, hasta]
+        """
+        conn = get_read_connection()
+        if not conn:
+            return {'success': False, 'error': 'Error de conexión a BD'}
+
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT id_pedido
+                FROM pedidos
+                WHERE fecha_entrega BETWEEN ? AND ?
+                AND estado IN ('pendiente', 'en_proceso')
+            """, (desde, hasta))
+            ids = [row[0] for row in cur.fetchall()]
+            cur.close()
+            conn.close()
+
+        except Exception as e:
+            print(f"Error obteniendo pedidos del periodo: {e}")
+            if conn:
+                conn.close()
+            return {'success': False, 'error': str(e)}
+
+        resultado = BOMManager.calcular_requerimientos(ids_pedidos=ids)
+        if resultado['success']:
+            resultado['pedidos'] = len(ids)
+        return resultado
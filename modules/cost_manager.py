@@ -0,0 +1,218 @@
+"""
+Módulo de costos de producción del catálogo
+Carga los precios de los materiales y las listas de materiales en arreglos y
+calcula el costo de cada modelo en una sola pasada; el costo de un diseño es
+el de su modelo. El resultado queda en memoria por proceso y se recarga cuando
+cambia el contador 'costos' de versiones_datos (migración 13). Cuando el
+cambio es el precio de un material hecho en este proceso, solo se recalculan
+los modelos que lo usan.
+"""
+import threading
+from array import array
+from math import fsum
+from operator import mul
+
+from flask import g, has_app_context
+
+import db_connection
+from db_connection import get_connection
+from modules.pricing_manager import PricingManager
+from modules.reference_cache import ReferenceCache
+
+
+def _costo(posiciones, cantidades, precios):
+    """Producto punto de las cantidades de la lista por los precios de sus materiales"""
+    return fsum(map(mul, cantidades, map(precios.__getitem__, posiciones)))
+
+
+class CostosCatalogo:
+    """Copia inmutable de precios, listas de materiales y costos por modelo"""
+
+    def __init__(self, db_path, version, materiales, listas, disenos):
+        self.db_path = db_path
+        self.version = version
+        self.disenos = disenos      # (id_combinacion, nombre_guardado, id_modelo)
+
+        # Precio de cada material por posición
+        self.posicion_material = {m[0]: i for i, m in enumerate(materiales)}
+        self.precios = array('d', (m[1] or 0 for m in materiales))
+
+        # Lista de materiales por modelo: posiciones y cantidades paralelas
+        self.listas = {}
+        self.modelos_por_material = {}
+        for id_modelo, id_material, cantidad in listas:
+            posicion = self.posicion_material.get(id_material)
+            if posicion is None:
+                continue
+            posiciones, cantidades = self.listas.setdefault(id_modelo, (array('i'), array('d')))
+            posiciones.append(posicion)
+            cantidades.append(cantidad)
+            self.modelos_por_material.setdefault(id_material, set()).add(id_modelo)
+
+        self.costo_modelo = {
+            id_modelo: _costo(posiciones, cantidades, self.precios)
+            for id_modelo, (posiciones, cantidades) in self.listas.items()
+        }
+
+    def con_precio(self, id_material, costo_unitario, version):
+        """
+        Nueva copia con el precio de un material cambiado; recalcula solo
+        los modelos que lo usan
+        """
+        nuevo = object.__new__(CostosCatalogo)
+        nuevo.__dict__.update(self.__dict__)
+        nuevo.version = version
+        nuevo.precios = array('d', self.precios)
+        nuevo.precios[self.posicion_material[id_material]] = costo_unitario or 0
+        nuevo.costo_modelo = dict(self.costo_modelo)
+        for id_modelo in self.modelos_por_material.get(id_material, ()):
+            posiciones, cantidades = self.listas[id_modelo]
+            nuevo.costo_modelo[id_modelo] = _costo(posiciones, cantidades, nuevo.precios)
+        return nuevo
+
+
+_datos = None
+_lock = threading.Lock()
+
+
+def _leer_version(cur):
+    cur.execute("SELECT version FROM versiones_datos WHERE nombre = 'costos'")
+    fila = cur.fetchone()
+    return fila[0] if fila else 0
+
+
+def _cargar(cur, version):
+    cur.execute("SELECT id_material, costo_unitario FROM materiales ORDER BY id_material")
+    materiales = cur.fetchall()
+    cur.execute("""
+        SELECT id_modelo, id_material, SUM(cantidad)
+        FROM lista_materiales
+        GROUP BY id_modelo, id_material
+    """)
+    listas = cur.fetchall()
+    cur.execute("""
+        SELECT id_combinacion, nombre_guardado, id_modelo
+        FROM combinaciones
+        ORDER BY id_combinacion
+    """)
+    disenos = cur.fetchall()
+    return CostosCatalogo(db_connection.DB_PATH, version, materiales, listas, disenos)
+
+
+class CostManager:
+    """Costo de producción y margen de los diseños del catálogo"""
+
+    @staticmethod
+    def obtener():
+        """
+        Retorna los costos vigentes. Dentro de una solicitud el contador se
+        revisa una sola vez; fuera de ella, en cada llamada.
+        """
+        global _datos
+        datos = _datos
+        en_solicitud = has_app_context()
+        if (en_solicitud and datos is not None
+                and g.get('_costos_revisados') is datos):
+            return datos
+
+        conn = get_connection()
+        if not conn:
+            return datos
+
+        try:
+            cur = conn.cursor()
+            version = _leer_version(cur)
+            if (datos is None or datos.version != version
+                    or datos.db_path != db_connection.DB_PATH):
+                with _lock:
+                    datos = _datos
+                    if (datos is None or datos.version != version
+                            or datos.db_path != db_connection.DB_PATH):
+                        datos = _cargar(cur, version)
+                        _datos = datos
+            cur.close()
+            conn.close()
+
+        except Exception as e:
+            print(f"Error cargando costos de producción: {e}")
+            if conn:
+                conn.close()
+            return datos
+
+        if en_solicitud:
+            g._costos_revisados = datos
+        return datos
+
+    @staticmethod
+    def material_modificado(id_material, costo_unitario, version):
+        """
+        Aplica en la caché el nuevo precio de un material. version es el
+        contador que dejó ese cambio (y solo ese) dentro de su transacción:
+        si la caché estaba justo en la versión anterior, basta recalcular los
+        modelos que usan el material; si no, la siguiente lectura recarga todo.
+        """
+        global _datos
+        with _lock:
+            datos = _datos
+            if (datos is not None and datos.version == version - 1
+                    and datos.db_path == db_connection.DB_PATH
+                    and id_material in datos.posicion_material):
+                _datos = datos.con_precio(id_material, costo_unitario, version)
+        if has_app_context():
+            g.pop('_costos_revisados', None)
+
+    @staticmethod
+    def actualizar_productos(cur, ids_modelo):
+        """
+        Guarda en productos_terminados.costo_produccion el costo vigente de
+        los modelos dados (se llama dentro de la transacción del cambio)
+        """
+        cur.executemany("""
+            UPDATE productos_terminados
+            SET costo_produccion = (
+                SELECT ROUND(SUM(lm.cantidad * m.costo_unitario), 2)
+                FROM lista_materiales lm
+                JOIN materiales m ON m.id_material = lm.id_material
+                WHERE lm.id_modelo = productos_terminados.id_modelo
+            )
+            WHERE id_modelo = ?
+        """, [(id_modelo,) for id_modelo in sorted(set(ids_modelo))])
+
+    @staticmethod
+    def costo_modelo(id_modelo):
+        """Costo de producción de una bolsa del modelo, o None si no tiene lista de materiales"""
+        datos = CostManager.obtener()
+        if not datos or id_modelo not in datos.costo_modelo:
+            return None
+        return round(datos.costo_modelo[id_modelo], 2)
+
+    @staticmethod
+    def costos_catalogo():
+        """
+        Costo, precio base y margen de cada diseño con modelo válido.
+        Los diseños cuyo modelo no tiene lista de materiales regresan
+        costo y margen en None.
+        """
+        datos = CostManager.obtener()
+        if not datos:
+            return []
+
+        resultado = []
+        for id_combinacion, nombre, id_modelo in datos.disenos:
+            modelo = ReferenceCache.modelo(id_modelo)
+            if not modelo:
+                continue
+            precio = PricingManager.precio_unitario(id_modelo)
+            costo = datos.costo_modelo.get(id_modelo)
+            margen = None if costo is None else precio - costo
+            resultado.append({
+                'id_combinacion': id_combinacion,
+                'nombre': nombre,
+                'id_modelo': id_modelo,
+                'nombre_modelo': modelo[1],
+                'costo_produccion': None if costo is None else round(costo, 2),
+                'precio': precio,
+                'margen': None if margen is None else round(margen, 2),
+                'margen_porcentaje': round(margen / precio * 100, 1) if margen is not None and precio else None
+            })
+        return resultado
@@ -2,19 +2,28 @@
 Funciones auxiliares para operaciones de base de datos
 """
 from db_connection import get_connection
+from modules.cost_manager import CostManager
+from modules.reference_cache import ReferenceCache
 
-def insertar_color_si_no_existe(nombre, codigo_hex, id_paleta=None):
+def insertar_color_si_no_existe(nombre, codigo_hex, id_paleta=None, conn=None):
     """
     Inserta un color en la BD si no existe, retorna su ID
+    conn: conexión abierta a reutilizar (opcional)
     """
-    conn = get_connection()
+    propia = conn is None
+    if propia:
+        conn = get_connection()
     if not conn:
         return None
     
     try:
         cur = conn.cursor()
         
-        # Verificar si existe
+        # Verificar si existe: primero en la caché de referencia
+        id_color = ReferenceCache.id_color(codigo_hex)
+        if id_color:
+            return id_color
+        
         cur.execute("SELECT id_color FROM colores WHERE codigo_hex = ?", (codigo_hex,))
         resultado = cur.fetchone()
         
@@ -31,12 +40,14 @@ def insertar_color_si_no_existe(nombre, codigo_hex, id_paleta=None):
         return cur.lastrowid
     
     finally:
-        conn.close()
+        if propia:
+            conn.close()
 
 def guardar_combinacion(id_modelo, esquema, colores, nombre_guardado):
     """
     Guarda una combinación completa en la BD
     colores: dict con keys: principal, secundario, hilo, asa
+    Reutiliza una sola conexión para los colores y la combinación
     """
     conn = get_connection()
     if not conn:
@@ -48,22 +59,26 @@ def guardar_combinacion(id_modelo, esquema, colores, nombre_guardado):
         # Insertar o recuperar IDs de colores
         id_principal = insertar_color_si_no_existe(
             f"Color_{colores.get('principal', '')}", 
-            colores.get('principal')
+            colores.get('principal'),
+            conn=conn
         ) if colores.get('principal') else None
         
         id_secundario = insertar_color_si_no_existe(
             f"Color_{colores.get('secundario', '')}", 
-            colores.get('secundario')
+            colores.get('secundario'),
+            conn=conn
         ) if colores.get('secundario') else None
         
         id_hilo = insertar_color_si_no_existe(
             f"Color_{colores.get('hilo', '')}", 
-            colores.get('hilo')
+            colores.get('hilo'),
+            conn=conn
         ) if colores.get('hilo') else None
         
         id_asa = insertar_color_si_no_existe(
             f"Color_{colores.get('asa', '')}", 
-            colores.get('asa')
+            colores.get('asa'),
+            conn=conn
         ) if colores.get('asa') else None
         
         # Insertar combinación
@@ -175,14 +190,14 @@ def crear_producto_desde_combinacion(id_combinacion, nombre_producto,
         
         id_modelo = resultado[0]
         
-        # Insertar producto
+        # Insertar producto con su costo de producción vigente
         cur.execute("""
             INSERT INTO productos_terminados (
                 id_modelo, id_combinacion, nombre_producto, 
-                precio_sugerido, stock
-            ) VALUES (?, ?, ?, ?, ?)
+                precio_sugerido, stock, costo_produccion
+            ) VALUES (?, ?, ?, ?, ?, ?)
         """, (id_modelo, id_combinacion, nombre_producto, 
-              precio_sugerido, stock))
+              precio_sugerido, stock, CostManager.costo_modelo(id_modelo)))
         
         conn.commit()
         return cur.lastrowid
@@ -0,0 +1,301 @@
+"""
+Módulo de exportaciones (Excel de inventario y PDFs de cotizaciones y facturas)
+Cada exportación escribe en el archivo destino que recibe, así la misma
+función sirve para las rutas síncronas y para los trabajos en segundo plano.
+"""
+import os
+from datetime import datetime
+
+from db_connection import get_connection
+from modules.inventory_manager import InventoryManager
+from modules.quotation_manager import QuotationManager
+from modules.pdf_renderer import DocumentoPDF, RUTA_LOGO, COLOR_MARCA
+
+MIMETYPE_EXCEL = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+MIMETYPE_PDF = 'application/pdf'
+MIMETYPE_ZIP = 'application/zip'
+
+# Cada cuántas cotizaciones se informa el avance del historial
+AVANCE_CADA = 500
+
+
+def escribir_factura(pedido_info, destino, folio=None):
+    """
+    Dibuja la factura a partir de la fila de ExportManager.datos_factura
+    (y el folio asignado, si ya se emitió).
+    Solo usa sus argumentos, así puede ejecutarse en otro proceso.
+    """
+    # Calcular subtotal e IVA
+    total_con_iva = pedido_info[6]
+    subtotal = total_con_iva / 1.16  # Calcular subtotal sin IVA
+    iva = total_con_iva - subtotal  # IVA es la diferencia
+    precio_unitario_sin_iva = pedido_info[14] / 1.16 if pedido_info[14] else 0
+    
+    # Crear PDF
+    doc = DocumentoPDF(f"FACTURA {folio}" if folio else f"FACTURA #{pedido_info[0]}", destino=destino)
+    
+    # Información de la factura
+    doc.espacio(10)
+    if folio:
+        doc.texto(f"Pedido: #{pedido_info[0]}", tamano=11)
+    doc.texto(f"Fecha de emisión: {pedido_info[5][:10] if pedido_info[5] else datetime.now().strftime('%d/%m/%Y')}",
+              tamano=11, salto=35)
+    
+    # Datos del cliente
+    doc.texto("Datos del Cliente:", fuente="Helvetica-Bold", tamano=13, salto=22)
+    doc.texto(f"Nombre: {pedido_info[1]}")
+    if pedido_info[10]:  # razon_social
+        doc.texto(f"Razón Social: {pedido_info[10]}")
+    if pedido_info[9]:  # rfc
+        doc.texto(f"RFC: {pedido_info[9]}")
+    if pedido_info[12]:  # regimen_fiscal
+        doc.texto(f"Régimen Fiscal: {pedido_info[12]}")
+    doc.texto(f"Teléfono: {pedido_info[3] or 'N/A'}")
+    doc.texto(f"Dirección: {pedido_info[4] or 'N/A'}")
+    if pedido_info[13]:  # correo_facturacion
+        doc.texto(f"Email Facturación: {pedido_info[13]}")
+    if pedido_info[11]:  # uso_cfdi
+        doc.texto(f"Uso CFDI: {pedido_info[11]}")
+    doc.espacio(20)
+    
+    # Detalles del pedido
+    doc.texto("Detalles del Pedido:", fuente="Helvetica-Bold", tamano=13, salto=25)
+    
+    # Encabezados de tabla
+    doc.columnas([(40, "Producto"), (280, "Cantidad"), (350, "P. Unitario"), (450, "Subtotal")],
+                 fuente="Helvetica-Bold", salto=5)
+    doc.separador(salto=20)
+    
+    # Productos
+    subtotal_producto = precio_unitario_sin_iva * pedido_info[7]
+    doc.columnas([
+        (40, pedido_info[8] or "Producto sin nombre"),
+        (295, str(pedido_info[7])),
+        (350, f"${precio_unitario_sin_iva:.2f}"),
+        (450, f"${subtotal_producto:.2f}")
+    ], salto=35)
+    
+    # Desglose de totales
+    doc.separador(x1=280, salto=25)
+    doc.columnas([(320, "Subtotal:"), (450, f"${subtotal:.2f}")], tamano=12, salto=20)
+    doc.columnas([(320, "IVA (16%):"), (450, f"${iva:.2f}")], tamano=12, salto=25)
+    
+    # Total
+    doc.separador(x1=280, grosor=2, salto=25)
+    doc.color(*COLOR_MARCA)
+    doc.columnas([(320, "TOTAL:"), (450, f"${total_con_iva:.2f}")], fuente="Helvetica-Bold", tamano=15)
+    
+    # Nota sobre IVA
+    doc.espacio(25)
+    doc.color(0.4, 0.4, 0.4)
+    doc.texto("* Los precios incluyen IVA del 16% según la legislación vigente",
+              fuente="Helvetica-Oblique", tamano=9)
+    
+    # Pie de página
+    doc.pie([
+        ("Gracias por su compra", "Helvetica-Oblique", 9),
+        ("ChromaBags - Sistema Integral de Gestión para Confeccionistas de Bolsas", "Helvetica", 8),
+        ("www.chromabags.com | contacto@chromabags.com", "Helvetica", 8)
+    ])
+    
+    doc.terminar()
+
+
+class ExportManager:
+    """Genera los archivos de exportación"""
+
+    @staticmethod
+    def inventario_excel(destino, progreso=None):
+        """
+        Escribe el reporte de inventario en destino; retorna el nombre de descarga
+        """
+        from openpyxl import Workbook
+        from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+        from openpyxl.drawing.image import Image as XLImage
+        
+        # Obtener datos del inventario
+        inventario = InventoryManager.obtener_inventario_completo()
+        
+        # Crear libro de Excel
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Inventario"
+        
+        # Intentar agregar logo
+        if os.path.exists(RUTA_LOGO):
+            try:
+                img = XLImage(RUTA_LOGO)
+                img.width = 80
+                img.height = 80
+                ws.add_image(img, 'A1')
+            except Exception:
+                pass
+        
+        # Título del sistema (centrado en las columnas)
+        ws.merge_cells('B1:F1')
+        titulo_cell = ws['B1']
+        titulo_cell.value = 'Sistema Integral de Gestión para Confeccionistas de Bolsas'
+        titulo_cell.font = Font(size=14, bold=True, color='FF1493')
+        titulo_cell.alignment = Alignment(horizontal='center', vertical='center')
+        
+        # Subtítulo ChromaBags
+        ws.merge_cells('B2:F2')
+        subtitulo_cell = ws['B2']
+        subtitulo_cell.value = 'CHROMABAGS'
+        subtitulo_cell.font = Font(size=18, bold=True, color='FF69B4')
+        subtitulo_cell.alignment = Alignment(horizontal='center', vertical='center')
+        
+        # Título del documento
+        ws.merge_cells('A4:F4')
+        doc_title = ws['A4']
+        doc_title.value = 'REPORTE DE INVENTARIO'
+        doc_title.font = Font(size=16, bold=True)
+        doc_title.alignment = Alignment(horizontal='center', vertical='center')
+        
+        # Fecha de generación
+        ws.merge_cells('A5:F5')
+        fecha_cell = ws['A5']
+        fecha_cell.value = f'Generado el: {datetime.now().strftime("%d/%m/%Y %H:%M")}'
+        fecha_cell.font = Font(size=10, italic=True)
+        fecha_cell.alignment = Alignment(horizontal='center')
+        
+        # Encabezados de la tabla (fila 7)
+        headers = ['Material', 'Tipo', 'Stock Actual', 'Unidad', 'Costo Unit.', 'Valor Total']
+        header_fill = PatternFill(start_color='FF69B4', end_color='FF69B4', fill_type='solid')
+        header_font = Font(bold=True, color='FFFFFF', size=11)
+        border = Border(
+            left=Side(style='thin'),
+            right=Side(style='thin'),
+            top=Side(style='thin'),
+            bottom=Side(style='thin')
+        )
+        
+        for col, header in enumerate(headers, start=1):
+            cell = ws.cell(row=7, column=col)
+            cell.value = header
+            cell.fill = header_fill
+            cell.font = header_font
+            cell.alignment = Alignment(horizontal='center', vertical='center')
+            cell.border = border
+        
+        # Datos del inventario
+        row_num = 8
+        total_valor = 0
+        
+        for item in inventario:
+            ws.cell(row=row_num, column=1, value=item['nombre_material']).border = border
+            ws.cell(row=row_num, column=2, value=item['tipo']).border = border
+            ws.cell(row=row_num, column=3, value=item['stock_actual']).border = border
+            ws.cell(row=row_num, column=4, value=item['unidad_medida']).border = border
+            ws.cell(row=row_num, column=5, value=f"${item['costo_unitario']:.2f}").border = border
+            
+            valor_total_item = item['stock_actual'] * item['costo_unitario']
+            total_valor += valor_total_item
+            ws.cell(row=row_num, column=6, value=f"${valor_total_item:.2f}").border = border
+            
+            row_num += 1
+        
+        # Fila de totales
+        ws.cell(row=row_num, column=5, value="TOTAL:").font = Font(bold=True, size=12)
+        ws.cell(row=row_num, column=5).alignment = Alignment(horizontal='right')
+        total_cell = ws.cell(row=row_num, column=6, value=f"${total_valor:.2f}")
+        total_cell.font = Font(bold=True, size=12, color='FF1493')
+        total_cell.fill = PatternFill(start_color='FFE4E1', end_color='FFE4E1', fill_type='solid')
+        
+        # Ajustar ancho de columnas
+        ws.column_dimensions['A'].width = 30
+        ws.column_dimensions['B'].width = 15
+        ws.column_dimensions['C'].width = 12
+        ws.column_dimensions['D'].width = 10
+        ws.column_dimensions['E'].width = 12
+        ws.column_dimensions['F'].width = 15
+        
+        wb.save(destino)
+        
+        return f'inventario_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+
+    @staticmethod
+    def historial_cotizaciones(destino, desde=None, hasta=None, id_cliente=None, estado=None,
+                               progreso=None):
+        """
+        Escribe el historial de cotizaciones (filtrado) en destino.
+        progreso(fraccion) se llama cada AVANCE_CADA cotizaciones.
+        Retorna el nombre de descarga.
+        """
+        filtros = (desde, hasta, id_cliente, estado)
+        total = QuotationManager.contar_cotizaciones(*filtros)
+        
+        doc = DocumentoPDF("HISTORIAL DE COTIZACIONES", destino=destino)
+        
+        # Fecha de generación y filtros aplicados
+        doc.espacio(10)
+        doc.texto(f"Fecha de generación: {datetime.now().strftime('%d/%m/%Y %H:%M')}", salto=10)
+        if desde or hasta:
+            doc.texto(f"Periodo: {desde or 'inicio'} a {hasta or 'hoy'}", salto=10)
+        if estado:
+            doc.texto(f"Estado: {estado.upper()}", salto=10)
+        doc.texto(f"Total de cotizaciones: {total}", salto=30)
+        
+        for numero, cot in enumerate(QuotationManager.iterar_cotizaciones(*filtros), start=1):
+            doc.asegurar_espacio(0)
+            
+            doc.texto(f"Cotización #{cot['id_cotizacion']}", fuente="Helvetica-Bold", tamano=12, salto=18)
+            doc.texto(f"Cliente: {cot['nombre_cliente']}", x=60)
+            doc.texto(f"Fecha: {cot['fecha_emision'][:10]}", x=60)
+            doc.texto(f"Productos: {cot['cantidad_productos']} ({cot['cantidad_total']} unidades)", x=60)
+            doc.texto(f"Total: ${cot['total_estimado']:.2f}", x=60)
+            doc.texto(f"Estado: {cot['estado'].upper()}", x=60, salto=25)
+            
+            # Línea separadora
+            doc.separador(color=(0.8, 0.8, 0.8))
+            
+            if progreso and total and numero % AVANCE_CADA == 0:
+                progreso(numero / total)
+        
+        doc.terminar()
+        return 'historial_cotizaciones.pdf'
+
+    @staticmethod
+    def datos_factura(id_pedido):
+        """
+        Fila con los datos del pedido, su cliente (con datos fiscales) y el
+        producto para la factura, o None si el pedido no existe
+        """
+        conn = get_connection()
+        if not conn:
+            raise RuntimeError('Error de conexión a BD')
+        
+        try:
+            cur = conn.cursor()
+            
+            # Obtener información del pedido y cliente con datos fiscales
+            cur.execute("""
+                SELECT 
+                    p.id_pedido,
+                    c.nombre_cliente,
+                    c.correo,
+                    c.telefono,
+                    c.direccion,
+                    p.fecha_pedido,
+                    p.total,
+                    dp.cantidad,
+                    comb.nombre_guardado,
+                    c.rfc,
+                    c.razon_social,
+                    c.uso_cfdi,
+                    c.regimen_fiscal,
+                    c.correo_facturacion,
+                    dp.precio_unitario
+                FROM pedidos p
+                JOIN clientes c ON p.id_cliente = c.id_cliente
+                JOIN detalle_pedido dp ON p.id_pedido = dp.id_pedido
+                LEFT JOIN combinaciones comb ON dp.id_producto = comb.id_combinacion
+                WHERE p.id_pedido = ?
+            """, (id_pedido,))
+            
+            fila = cur.fetchone()
+            cur.close()
+            return tuple(fila) if fila else None
+        
+        finally:
+            conn.close()
@@ -2,13 +2,16 @@
 Módulo para gestión de inventario de materiales
 """
 from db_connection import get_connection
-from datetime import datetime
+from modules.cost_manager import CostManager
+import json
+
+TIPOS_MOVIMIENTO = ('entrada', 'salida', 'ajuste')
 
 class InventoryManager:
     """Gestiona el inventario de materiales"""
     
     @staticmethod
-    def agregar_material(nombre, tipo, unidad_medida, costo_unitario, descripcion=None):
+    def agregar_material(nombre, tipo, unidad_medida, costo_unitario, descripcion=None, stock_minimo=100):
         """
         Agrega un nuevo material al catálogo
         """
@@ -21,9 +24,10 @@ class InventoryManager:
             
             # Insertar material
             cur.execute("""
-                INSERT INTO materiales (nombre_material, tipo, unidad_medida, costo_unitario, descripcion)
-                VALUES (?, ?, ?, ?, ?)
-            """, (nombre, tipo, unidad_medida, costo_unitario, descripcion))
+                INSERT INTO materiales (nombre_material, tipo, unidad_medida, costo_unitario,
+                                        descripcion, stock_minimo)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (nombre, tipo, unidad_medida, costo_unitario, descripcion, stock_minimo))
             
             id_material = cur.lastrowid
             
@@ -43,11 +47,33 @@ class InventoryManager:
             return {'success': False, 'error': str(e)}
     
     @staticmethod
-    def actualizar_stock(id_material, cantidad_cambio):
+    def actualizar_stock(id_material, cantidad_cambio, usuario=None):
         """
         Actualiza el stock de un material (puede ser positivo o negativo)
         cantidad_cambio: cantidad a sumar (positivo) o restar (negativo)
+        Queda registrado en el kardex como un ajuste.
+        """
+        return InventoryManager.registrar_movimiento(
+            id_material, 'ajuste', cantidad_cambio, usuario=usuario
+        )
+    
+    @staticmethod
+    def registrar_movimiento(id_material, tipo, cantidad, referencia_tipo=None,
+                             id_referencia=None, usuario=None, nota=None):
+        """
+        Registra un movimiento en el kardex y actualiza el saldo del material
+        tipo: 'entrada' y 'salida' reciben la cantidad en positivo; 'ajuste' con signo
+        referencia_tipo: 'pedido' o 'cotizacion' (opcional), junto con id_referencia
+        El saldo se modifica con un solo UPDATE condicional (sin leer antes), así
+        dos ajustes simultáneos no se pisan y el stock nunca queda negativo.
         """
+        if tipo not in TIPOS_MOVIMIENTO:
+            return {'success': False, 'error': f'Tipo de movimiento no válido: {tipo}'}
+        if tipo != 'ajuste' and cantidad <= 0:
+            return {'success': False, 'error': 'La cantidad debe ser mayor a cero'}
+        
+        cambio = -cantidad if tipo == 'salida' else cantidad
+        
         conn = get_connection()
         if not conn:
             return {'success': False, 'error': 'Error de conexión a BD'}
@@ -55,46 +81,195 @@ class InventoryManager:
         try:
             cur = conn.cursor()
             
-            # Verificar si existe registro en inventario
-            cur.execute("""
-                SELECT id_inventario, cantidad FROM inventario_materiales 
-                WHERE id_material = ?
-            """, (id_material,))
+            if cambio >= 0:
+                cur.execute("""
+                    INSERT INTO inventario_materiales (id_material, cantidad)
+                    VALUES (?, ?)
+                    ON CONFLICT(id_material) DO UPDATE
+                    SET cantidad = cantidad + excluded.cantidad,
+                        fecha_actualizacion = datetime('now')
+                    RETURNING cantidad
+                """, (id_material, cambio))
+            else:
+                cur.execute("""
+                    UPDATE inventario_materiales
+                    SET cantidad = cantidad + ?, fecha_actualizacion = datetime('now')
+                    WHERE id_material = ? AND cantidad + ? >= 0
+                    RETURNING cantidad
+                """, (cambio, id_material, cambio))
             
             resultado = cur.fetchone()
             
-            if resultado:
-                # Actualizar existente
-                id_inventario, cantidad_actual = resultado[0], resultado[1]
-                nueva_cantidad = cantidad_actual + cantidad_cambio
-                
-                if nueva_cantidad < 0:
+            if not resultado:
+                cur.execute("SELECT 1 FROM inventario_materiales WHERE id_material = ?", (id_material,))
+                existe = cur.fetchone()
+                cur.close()
+                conn.close()
+                if existe:
                     return {'success': False, 'error': 'Stock insuficiente'}
-                
-                cur.execute("""
-                    UPDATE inventario_materiales 
-                    SET cantidad = ?, fecha_actualizacion = datetime('now')
-                    WHERE id_inventario = ?
-                """, (nueva_cantidad, id_inventario))
-            else:
-                # Crear nuevo registro
-                if cantidad_cambio < 0:
-                    return {'success': False, 'error': 'No se puede iniciar con stock negativo'}
-                
-                cur.execute("""
-                    INSERT INTO inventario_materiales (id_material, cantidad)
-                    VALUES (?, ?)
-                """, (id_material, cantidad_cambio))
+                return {'success': False, 'error': 'No se puede iniciar con stock negativo'}
+            
+            nueva_cantidad = resultado[0]
+            
+            cur.execute("""
+                INSERT INTO movimientos_inventario (
+                    id_material, tipo, cantidad, saldo,
+                    referencia_tipo, id_referencia, usuario, nota
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (id_material, tipo, cambio, nueva_cantidad,
+                  referencia_tipo, id_referencia, usuario, nota))
+            
+            id_movimiento = cur.lastrowid
             
             conn.commit()
             cur.close()
             conn.close()
             
-            return {'success': True, 'nueva_cantidad': nueva_cantidad if resultado else cantidad_cambio}
+            return {'success': True, 'id_movimiento': id_movimiento, 'nueva_cantidad': nueva_cantidad}
         
         except Exception as e:
+            print(f"Error registrando movimiento de inventario: {e}")
+            if conn:
+                conn.rollback()
+                conn.close()
             return {'success': False, 'error': str(e)}
     
+    @staticmethod
+    def obtener_kardex(id_material, limite=50):
+        """
+        Últimos movimientos de un material, del más reciente al más antiguo
+        """
+        conn = get_connection()
+        if not conn:
+            return []
+        
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT id_movimiento, fecha, tipo, cantidad, saldo,
+                       referencia_tipo, id_referencia, usuario, nota
+                FROM movimientos_inventario
+                WHERE id_material = ?
+                ORDER BY id_movimiento DESC
+                LIMIT ?
+            """, (id_material, limite))
+            
+            movimientos = [{
+                'id_movimiento': row[0],
+                'fecha': row[1],
+                'tipo': row[2],
+                'cantidad': row[3],
+                'saldo': row[4],
+                'referencia_tipo': row[5],
+                'id_referencia': row[6],
+                'usuario': row[7],
+                'nota': row[8]
+            } for row in cur.fetchall()]
+            
+            cur.close()
+            conn.close()
+            
+            return movimientos
+        
+        except Exception as e:
+            print(f"Error obteniendo kardex: {e}")
+            return []
+    
+    @staticmethod
+    def tomar_corte():
+        """
+        Guarda el saldo actual de cada material junto con el último movimiento
+        incluido. Las consultas de existencias a una fecha parten del corte más
+        reciente y solo suman los movimientos posteriores.
+        """
+        conn = get_connection()
+        if not conn:
+            return {'success': False, 'error': 'Error de conexión a BD'}
+        
+        try:
+            cur = conn.cursor()
+            # Mismo reloj que el default de movimientos_inventario.fecha
+            cur.execute("SELECT datetime('now','localtime')")
+            fecha_corte = cur.fetchone()[0]
+            
+            cur.execute("""
+                INSERT OR REPLACE INTO cortes_inventario (fecha_corte, id_material, cantidad, id_movimiento)
+                SELECT ?, id_material, cantidad,
+                       (SELECT COALESCE(MAX(id_movimiento), 0) FROM movimientos_inventario)
+                FROM inventario_materiales
+                WHERE id_material IS NOT NULL
+            """, (fecha_corte,))
+            
+            materiales = cur.rowcount
+            
+            conn.commit()
+            cur.close()
+            conn.close()
+            
+            return {'success': True, 'fecha_corte': fecha_corte, 'materiales': materiales}
+        
+        except Exception as e:
+            print(f"Error tomando corte de inventario: {e}")
+            if conn:
+                conn.rollback()
+                conn.close()
+            return {'success': False, 'error': str(e)}
+    
+    @staticmethod
+    def obtener_existencias_en(fecha):
+        """
+        Existencias y valuación de cada material a una fecha ('YYYY-MM-DD' se
+        toma al final del día), a partir del último corte anterior a la fecha
+        La valuación usa el costo unitario vigente del material.
+        """
+        if len(fecha) == 10:
+            fecha = f"{fecha} 23:59:59"
+        
+        conn = get_connection()
+        if not conn:
+            return []
+        
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                WITH corte AS (
+                    SELECT id_material, cantidad, id_movimiento
+                    FROM cortes_inventario
+                    WHERE fecha_corte = (
+                        SELECT MAX(fecha_corte) FROM cortes_inventario WHERE fecha_corte <= ?
+                    )
+                )
+                SELECT m.id_material, m.nombre_material, m.unidad_medida, m.costo_unitario,
+                       COALESCE(c.cantidad, 0) + COALESCE((
+                           SELECT SUM(mv.cantidad)
+                           FROM movimientos_inventario mv
+                           WHERE mv.id_material = m.id_material
+                           AND mv.id_movimiento > COALESCE(c.id_movimiento, 0)
+                           AND mv.fecha <= ?
+                       ), 0) AS cantidad
+                FROM materiales m
+                LEFT JOIN corte c ON c.id_material = m.id_material
+                ORDER BY m.nombre_material
+            """, (fecha, fecha))
+            
+            existencias = [{
+                'id_material': row[0],
+                'nombre_material': row[1],
+                'unidad_medida': row[2],
+                'costo_unitario': row[3],
+                'cantidad': round(row[4], 4),
+                'valor_total': round(row[4] * row[3], 2)
+            } for row in cur.fetchall()]
+            
+            cur.close()
+            conn.close()
+            
+            return existencias
+        
+        except Exception as e:
+            print(f"Error obteniendo existencias a la fecha: {e}")
+            return []
+    
     @staticmethod
     def obtener_inventario_completo():
         """
@@ -116,7 +291,8 @@ class InventoryManager:
                     m.costo_unitario,
                     COALESCE(i.cantidad, 0) as stock_actual,
                     COALESCE(i.cantidad * m.costo_unitario, 0) as valor_total,
-                    i.fecha_actualizacion
+                    i.fecha_actualizacion,
+                    m.stock_minimo
                 FROM materiales m
                 LEFT JOIN inventario_materiales i ON m.id_material = i.id_material
                 ORDER BY m.nombre_material
@@ -132,7 +308,8 @@ class InventoryManager:
                     'costo_unitario': row[4],
                     'stock_actual': row[5],
                     'valor_total': row[6],
-                    'fecha_actualizacion': row[7]
+                    'fecha_actualizacion': row[7],
+                    'stock_minimo': row[8]
                 })
             
             cur.close()
@@ -209,43 +386,187 @@ class InventoryManager:
             return False
     
     @staticmethod
-    def obtener_materiales_bajo_stock(umbral=100):
+    def verificar_requerimientos(requerimientos, referencia_tipo=None, id_referencia=None,
+                                 reservar_minutos=None):
         """
-        Obtiene materiales con stock por debajo del umbral
+        Verifica un conjunto completo de materiales con una sola consulta
+        requerimientos: {id_material: cantidad_requerida, ...}
+        Lo disponible descuenta las reservas vigentes de otras referencias.
+        Con reservar_minutos (y una referencia), si todo alcanza se reserva en la
+        misma transacción (BEGIN IMMEDIATE), de modo que otra verificación no
+        pueda prometer el mismo stock; la reserva anterior de la referencia se
+        reemplaza.
         """
+        if reservar_minutos and not (referencia_tipo and id_referencia):
+            return {'success': False, 'error': 'Para reservar se requiere la referencia'}
+        
         conn = get_connection()
         if not conn:
-            return []
+            return {'success': False, 'error': 'Error de conexión a BD'}
         
         try:
             cur = conn.cursor()
+            if reservar_minutos and not conn.in_transaction:
+                # Lectura y reserva en una transacción con el candado de escritura
+                # tomado desde el inicio: dos verificaciones no pueden leer el mismo
+                # disponible aunque no pasen por el escritor grupal (que ya abre
+                # su lote con BEGIN IMMEDIATE)
+                cur.execute("BEGIN IMMEDIATE")
             cur.execute("""
-                SELECT 
-                    m.nombre_material,
-                    m.unidad_medida,
-                    i.cantidad
-                FROM materiales m
-                JOIN inventario_materiales i ON m.id_material = i.id_material
-                WHERE i.cantidad < ?
-                ORDER BY i.cantidad ASC
-            """, (umbral,))
+                WITH requerido (id_material, cantidad) AS (
+                    SELECT CAST(key AS INTEGER), SUM(value)
+                    FROM json_each(?)
+                    GROUP BY CAST(key AS INTEGER)
+                )
+                SELECT r.id_material, m.nombre_material, m.unidad_medida, r.cantidad,
+                       COALESCE(i.cantidad, 0) AS stock,
+                       COALESCE((
+                           SELECT SUM(rv.cantidad)
+                           FROM reservas_inventario rv
+                           WHERE rv.id_material = r.id_material
+                           AND rv.expira > datetime('now')
+                           AND NOT (rv.referencia_tipo IS ? AND rv.id_referencia IS ?)
+                       ), 0) AS reservado
+                FROM requerido r
+                LEFT JOIN materiales m ON m.id_material = r.id_material
+                LEFT JOIN inventario_materiales i ON i.id_material = r.id_material
+                ORDER BY r.id_material
+            """, (json.dumps({str(k): v for k, v in requerimientos.items()}),
+                  referencia_tipo, id_referencia))
             
-            materiales_bajo = []
-            for row in cur.fetchall():
-                materiales_bajo.append({
-                    'nombre': row[0],
-                    'unidad': row[1],
-                    'cantidad': row[2]
+            materiales = []
+            for id_material, nombre, unidad, requerido, stock, reservado in cur.fetchall():
+                disponible = stock - reservado
+                materiales.append({
+                    'id_material': id_material,
+                    'nombre_material': nombre,
+                    'unidad_medida': unidad,
+                    'requerido': requerido,
+                    'stock': stock,
+                    'reservado': reservado,
+                    'disponible': disponible,
+                    'faltante': round(max(requerido - disponible, 0), 4)
                 })
             
+            alcanza = all(m['faltante'] == 0 for m in materiales)
+            resultado = {'success': True, 'disponible': alcanza, 'materiales': materiales}
+            
+            if reservar_minutos and alcanza:
+                cur.execute("""
+                    DELETE FROM reservas_inventario
+                    WHERE referencia_tipo = ? AND id_referencia = ?
+                """, (referencia_tipo, id_referencia))
+                cur.executemany("""
+                    INSERT INTO reservas_inventario (
+                        id_material, cantidad, referencia_tipo, id_referencia, expira
+                    ) VALUES (?, ?, ?, ?, datetime('now', ?))
+                """, [(m['id_material'], m['requerido'], referencia_tipo, id_referencia,
+                       f'+{int(reservar_minutos)} minutes')
+                      for m in materiales if m['requerido'] > 0])
+                resultado['reservado'] = True
+            
+            if reservar_minutos:
+                # También libera el candado cuando no alcanzó y no se reservó nada
+                conn.commit()
+            
             cur.close()
             conn.close()
             
-            return materiales_bajo
+            return resultado
         
         except Exception as e:
-            print(f"Error obteniendo materiales bajo stock: {e}")
-            return []
+            print(f"Error verificando requerimientos: {e}")
+            if conn:
+                conn.rollback()
+                conn.close()
+            return {'success': False, 'error': str(e)}
+    
+    @staticmethod
+    def liberar_reserva(referencia_tipo, id_referencia):
+        """
+        Elimina la reserva de un pedido o cotización; las rutas la llaman al
+        eliminar o cancelar el pedido y al eliminar o rechazar la cotización
+        """
+        conn = get_connection()
+        if not conn:
+            return {'success': False, 'error': 'Error de conexión a BD'}
+        
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                DELETE FROM reservas_inventario
+                WHERE referencia_tipo = ? AND id_referencia = ?
+            """, (referencia_tipo, id_referencia))
+            
+            liberadas = cur.rowcount
+            
+            conn.commit()
+            cur.close()
+            conn.close()
+            
+            return {'success': True, 'liberadas': liberadas}
+        
+        except Exception as e:
+            print(f"Error liberando reserva: {e}")
+            if conn:
+                conn.rollback()
+                conn.close()
+            return {'success': False, 'error': str(e)}
+    
+    @staticmethod
+    def obtener_alertas_stock(desde=None):
+        """
+        Alertas de stock mantenidas por triggers (cada material contra su stock_minimo)
+        Sin desde: solo las activas. Con desde (cursor de la consulta anterior):
+        las que cambiaron después, incluidas las resueltas (activa=False).
+        Retorna {'alertas': [...], 'cursor': n}
+        """
+        conn = get_connection()
+        if not conn:
+            return {'alertas': [], 'cursor': desde or 0}
+        
+        try:
+            cur = conn.cursor()
+            sql = """
+                SELECT a.id_material, m.nombre_material, m.unidad_medida,
+                       a.cantidad, a.stock_minimo, a.activa, a.desde, a.version
+                FROM alertas_stock a
+                LEFT JOIN materiales m ON m.id_material = a.id_material
+            """
+            if desde is None:
+                cur.execute(sql + " WHERE a.activa = 1 ORDER BY a.cantidad ASC")
+            else:
+                cur.execute(sql + " WHERE a.version > ? ORDER BY a.version", (desde,))
+            
+            alertas = [{
+                'id_material': row[0],
+                'nombre': row[1],
+                'unidad': row[2],
+                'cantidad': row[3],
+                'stock_minimo': row[4],
+                'activa': bool(row[5]),
+                'desde': row[6],
+                'version': row[7]
+            } for row in cur.fetchall()]
+            
+            cur.execute("SELECT COALESCE(MAX(version), 0) FROM alertas_stock")
+            cursor = cur.fetchone()[0]
+            
+            cur.close()
+            conn.close()
+            
+            return {'alertas': alertas, 'cursor': cursor}
+        
+        except Exception as e:
+            print(f"Error obteniendo alertas de stock: {e}")
+            return {'alertas': [], 'cursor': desde or 0}
+    
+    @staticmethod
+    def obtener_materiales_bajo_stock():
+        """
+        Materiales por debajo de su stock mínimo (alertas activas)
+        """
+        return InventoryManager.obtener_alertas_stock()['alertas']
     
     @staticmethod
     def calcular_costo_produccion(materiales_necesarios):
@@ -259,17 +580,15 @@ class InventoryManager:
         
         try:
             cur = conn.cursor()
-            costo_total = 0
             
-            for id_material, cantidad in materiales_necesarios.items():
-                cur.execute("""
-                    SELECT costo_unitario FROM materiales
-                    WHERE id_material = ?
-                """, (id_material,))
-                
-                resultado = cur.fetchone()
-                if resultado:
-                    costo_total += resultado[0] * cantidad
+            # Una sola consulta para todos los materiales
+            cur.execute("""
+                SELECT COALESCE(SUM(m.costo_unitario * j.value), 0)
+                FROM json_each(?) j
+                JOIN materiales m ON m.id_material = CAST(j.key AS INTEGER)
+            """, (json.dumps({str(k): v for k, v in materiales_necesarios.items()}),))
+            
+            costo_total = cur.fetchone()[0]
             
             cur.close()
             conn.close()
@@ -317,7 +636,7 @@ class InventoryManager:
             cur = conn.cursor()
             cur.execute("""
                 SELECT id_material, nombre_material, tipo, unidad_medida, 
-                    costo_unitario, descripcion
+                    costo_unitario, descripcion, stock_minimo
                 FROM materiales
                 WHERE id_material = ?
             """, (id_material,))
@@ -335,7 +654,8 @@ class InventoryManager:
                 'tipo': row[2],
                 'unidad_medida': row[3],
                 'costo_unitario': row[4],
-                'descripcion': row[5]
+                'descripcion': row[5],
+                'stock_minimo': row[6]
             }
 
         except Exception as e:
@@ -343,7 +663,8 @@ class InventoryManager:
             return None
 
     @staticmethod
-    def modificar_material(id_material, nombre, tipo, unidad_medida, costo_unitario, descripcion):
+    def modificar_material(id_material, nombre, tipo, unidad_medida, costo_unitario, descripcion,
+                           stock_minimo=None):
         conn = get_connection()
         if not conn:
             return {'success': False, 'error': 'Error de conexión a BD'}
@@ -353,14 +674,29 @@ class InventoryManager:
             cur.execute("""
                 UPDATE materiales
                 SET nombre_material=?, tipo=?, unidad_medida=?, 
-                    costo_unitario=?, descripcion=?
+                    costo_unitario=?, descripcion=?,
+                    stock_minimo=COALESCE(?, stock_minimo)
                 WHERE id_material=?
-            """, (nombre, tipo, unidad_medida, costo_unitario, descripcion, id_material))
+                RETURNING (SELECT version FROM versiones_datos WHERE nombre = 'costos')
+            """, (nombre, tipo, unidad_medida, costo_unitario, descripcion, stock_minimo, id_material))
+            # RETURNING se evalúa antes de los triggers AFTER: es el contador
+            # de costos previo al cambio; si el precio cambió, el trigger lo incrementa
+            fila = cur.fetchone()
+            version_anterior = fila[0] if fila else None
+            cur.execute("SELECT version FROM versiones_datos WHERE nombre = 'costos'")
+            fila = cur.fetchone()
+            version = fila[0] if fila else None
+            cur.execute("SELECT id_modelo FROM lista_materiales WHERE id_material = ?", (id_material,))
+            modelos = [row[0] for row in cur.fetchall()]
+            CostManager.actualizar_productos(cur, modelos)
 
             conn.commit()
             cur.close()
             conn.close()
 
+            if version_anterior is not None and version == version_anterior + 1:
+                CostManager.material_modificado(id_material, float(costo_unitario), version)
+
             return {'success': True}
 
         except Exception as e:
@@ -0,0 +1,367 @@
+"""
+Módulo de facturas emitidas
+Emitir una factura asigna su folio y guarda en la tabla facturas los datos
+fiscales y el total de ese momento; el PDF se genera una sola vez en el
+almacén de facturas (carpeta facturas junto a la base de datos) y las
+descargas siguientes entregan ese archivo hasta que la factura se regenera.
+En lote, los PDFs se dibujan en paralelo en un pool de procesos.
+"""
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import db_connection
+from db_connection import get_connection, escribir
+from modules.export_manager import ExportManager, escribir_factura
+
+PREFIJO_FOLIO = 'CB-'
+
+# Procesos para dibujar PDFs de facturas en lote (reportlab usa un solo núcleo)
+PROCESOS_FACTURAS = int(os.environ.get('CHROMABAGS_PROCESOS_FACTURAS', os.cpu_count() or 1))
+
+# Datos del SAT para "público en general" cuando el cliente no tiene datos
+# fiscales (las columnas de facturas no aceptan NULL)
+RFC_GENERICO = 'XAXX010101000'
+RAZON_SOCIAL_GENERICA = 'PUBLICO EN GENERAL'
+USO_CFDI_GENERICO = 'S01'          # Sin efectos fiscales
+REGIMEN_FISCAL_GENERICO = '616'    # Sin obligaciones fiscales
+
+
+_pool = None
+_lock = threading.Lock()
+
+
+def _obtener_pool():
+    """
+    Pool de procesos para los lotes; con 'spawn' porque el proceso de la app
+    ya tiene hilos (escritor, checkpointer) y un fork los copiaría a medias
+    """
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=PROCESOS_FACTURAS,
+                                            mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def directorio_facturas():
+    """Almacén de PDFs de facturas junto a la base de datos activa"""
+    directorio = os.path.join(os.path.dirname(os.path.abspath(db_connection.DB_PATH)), 'facturas')
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+
+def datos_fiscales(pedido_info):
+    """
+    (rfc, razon_social, uso_cfdi, regimen_fiscal, correo_facturacion) de una
+    fila de ExportManager.datos_factura, con los genéricos donde falten
+    """
+    return (
+        pedido_info[9] or RFC_GENERICO,
+        pedido_info[10] or (RAZON_SOCIAL_GENERICA if not pedido_info[9] else pedido_info[1]),
+        pedido_info[11] or USO_CFDI_GENERICO,
+        pedido_info[12] or REGIMEN_FISCAL_GENERICO,
+        pedido_info[13] or pedido_info[2] or ''
+    )
+
+
+def fila_para_pdf(pedido_info, factura):
+    """
+    Fila de datos_factura con la fecha, el total y los datos fiscales
+    guardados en la factura, para que el PDF muestre lo que se emitió
+    """
+    return (*pedido_info[:5], factura['fecha_factura'], factura['total'], *pedido_info[7:9],
+            factura['rfc'], factura['razon_social'], factura['uso_cfdi'],
+            factura['regimen_fiscal'], factura['correo_facturacion'], pedido_info[14])
+
+
+def _fila_a_factura(row):
+    return {
+        'id_factura': row[0],
+        'id_pedido': row[1],
+        'fecha_factura': row[2],
+        'folio': row[3],
+        'total': row[4],
+        'rfc': row[5],
+        'razon_social': row[6],
+        'uso_cfdi': row[7],
+        'regimen_fiscal': row[8],
+        'correo_facturacion': row[9],
+        'estado': row[10],
+        'ruta_pdf': row[11]
+    }
+
+
+_COLUMNAS = """id_factura, id_pedido, fecha_factura, folio, total, rfc, razon_social,
+               uso_cfdi, regimen_fiscal, correo_facturacion, estado, ruta_pdf"""
+
+
+def generar_pdf(fila, folio, ruta):
+    """
+    Dibuja la factura en un temporal y lo mueve a ruta, así una descarga en
+    curso nunca ve un archivo a medias. Función de módulo para poder
+    ejecutarse en el pool de procesos.
+    """
+    fd, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as destino:
+            escribir_factura(fila, destino, folio=folio)
+        os.replace(temporal, ruta)
+    except Exception:
+        os.remove(temporal)
+        raise
+    return ruta
+
+
+def _vigente(cur, id_pedido):
+    cur.execute(f"""
+        SELECT {_COLUMNAS}
+        FROM facturas
+        WHERE id_pedido = ? AND estado = 'emitida'
+    """, (id_pedido,))
+    return cur.fetchone()
+
+
+def _guardar(cur, row, id_pedido, pedido_info):
+    """
+    Crea la factura con un folio nuevo o, si ya existe (row), actualiza su
+    total y datos fiscales; retorna la factura guardada
+    """
+    fiscales = datos_fiscales(pedido_info)
+    if row:
+        cur.execute("""
+            UPDATE facturas
+            SET total = ?, rfc = ?, razon_social = ?, uso_cfdi = ?,
+                regimen_fiscal = ?, correo_facturacion = ?
+            WHERE id_factura = ?
+        """, (pedido_info[6], *fiscales, row[0]))
+        id_factura = row[0]
+    else:
+        # El folio sale del id asignado; '' solo dura dentro de la transacción
+        cur.execute("""
+            INSERT INTO facturas (id_pedido, folio, total, rfc, razon_social,
+                                  uso_cfdi, regimen_fiscal, correo_facturacion)
+            VALUES (?, '', ?, ?, ?, ?, ?, ?)
+            RETURNING id_factura
+        """, (id_pedido, pedido_info[6], *fiscales))
+        id_factura = cur.fetchone()[0]
+        folio = f"{PREFIJO_FOLIO}{id_factura:06d}"
+        cur.execute("UPDATE facturas SET folio = ?, ruta_pdf = ? WHERE id_factura = ?",
+                    (folio, f"{folio}.pdf", id_factura))
+
+    cur.execute(f"SELECT {_COLUMNAS} FROM facturas WHERE id_factura = ?", (id_factura,))
+    return _fila_a_factura(cur.fetchone())
+
+
+class InvoiceManager:
+    """Emite facturas y administra sus PDFs guardados"""
+
+    @staticmethod
+    def obtener_factura(id_pedido):
+        """Factura emitida (vigente) del pedido, o None"""
+        conn = get_connection()
+        if not conn:
+            return None
+
+        try:
+            cur = conn.cursor()
+            cur.execute(f"""
+                SELECT {_COLUMNAS}
+                FROM facturas
+                WHERE id_pedido = ? AND estado = 'emitida'
+            """, (id_pedido,))
+            row = cur.fetchone()
+            cur.close()
+            conn.close()
+            return _fila_a_factura(row) if row else None
+
+        except Exception as e:
+            print(f"Error obteniendo factura: {e}")
+            return None
+
+    @staticmethod
+    def _registrar(id_pedido, regenerar=False):
+        """
+        Retorna la factura vigente del pedido; si no hay, la crea con un folio
+        nuevo. Al regenerar, conserva el folio y actualiza total y datos fiscales.
+        'pedido_info' viene solo cuando hay que generar el PDF.
+        """
+        conn = get_connection()
+        if not conn:
+            return {'success': False, 'error': 'Error de conexión a BD'}
+
+        try:
+            cur = conn.cursor()
+            row = _vigente(cur, id_pedido)
+            if row and not regenerar:
+                cur.close()
+                conn.close()
+                return {'success': True, 'factura': _fila_a_factura(row), 'pedido_info': None}
+
+            pedido_info = ExportManager.datos_factura(id_pedido)
+            if not pedido_info:
+                cur.close()
+                conn.close()
+                return {'success': False, 'error': 'Pedido no encontrado'}
+
+            factura = _guardar(cur, row, id_pedido, pedido_info)
+
+            conn.commit()
+            cur.close()
+            conn.close()
+
+            return {'success': True, 'factura': factura, 'pedido_info': pedido_info}
+
+        except Exception as e:
+            print(f"Error registrando factura: {e}")
+            if conn:
+                conn.rollback()
+                conn.close()
+            return {'success': False, 'error': str(e)}
+
+    @staticmethod
+    def ruta_pdf(factura):
+        """Ruta absoluta del PDF de la factura en el almacén"""
+        return os.path.join(directorio_facturas(), factura['ruta_pdf'] or f"{factura['folio']}.pdf")
+
+    @staticmethod
+    def emitir(id_pedido, regenerar=False):
+        """
+        Emite la factura del pedido (o reutiliza la ya emitida) y asegura su PDF.
+        Con regenerar=True vuelve a tomar los datos del pedido y del cliente y
+        reescribe el PDF con el mismo folio.
+        Retorna {'success', 'factura', 'ruta'}.
+        """
+        resultado = escribir(InvoiceManager._registrar, id_pedido, regenerar)
+        if not resultado['success']:
+            return resultado
+
+        factura = resultado['factura']
+        ruta = InvoiceManager.ruta_pdf(factura)
+        pedido_info = resultado['pedido_info']
+        if pedido_info is None and not os.path.exists(ruta):
+            # Factura emitida cuyo archivo se perdió: se genera con lo guardado
+            pedido_info = ExportManager.datos_factura(id_pedido)
+        if pedido_info is not None:
+            try:
+                ruta = generar_pdf(fila_para_pdf(pedido_info, factura), factura['folio'], ruta)
+            except Exception as e:
+                print(f"Error generando PDF de factura {factura['folio']}: {e}")
+                return {'success': False, 'error': str(e)}
+
+        return {'success': True, 'factura': factura, 'ruta': ruta}
+
+    @staticmethod
+    def exportar(id_pedido, destino, progreso=None):
+        """
+        Copia el PDF de la factura (emitiéndola si hace falta) en destino;
+        retorna el nombre de descarga o None si el pedido no existe
+        """
+        resultado = InvoiceManager.emitir(id_pedido)
+        if not resultado['success']:
+            if resultado['error'] == 'Pedido no encontrado':
+                return None
+            raise RuntimeError(resultado['error'])
+
+        with open(resultado['ruta'], 'rb') as origen:
+            shutil.copyfileobj(origen, destino)
+        return f"factura_{resultado['factura']['folio']}.pdf"
+
+    @staticmethod
+    def _registrar_lote(ids_pedido, regenerar=False):
+        """
+        Registra en una sola transacción las facturas de los pedidos listos
+        para facturar (pagados y finalizados o entregados). Retorna
+        'emitidas' como [(factura, pedido_info o None)] en el orden recibido
+        y 'omitidos' con los ids que no se pueden facturar.
+        """
+        conn = get_connection()
+        if not conn:
+            return {'success': False, 'error': 'Error de conexión a BD'}
+
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT id_pedido FROM pedidos
+                WHERE id_pedido IN (SELECT value FROM json_each(?))
+                AND estado_pago = 'pagado'
+                AND estado IN ('finalizado', 'entregado')
+            """, (json.dumps(ids_pedido),))
+            facturables = {row[0] for row in cur.fetchall()}
+
+            emitidas, omitidos = [], []
+            for id_pedido in dict.fromkeys(ids_pedido):
+                row = _vigente(cur, id_pedido) if id_pedido in facturables else None
+                if row and not regenerar:
+                    emitidas.append((_fila_a_factura(row), None))
+                    continue
+
+                pedido_info = ExportManager.datos_factura(id_pedido) if id_pedido in facturables else None
+                if not pedido_info:
+                    omitidos.append(id_pedido)
+                    continue
+                emitidas.append((_guardar(cur, row, id_pedido, pedido_info), pedido_info))
+
+            conn.commit()
+            cur.close()
+            conn.close()
+
+            return {'success': True, 'emitidas': emitidas, 'omitidos': omitidos}
+
+        except Exception as e:
+            print(f"Error registrando lote de facturas: {e}")
+            if conn:
+                conn.rollback()
+                conn.close()
+            return {'success': False, 'error': str(e)}
+
+    @staticmethod
+    def emitir_lote(ids_pedido, regenerar=False):
+        """
+        Emite las facturas de varios pedidos: las filas se registran en una
+        transacción y los PDFs que falten se dibujan en paralelo en el pool
+        de procesos. Retorna {'success', 'facturas': [(factura, ruta)], 'omitidos'}.
+        """
+        resultado = escribir(InvoiceManager._registrar_lote, ids_pedido, regenerar)
+        if not resultado['success']:
+            return resultado
+
+        facturas, pendientes = [], []
+        for factura, pedido_info in resultado['emitidas']:
+            ruta = InvoiceManager.ruta_pdf(factura)
+            if pedido_info is None and not os.path.exists(ruta):
+                pedido_info = ExportManager.datos_factura(factura['id_pedido'])
+            if pedido_info is not None:
+                pendientes.append((fila_para_pdf(pedido_info, factura), factura['folio'], ruta))
+            facturas.append((factura, ruta))
+
+        try:
+            if len(pendientes) == 1:
+                # Uno solo no compensa enviarlo a otro proceso
+                generar_pdf(*pendientes[0])
+            elif pendientes:
+                pool = _obtener_pool()
+                for futuro in [pool.submit(generar_pdf, *pendiente) for pendiente in pendientes]:
+                    futuro.result()
+        except Exception as e:
+            print(f"Error generando PDFs del lote de facturas: {e}")
+            return {'success': False, 'error': str(e)}
+
+        return {'success': True, 'facturas': facturas, 'omitidos': resultado['omitidos']}
+
+    @staticmethod
+    def escribir_zip(facturas, destino):
+        """
+        Escribe en destino un ZIP con los PDFs [(factura, ruta)]; sin comprimir
+        de nuevo porque el contenido de los PDFs ya va comprimido
+        """
+        with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_STORED) as archivo:
+            for factura, ruta in facturas:
+                archivo.write(ruta, f"factura_{factura['folio']}.pdf")
+        return destino
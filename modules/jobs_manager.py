@@ -0,0 +1,336 @@
+"""
+Módulo de trabajos en segundo plano para exportaciones pesadas
+Las rutas registran el trabajo en la tabla trabajos y regresan su id de
+inmediato; un pool de hilos genera el archivo dentro de un contexto de la
+app y deja el resultado en disco. Cada trabajo lleva una huella (tipo,
+parámetros y contadores de los datos que lee, migración 14): si ya existe
+un resultado con la misma huella, se reutiliza en lugar de generarlo otra vez.
+"""
+import hashlib
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import g
+
+import db_connection
+from db_connection import get_connection, escribir
+from modules.export_manager import ExportManager, MIMETYPE_EXCEL, MIMETYPE_PDF
+from modules.invoice_manager import InvoiceManager
+
+TRABAJADORES = 2
+
+# tipo: función que escribe el archivo, parámetros que acepta (con su tipo) y
+# cuáles son obligatorios, contadores de versiones_datos que cubren sus
+# datos y extensión/mimetype del resultado
+TIPOS_TRABAJO = {
+    'inventario_excel': {
+        'funcion': ExportManager.inventario_excel,
+        'parametros': {},
+        'requeridos': (),
+        'datos': ('inventario',),
+        'extension': 'xlsx',
+        'mimetype': MIMETYPE_EXCEL
+    },
+    'historial_cotizaciones': {
+        'funcion': ExportManager.historial_cotizaciones,
+        'parametros': {'desde': str, 'hasta': str, 'id_cliente': int, 'estado': str},
+        'requeridos': (),
+        'datos': ('cotizaciones',),
+        'extension': 'pdf',
+        'mimetype': MIMETYPE_PDF
+    },
+    'factura': {
+        'funcion': InvoiceManager.exportar,
+        'parametros': {'id_pedido': int},
+        'requeridos': ('id_pedido',),
+        'datos': ('pedidos',),
+        'extension': 'pdf',
+        'mimetype': MIMETYPE_PDF
+    },
+}
+
+_pool = None
+_lock = threading.Lock()
+
+# Trabajos puestos en la cola por este proceso y aún sin terminar: solo
+# esos se reutilizan mientras están pendientes (los de otro proceso pudieron
+# quedar huérfanos si ese proceso se detuvo)
+_en_curso = set()
+
+
+def _obtener_pool():
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=TRABAJADORES, thread_name_prefix='trabajos')
+    return _pool
+
+
+def directorio_resultados():
+    """Carpeta de resultados junto a la base de datos activa"""
+    directorio = os.path.join(os.path.dirname(os.path.abspath(db_connection.DB_PATH)), 'trabajos')
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+
+def _hash(*partes):
+    return hashlib.sha256(json.dumps(partes, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _fila_a_trabajo(row):
+    return {
+        'id_trabajo': row[0],
+        'tipo': row[1],
+        'parametros': json.loads(row[2]),
+        'estado': row[3],
+        'progreso': row[4],
+        'ruta_resultado': row[5],
+        'nombre_archivo': row[6],
+        'error': row[7],
+        'fecha_creacion': row[8],
+        'fecha_fin': row[9]
+    }
+
+
+class JobsManager:
+    """Registra, ejecuta y consulta trabajos de exportación"""
+
+    @staticmethod
+    def _registrar(id_trabajo, tipo, parametros, clave, huella):
+        """
+        Inserta el trabajo salvo que ya haya uno vigente con la misma huella
+        (terminado con su archivo, o pendiente en este proceso); retorna el id a usar
+        """
+        conn = get_connection()
+        if not conn:
+            return {'success': False, 'error': 'Error de conexión a BD'}
+
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT id_trabajo, estado, ruta_resultado
+                FROM trabajos
+                WHERE huella = ? AND estado IN ('pendiente', 'en_proceso', 'terminado')
+                ORDER BY fecha_creacion DESC
+            """, (huella,))
+            for existente, estado, ruta in cur.fetchall():
+                if (existente in _en_curso if estado != 'terminado'
+                        else ruta and os.path.exists(ruta)):
+                    cur.close()
+                    conn.close()
+                    return {'success': True, 'id_trabajo': existente, 'reutilizado': True}
+
+            cur.execute("""
+                INSERT INTO trabajos (id_trabajo, tipo, parametros, clave, huella)
+                VALUES (?, ?, ?, ?, ?)
+            """, (id_trabajo, tipo, json.dumps(parametros, sort_keys=True), clave, huella))
+            # En curso desde ahora, aún serializado en el escritor: una
+            # solicitud igual que llegue después ya lo reutiliza
+            _en_curso.add(id_trabajo)
+
+            conn.commit()
+            cur.close()
+            conn.close()
+
+            return {'success': True, 'id_trabajo': id_trabajo, 'reutilizado': False}
+
+        except Exception as e:
+            print(f"Error registrando trabajo: {e}")
+            _en_curso.discard(id_trabajo)
+            if conn:
+                conn.rollback()
+                conn.close()
+            return {'success': False, 'error': str(e)}
+
+    @staticmethod
+    def _actualizar(id_trabajo, **campos):
+        """Cambia estado, progreso o resultado de un trabajo"""
+        conn = get_connection()
+        if not conn:
+            return {'success': False, 'error': 'Error de conexión a BD'}
+
+        try:
+            cur = conn.cursor()
+            asignaciones = ', '.join(f"{campo} = ?" for campo in campos)
+            if campos.get('estado') in ('terminado', 'error'):
+                asignaciones += ", fecha_fin = datetime('now','localtime')"
+            cur.execute(f"UPDATE trabajos SET {asignaciones} WHERE id_trabajo = ?",
+                        (*campos.values(), id_trabajo))
+
+            conn.commit()
+            cur.close()
+            conn.close()
+
+            return {'success': True}
+
+        except Exception as e:
+            print(f"Error actualizando trabajo: {e}")
+            if conn:
+                conn.rollback()
+                conn.close()
+            return {'success': False, 'error': str(e)}
+
+    @staticmethod
+    def _descartar_anteriores(clave, huella):
+        """
+        Borra los resultados de la misma solicitud hechos con datos que ya
+        cambiaron; retorna las rutas a eliminar del disco
+        """
+        conn = get_connection()
+        if not conn:
+            return []
+
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                DELETE FROM trabajos
+                WHERE clave = ? AND huella != ? AND estado IN ('terminado', 'error')
+                RETURNING ruta_resultado
+            """, (clave, huella))
+            rutas = [row[0] for row in cur.fetchall() if row[0]]
+
+            conn.commit()
+            cur.close()
+            conn.close()
+
+            return rutas
+
+        except Exception as e:
+            print(f"Error descartando resultados anteriores: {e}")
+            if conn:
+                conn.rollback()
+                conn.close()
+            return []
+
+    @staticmethod
+    def _versiones(nombres):
+        conn = get_connection()
+        if not conn:
+            return {}
+
+        try:
+            cur = conn.cursor()
+            cur.execute(f"""
+                SELECT nombre, version FROM versiones_datos
+                WHERE nombre IN ({','.join('?' * len(nombres))})
+            """, nombres)
+            versiones = dict(cur.fetchall())
+            cur.close()
+            conn.close()
+            return versiones
+
+        except Exception as e:
+            print(f"Error leyendo versiones de datos: {e}")
+            return {}
+
+    @staticmethod
+    def enviar(app, tipo, parametros=None):
+        """
+        Registra un trabajo y lo pone en la cola; retorna su id de inmediato.
+        Si hay uno igual (mismos parámetros y datos sin cambios) pendiente,
+        en proceso o terminado, retorna ese.
+        """
+        definicion = TIPOS_TRABAJO.get(tipo)
+        if not definicion:
+            return {'success': False, 'error': f'Tipo de trabajo no válido: {tipo}'}
+        if not isinstance(parametros or {}, dict):
+            return {'success': False, 'error': 'Los parámetros deben ser un objeto'}
+
+        try:
+            parametros = {
+                clave: definicion['parametros'][clave](valor)
+                for clave, valor in (parametros or {}).items()
+                if clave in definicion['parametros'] and valor not in (None, '')
+            }
+        except (TypeError, ValueError):
+            return {'success': False, 'error': 'Parámetros no válidos'}
+        faltantes = [clave for clave in definicion['requeridos'] if clave not in parametros]
+        if faltantes:
+            return {'success': False, 'error': f"Falta {', '.join(faltantes)}"}
+
+        clave = _hash(tipo, parametros)
+        huella = _hash(clave, JobsManager._versiones(list(definicion['datos'])))
+
+        id_trabajo = uuid.uuid4().hex
+        try:
+            resultado = escribir(JobsManager._registrar, id_trabajo, tipo, parametros, clave, huella)
+        except Exception:
+            # El lote del escritor se deshizo: el trabajo no quedó registrado
+            _en_curso.discard(id_trabajo)
+            raise
+        if resultado['success'] and not resultado['reutilizado']:
+            _obtener_pool().submit(JobsManager._ejecutar, app, resultado['id_trabajo'],
+                                   tipo, parametros, clave, huella)
+        return resultado
+
+    @staticmethod
+    def _ejecutar(app, id_trabajo, tipo, parametros, clave, huella):
+        """Genera el archivo del trabajo en un hilo del pool"""
+        definicion = TIPOS_TRABAJO[tipo]
+        with app.app_context():
+            # Las lecturas de la exportación usan la conexión de solo lectura;
+            # estado, progreso y facturas se escriben con escribir(), que usa
+            # la de escritura también sin escritor grupal
+            g._db_solo_lectura = True
+            escribir(JobsManager._actualizar, id_trabajo, estado='en_proceso')
+
+            ruta = os.path.join(directorio_resultados(), f"{id_trabajo}.{definicion['extension']}")
+            try:
+                def progreso(fraccion):
+                    escribir(JobsManager._actualizar, id_trabajo, progreso=round(min(fraccion, 1), 3))
+
+                with open(ruta, 'wb') as destino:
+                    nombre = definicion['funcion'](destino=destino, progreso=progreso, **parametros)
+                if not nombre:
+                    raise LookupError('No se encontraron los datos solicitados')
+
+                escribir(JobsManager._actualizar, id_trabajo, estado='terminado', progreso=1,
+                         ruta_resultado=ruta, nombre_archivo=nombre)
+
+                for anterior in escribir(JobsManager._descartar_anteriores, clave, huella):
+                    if os.path.exists(anterior):
+                        os.remove(anterior)
+
+            except Exception as e:
+                print(f"Error ejecutando trabajo {id_trabajo}: {e}")
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+                escribir(JobsManager._actualizar, id_trabajo, estado='error', error=str(e))
+
+            finally:
+                _en_curso.discard(id_trabajo)
+
+    @staticmethod
+    def obtener(id_trabajo):
+        """
+        Estado de un trabajo (o None si no existe); incluye el mimetype del resultado
+        """
+        conn = get_connection()
+        if not conn:
+            return None
+
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT id_trabajo, tipo, parametros, estado, progreso, ruta_resultado,
+                       nombre_archivo, error, fecha_creacion, fecha_fin
+                FROM trabajos
+                WHERE id_trabajo = ?
+            """, (id_trabajo,))
+            row = cur.fetchone()
+            cur.close()
+            conn.close()
+
+            if not row:
+                return None
+            trabajo = _fila_a_trabajo(row)
+            trabajo['mimetype'] = TIPOS_TRABAJO.get(trabajo['tipo'], {}).get('mimetype')
+            return trabajo
+
+        except Exception as e:
+            print(f"Error obteniendo trabajo: {e}")
+            return None
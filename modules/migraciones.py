@@ -0,0 +1,854 @@
+"""
+Migraciones versionadas del esquema de la base de datos
+Cada migración se aplica una sola vez y queda registrada en schema_migraciones
+"""
+import sqlite3
+from db_connection import get_connection
+
+
+def _deduplicar_colores(cur):
+    """
+    Une colores repetidos por codigo_hex (conserva el id más bajo)
+    para poder crear el índice único
+    """
+    cur.execute("""
+        SELECT codigo_hex, MIN(id_color)
+        FROM colores
+        GROUP BY codigo_hex
+        HAVING COUNT(*) > 1
+    """)
+    for codigo_hex, id_conservado in cur.fetchall():
+        for columna in ('id_color_principal', 'id_color_secundario',
+                        'id_color_hilo', 'id_color_asa'):
+            cur.execute(f"""
+                UPDATE combinaciones SET {columna} = ?
+                WHERE {columna} IN (
+                    SELECT id_color FROM colores WHERE codigo_hex = ? AND id_color != ?
+                )
+            """, (id_conservado, codigo_hex, id_conservado))
+        cur.execute("""
+            DELETE FROM colores WHERE codigo_hex = ? AND id_color != ?
+        """, (codigo_hex, id_conservado))
+
+
+def _renombrar_combinaciones_repetidas(cur):
+    """
+    Agrega el id a los nombres de combinaciones repetidos (conserva el más antiguo)
+    para poder crear el índice único
+    """
+    cur.execute("""
+        UPDATE combinaciones
+        SET nombre_guardado = nombre_guardado || ' (' || id_combinacion || ')'
+        WHERE id_combinacion NOT IN (
+            SELECT MIN(id_combinacion) FROM combinaciones GROUP BY nombre_guardado
+        )
+        AND nombre_guardado IS NOT NULL
+    """)
+
+
+# Saldo y estado de pago derivados de total y total_pagado (mismo criterio que /pagos)
+_DERIVAR_SALDO = """
+    UPDATE pedidos
+    SET saldo = MAX(0, ROUND(COALESCE(total, 0) - total_pagado, 2)),
+        estado_pago = CASE
+            WHEN total_pagado >= COALESCE(total, 0) THEN 'pagado'
+            WHEN total_pagado > 0 THEN 'parcial'
+            ELSE 'pendiente'
+        END
+    WHERE id_pedido = NEW.id_pedido;
+"""
+
+
+def _sql_resumen_pedido(fila, signo):
+    """
+    Sentencias de trigger que suman (signo=1) o restan (signo=-1) el pedido
+    NEW/OLD en las tablas de resumen. Los cancelados solo cuentan por estado.
+    """
+    return f"""
+        INSERT INTO resumen_estado (estado, pedidos, monto)
+            SELECT {fila}.estado, {signo}, {signo} * COALESCE({fila}.total, 0)
+            WHERE {fila}.estado IS NOT NULL
+            ON CONFLICT(estado) DO UPDATE SET
+                pedidos = pedidos + excluded.pedidos,
+                monto = ROUND(monto + excluded.monto, 2);
+        INSERT INTO resumen_diario (fecha, pedidos, ventas)
+            SELECT date({fila}.fecha_pedido), {signo}, {signo} * COALESCE({fila}.total, 0)
+            WHERE {fila}.estado <> 'cancelado' AND date({fila}.fecha_pedido) IS NOT NULL
+            ON CONFLICT(fecha) DO UPDATE SET
+                pedidos = pedidos + excluded.pedidos,
+                ventas = ROUND(ventas + excluded.ventas, 2);
+        INSERT INTO resumen_mensual (mes, pedidos, ventas)
+            SELECT strftime('%Y-%m', {fila}.fecha_pedido), {signo}, {signo} * COALESCE({fila}.total, 0)
+            WHERE {fila}.estado <> 'cancelado' AND date({fila}.fecha_pedido) IS NOT NULL
+            ON CONFLICT(mes) DO UPDATE SET
+                pedidos = pedidos + excluded.pedidos,
+                ventas = ROUND(ventas + excluded.ventas, 2);
+        INSERT INTO resumen_cliente (id_cliente, pedidos)
+            SELECT {fila}.id_cliente, {signo}
+            WHERE {fila}.estado <> 'cancelado' AND {fila}.id_cliente IS NOT NULL
+            ON CONFLICT(id_cliente) DO UPDATE SET pedidos = pedidos + excluded.pedidos;
+        INSERT INTO resumen_producto (id_producto, unidades)
+            SELECT dp.id_producto, {signo} * SUM(dp.cantidad)
+            FROM detalle_pedido dp
+            WHERE dp.id_pedido = {fila}.id_pedido AND dp.id_producto IS NOT NULL
+            AND {fila}.estado <> 'cancelado'
+            GROUP BY dp.id_producto
+            ON CONFLICT(id_producto) DO UPDATE SET unidades = unidades + excluded.unidades;
+    """
+
+
+def _sql_resumen_detalle(fila, signo):
+    """
+    Sentencias de trigger que suman o restan una línea NEW/OLD de detalle_pedido
+    en las unidades por producto, si su pedido no está cancelado
+    """
+    return f"""
+        INSERT INTO resumen_producto (id_producto, unidades)
+            SELECT {fila}.id_producto, {signo} * {fila}.cantidad
+            FROM pedidos p
+            WHERE p.id_pedido = {fila}.id_pedido AND p.estado <> 'cancelado'
+            AND {fila}.id_producto IS NOT NULL
+            ON CONFLICT(id_producto) DO UPDATE SET unidades = unidades + excluded.unidades;
+    """
+
+
+def reconstruir_resumenes(cur):
+    """
+    Recalcula por completo las tablas de resumen del dashboard desde pedidos
+    y detalle_pedido (carga inicial y reparación)
+    """
+    for tabla in ('resumen_estado', 'resumen_diario', 'resumen_mensual',
+                  'resumen_cliente', 'resumen_producto'):
+        cur.execute(f"DELETE FROM {tabla}")
+
+    cur.execute("""
+        INSERT INTO resumen_estado (estado, pedidos, monto)
+        SELECT estado, COUNT(*), ROUND(COALESCE(SUM(total), 0), 2)
+        FROM pedidos WHERE estado IS NOT NULL
+        GROUP BY estado
+    """)
+    cur.execute("""
+        INSERT INTO resumen_diario (fecha, pedidos, ventas)
+        SELECT date(fecha_pedido), COUNT(*), ROUND(COALESCE(SUM(total), 0), 2)
+        FROM pedidos
+        WHERE estado <> 'cancelado' AND date(fecha_pedido) IS NOT NULL
+        GROUP BY date(fecha_pedido)
+    """)
+    cur.execute("""
+        INSERT INTO resumen_mensual (mes, pedidos, ventas)
+        SELECT strftime('%Y-%m', fecha_pedido), COUNT(*), ROUND(COALESCE(SUM(total), 0), 2)
+        FROM pedidos
+        WHERE estado <> 'cancelado' AND date(fecha_pedido) IS NOT NULL
+        GROUP BY strftime('%Y-%m', fecha_pedido)
+    """)
+    cur.execute("""
+        INSERT INTO resumen_cliente (id_cliente, pedidos)
+        SELECT id_cliente, COUNT(*)
+        FROM pedidos
+        WHERE estado <> 'cancelado' AND id_cliente IS NOT NULL
+        GROUP BY id_cliente
+    """)
+    cur.execute("""
+        INSERT INTO resumen_producto (id_producto, unidades)
+        SELECT dp.id_producto, SUM(dp.cantidad)
+        FROM detalle_pedido dp
+        JOIN pedidos p ON dp.id_pedido = p.id_pedido
+        WHERE p.estado <> 'cancelado' AND dp.id_producto IS NOT NULL
+        GROUP BY dp.id_producto
+    """)
+
+
+# Documentos del índice de búsqueda: rowid = id * 4 + código del tipo
+DOCUMENTOS_BUSQUEDA = {
+    'cliente': {
+        'codigo': 0,
+        'desde': "clientes cl",
+        'id': "cl.id_cliente",
+        'titulo': "cl.nombre_cliente",
+        'contenido': """COALESCE(cl.rfc, '') || ' ' || COALESCE(cl.razon_social, '') || ' ' ||
+                        COALESCE(cl.correo, '') || ' ' || COALESCE(cl.telefono, '')""",
+    },
+    'combinacion': {
+        'codigo': 1,
+        'desde': "combinaciones cb",
+        'id': "cb.id_combinacion",
+        'titulo': "COALESCE(cb.nombre_guardado, '')",
+        'contenido': "''",
+    },
+    'pedido': {
+        'codigo': 2,
+        'desde': "pedidos p LEFT JOIN clientes cl ON cl.id_cliente = p.id_cliente",
+        'id': "p.id_pedido",
+        'titulo': "'Pedido #' || p.id_pedido",
+        'contenido': """COALESCE(cl.nombre_cliente, '') || ' ' || COALESCE((
+                            SELECT group_concat(cb.nombre_guardado, ' ')
+                            FROM detalle_pedido dp
+                            JOIN combinaciones cb ON cb.id_combinacion = dp.id_producto
+                            WHERE dp.id_pedido = p.id_pedido), '')""",
+    },
+    'cotizacion': {
+        'codigo': 3,
+        'desde': "cotizaciones ct LEFT JOIN clientes cl ON cl.id_cliente = ct.id_cliente",
+        'id': "ct.id_cotizacion",
+        'titulo': "'Cotización #' || ct.id_cotizacion",
+        'contenido': """COALESCE(cl.nombre_cliente, '') || ' ' || COALESCE((
+                            SELECT group_concat(cb.nombre_guardado, ' ')
+                            FROM detalle_cotizacion dc
+                            JOIN combinaciones cb ON cb.id_combinacion = dc.id_material
+                            WHERE dc.id_cotizacion = ct.id_cotizacion), '')""",
+    },
+}
+
+
+def _sql_insertar_documentos(tipo, condicion):
+    d = DOCUMENTOS_BUSQUEDA[tipo]
+    return f"""
+        INSERT INTO busqueda (rowid, tipo, id_ref, titulo, contenido)
+            SELECT {d['id']} * 4 + {d['codigo']}, '{tipo}', {d['id']}, {d['titulo']}, {d['contenido']}
+            FROM {d['desde']} WHERE {condicion}
+    """
+
+
+def _sql_indexar(tipo, condicion):
+    """
+    Sentencias de trigger que (re)indexan los documentos del tipo que cumplen la condición
+    """
+    d = DOCUMENTOS_BUSQUEDA[tipo]
+    return f"""
+        DELETE FROM busqueda WHERE rowid IN (
+            SELECT {d['id']} * 4 + {d['codigo']} FROM {d['desde']} WHERE {condicion}
+        );
+        {_sql_insertar_documentos(tipo, condicion)};
+    """
+
+
+def _sql_desindexar(tipo, id_ref):
+    return f"DELETE FROM busqueda WHERE rowid = {id_ref} * 4 + {DOCUMENTOS_BUSQUEDA[tipo]['codigo']};"
+
+
+def _triggers_busqueda():
+    """
+    Triggers que mantienen sincronizado el índice de búsqueda
+    """
+    triggers = {
+        'clientes_insertar': ("AFTER INSERT ON clientes",
+                              _sql_indexar('cliente', "cl.id_cliente = NEW.id_cliente")),
+        'clientes_actualizar': ("AFTER UPDATE ON clientes",
+                                _sql_indexar('cliente', "cl.id_cliente = NEW.id_cliente")),
+        # El nombre del cliente también aparece en sus pedidos y cotizaciones
+        'clientes_renombrar': ("AFTER UPDATE OF nombre_cliente ON clientes",
+                               _sql_indexar('pedido', "p.id_cliente = NEW.id_cliente")
+                               + _sql_indexar('cotizacion', "ct.id_cliente = NEW.id_cliente")),
+        'clientes_eliminar': ("AFTER DELETE ON clientes",
+                              _sql_desindexar('cliente', "OLD.id_cliente")
+                              + _sql_indexar('pedido', "p.id_cliente = OLD.id_cliente")
+                              + _sql_indexar('cotizacion', "ct.id_cliente = OLD.id_cliente")),
+        'combinaciones_insertar': ("AFTER INSERT ON combinaciones",
+                                   _sql_indexar('combinacion', "cb.id_combinacion = NEW.id_combinacion")),
+        'combinaciones_renombrar': (
+            "AFTER UPDATE OF nombre_guardado ON combinaciones",
+            _sql_indexar('combinacion', "cb.id_combinacion = NEW.id_combinacion")
+            + _sql_indexar('pedido', """p.id_pedido IN (
+                SELECT id_pedido FROM detalle_pedido WHERE id_producto = NEW.id_combinacion)""")
+            + _sql_indexar('cotizacion', """ct.id_cotizacion IN (
+                SELECT id_cotizacion FROM detalle_cotizacion WHERE id_material = NEW.id_combinacion)""")),
+        'combinaciones_eliminar': ("AFTER DELETE ON combinaciones",
+                                   _sql_desindexar('combinacion', "OLD.id_combinacion")),
+        'pedidos_insertar': ("AFTER INSERT ON pedidos",
+                             _sql_indexar('pedido', "p.id_pedido = NEW.id_pedido")),
+        'pedidos_actualizar': ("AFTER UPDATE OF id_cliente ON pedidos",
+                               _sql_indexar('pedido', "p.id_pedido = NEW.id_pedido")),
+        'pedidos_eliminar': ("AFTER DELETE ON pedidos",
+                             _sql_desindexar('pedido', "OLD.id_pedido")),
+        'detalle_pedido_insertar': ("AFTER INSERT ON detalle_pedido",
+                                    _sql_indexar('pedido', "p.id_pedido = NEW.id_pedido")),
+        'detalle_pedido_actualizar': ("AFTER UPDATE OF id_producto, id_pedido ON detalle_pedido",
+                                      _sql_indexar('pedido', "p.id_pedido IN (OLD.id_pedido, NEW.id_pedido)")),
+        'detalle_pedido_eliminar': ("AFTER DELETE ON detalle_pedido",
+                                    _sql_indexar('pedido', "p.id_pedido = OLD.id_pedido")),
+        'cotizaciones_insertar': ("AFTER INSERT ON cotizaciones",
+                                  _sql_indexar('cotizacion', "ct.id_cotizacion = NEW.id_cotizacion")),
+        'cotizaciones_actualizar': ("AFTER UPDATE OF id_cliente ON cotizaciones",
+                                    _sql_indexar('cotizacion', "ct.id_cotizacion = NEW.id_cotizacion")),
+        'cotizaciones_eliminar': ("AFTER DELETE ON cotizaciones",
+                                  _sql_desindexar('cotizacion', "OLD.id_cotizacion")),
+        'detalle_cotizacion_insertar': ("AFTER INSERT ON detalle_cotizacion",
+                                        _sql_indexar('cotizacion', "ct.id_cotizacion = NEW.id_cotizacion")),
+        'detalle_cotizacion_actualizar': (
+            "AFTER UPDATE OF id_material, id_cotizacion ON detalle_cotizacion",
+            _sql_indexar('cotizacion', "ct.id_cotizacion IN (OLD.id_cotizacion, NEW.id_cotizacion)")),
+        'detalle_cotizacion_eliminar': ("AFTER DELETE ON detalle_cotizacion",
+                                        _sql_indexar('cotizacion', "ct.id_cotizacion = OLD.id_cotizacion")),
+    }
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS trg_busqueda_{nombre} {evento} BEGIN {cuerpo} END"
+        for nombre, (evento, cuerpo) in triggers.items()
+    ]
+
+
+def reconstruir_busqueda(cur):
+    """
+    Vuelve a indexar todos los documentos de búsqueda (carga inicial y reparación)
+    """
+    cur.execute("DELETE FROM busqueda")
+    for tipo in DOCUMENTOS_BUSQUEDA:
+        cur.execute(_sql_insertar_documentos(tipo, "1"))
+
+
+def _sql_tabla_movimientos(nombre='movimientos_inventario'):
+    """
+    Tabla del kardex. fecha va en hora local, el mismo reloj que
+    fecha_corte y que las fechas de consulta de existencias.
+    """
+    return f"""CREATE TABLE IF NOT EXISTS {nombre} (
+            id_movimiento INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_material INTEGER NOT NULL,
+            tipo TEXT NOT NULL CHECK (tipo IN ('entrada', 'salida', 'ajuste')),
+            cantidad REAL NOT NULL,
+            saldo REAL NOT NULL,
+            referencia_tipo TEXT CHECK (referencia_tipo IN ('pedido', 'cotizacion')),
+            id_referencia INTEGER,
+            usuario TEXT,
+            nota TEXT,
+            fecha TEXT NOT NULL DEFAULT (datetime('now','localtime')),
+            FOREIGN KEY (id_material) REFERENCES materiales(id_material)
+        )"""
+
+
+_INDICES_KARDEX = (
+    # (id_material, rowid): los movimientos posteriores a un corte son un rango
+    "CREATE INDEX IF NOT EXISTS idx_movimientos_material ON movimientos_inventario(id_material)",
+    "CREATE INDEX IF NOT EXISTS idx_movimientos_referencia "
+    "ON movimientos_inventario(referencia_tipo, id_referencia)",
+)
+
+# El kardex solo admite inserciones
+_TRIGGERS_KARDEX = (
+    """CREATE TRIGGER IF NOT EXISTS trg_movimientos_sin_actualizar
+        BEFORE UPDATE ON movimientos_inventario BEGIN
+        SELECT RAISE(ABORT, 'movimientos_inventario solo admite inserciones');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_movimientos_sin_eliminar
+        BEFORE DELETE ON movimientos_inventario BEGIN
+        SELECT RAISE(ABORT, 'movimientos_inventario solo admite inserciones');
+    END""",
+)
+
+
+def _kardex_en_hora_local(cur):
+    """
+    Las bases migradas antes guardaban fecha en UTC (datetime('now')): se
+    reconstruye la tabla con el default en hora local y se convierten las
+    fechas existentes. Si la tabla ya usa hora local no hace nada.
+    """
+    cur.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'movimientos_inventario'")
+    row = cur.fetchone()
+    if not row or "'localtime'" in row[0]:
+        return
+
+    cur.execute(_sql_tabla_movimientos('movimientos_inventario_local'))
+    cur.execute("""
+        INSERT INTO movimientos_inventario_local (
+            id_movimiento, id_material, tipo, cantidad, saldo,
+            referencia_tipo, id_referencia, usuario, nota, fecha
+        )
+        SELECT id_movimiento, id_material, tipo, cantidad, saldo,
+               referencia_tipo, id_referencia, usuario, nota, datetime(fecha, 'localtime')
+        FROM movimientos_inventario
+    """)
+    # DROP TABLE no dispara los triggers que impiden borrar; se van con la tabla
+    cur.execute("DROP TABLE movimientos_inventario")
+    cur.execute("ALTER TABLE movimientos_inventario_local RENAME TO movimientos_inventario")
+    for paso in (*_INDICES_KARDEX, *_TRIGGERS_KARDEX):
+        cur.execute(paso)
+
+
+# (versión, descripción, pasos). Cada paso es SQL o una función que recibe el cursor.
+def _sql_huella(tabla, detalle, producto, clave, valor):
+    """
+    Huella canónica de las líneas de un pedido o cotización: 'producto:cantidad'
+    por producto (cantidades sumadas), ordenadas por producto y separadas por
+    comas. Junto con id_cliente identifica un contenido idéntico.
+    La cantidad va con 15 dígitos significativos (%g solo da 6 y confundía
+    1000000 con 1000001).
+    """
+    return f"""UPDATE {tabla} SET huella = (
+            SELECT group_concat(linea, ',') FROM (
+                SELECT printf('%d:%.15g', {producto}, SUM(cantidad)) AS linea
+                FROM {detalle}
+                WHERE {clave} = {valor}
+                GROUP BY {producto}
+                ORDER BY {producto}
+            )
+        )
+        WHERE {clave} = {valor};"""
+
+
+def _triggers_huella(tabla, detalle, producto, clave):
+    triggers = []
+    for evento, cuando, filas in (
+        ('insertar', 'AFTER INSERT', ('NEW',)),
+        ('eliminar', 'AFTER DELETE', ('OLD',)),
+        ('actualizar', f'AFTER UPDATE OF {producto}, cantidad, {clave}', ('OLD', 'NEW')),
+    ):
+        cuerpo = '\n'.join(
+            _sql_huella(tabla, detalle, producto, clave, f'{fila}.{clave}') for fila in filas
+        )
+        triggers.append(f"""CREATE TRIGGER IF NOT EXISTS trg_huella_{detalle}_{evento}
+            {cuando} ON {detalle} BEGIN
+            {cuerpo}
+        END""")
+    return triggers
+
+
+def _sql_evaluar_alerta(id_material, cantidad):
+    """
+    Activa o resuelve la alerta de stock del material cuando su saldo cruza
+    stock_minimo. Cada cambio toma el siguiente número de versión, que sirve
+    de cursor para la consulta incremental de alertas. desde va en hora
+    local, como las fechas del kardex.
+    """
+    return f"""INSERT INTO alertas_stock (id_material, cantidad, stock_minimo, activa, desde, version)
+            SELECT m.id_material, {cantidad}, m.stock_minimo, 1, datetime('now','localtime'),
+                   (SELECT COALESCE(MAX(version), 0) + 1 FROM alertas_stock)
+            FROM materiales m
+            WHERE m.id_material = {id_material} AND {cantidad} < m.stock_minimo
+            ON CONFLICT(id_material) DO UPDATE SET
+                cantidad = excluded.cantidad,
+                stock_minimo = excluded.stock_minimo,
+                desde = CASE WHEN activa = 1 THEN desde ELSE excluded.desde END,
+                activa = 1,
+                version = excluded.version;
+        UPDATE alertas_stock SET
+            activa = 0,
+            cantidad = {cantidad},
+            version = (SELECT MAX(version) + 1 FROM alertas_stock)
+        WHERE id_material = {id_material} AND activa = 1
+        AND ({cantidad} IS NULL OR {cantidad} >= (
+            SELECT stock_minimo FROM materiales WHERE id_material = {id_material}
+        ));"""
+
+
+_TRIGGERS_ALERTAS = (
+    f"""CREATE TRIGGER IF NOT EXISTS trg_alertas_inventario_insertar
+        AFTER INSERT ON inventario_materiales BEGIN
+        {_sql_evaluar_alerta('NEW.id_material', 'NEW.cantidad')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_alertas_inventario_actualizar
+        AFTER UPDATE OF cantidad ON inventario_materiales
+        WHEN NEW.cantidad IS NOT OLD.cantidad BEGIN
+        {_sql_evaluar_alerta('NEW.id_material', 'NEW.cantidad')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_alertas_inventario_eliminar
+        AFTER DELETE ON inventario_materiales BEGIN
+        {_sql_evaluar_alerta('OLD.id_material', 'NULL')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_alertas_stock_minimo
+        AFTER UPDATE OF stock_minimo ON materiales
+        WHEN NEW.stock_minimo IS NOT OLD.stock_minimo BEGIN
+        {_sql_evaluar_alerta('NEW.id_material',
+                             '(SELECT cantidad FROM inventario_materiales WHERE id_material = NEW.id_material)')}
+    END""",
+)
+
+
+def _alertas_en_hora_local(cur):
+    """
+    Las bases migradas antes tenían los triggers de alertas con
+    datetime('now') (UTC): se recrean en hora local y se convierte desde de
+    las alertas guardadas. Si los triggers ya usan hora local no hace nada.
+    """
+    cur.execute("""
+        SELECT sql FROM sqlite_master
+        WHERE type = 'trigger' AND name = 'trg_alertas_inventario_insertar'
+    """)
+    row = cur.fetchone()
+    if not row or "'localtime'" in row[0]:
+        return
+
+    for nombre in ('trg_alertas_inventario_insertar', 'trg_alertas_inventario_actualizar',
+                   'trg_alertas_inventario_eliminar', 'trg_alertas_stock_minimo'):
+        cur.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+    for paso in _TRIGGERS_ALERTAS:
+        cur.execute(paso)
+    cur.execute("UPDATE alertas_stock SET desde = datetime(desde, 'localtime')")
+
+
+TABLAS_REFERENCIA = ('modelos_bolsas', 'paletas_colores', 'colores')
+
+# Lo que cambia el costo de producción de un diseño: precio de los materiales,
+# listas de materiales y el modelo de cada combinación
+TABLAS_COSTOS = (('materiales', 'costo_unitario'), 'lista_materiales', ('combinaciones', 'id_modelo'))
+
+# Datos que lee cada exportación; sus contadores forman la huella de los
+# resultados que guardan los trabajos en segundo plano
+TABLAS_EXPORTACION = {
+    'inventario': ('materiales', 'inventario_materiales'),
+    'cotizaciones': ('cotizaciones', 'detalle_cotizacion', 'clientes'),
+    'pedidos': ('pedidos', 'detalle_pedido', 'clientes', 'combinaciones'),
+}
+
+
+def _triggers_versiones(tablas=TABLAS_REFERENCIA, nombre='referencia'):
+    """
+    Cualquier cambio en los datos de referencia incrementa su contador en
+    versiones_datos; la caché en memoria de cada proceso lo compara para
+    saber si debe recargar
+    tablas: nombres o (tabla, columna) si solo importa el cambio de esa columna
+    """
+    prefijo = 'trg_version' if nombre == 'referencia' else f'trg_version_{nombre}'
+    triggers = []
+    for tabla in tablas:
+        tabla, columna = tabla if isinstance(tabla, tuple) else (tabla, None)
+        for evento in ('INSERT', 'UPDATE', 'DELETE'):
+            condicion = ''
+            if evento == 'UPDATE' and columna:
+                condicion = f"OF {columna} ON {tabla} WHEN NEW.{columna} IS NOT OLD.{columna}"
+            triggers.append(f"""CREATE TRIGGER IF NOT EXISTS {prefijo}_{tabla}_{evento.lower()}
+                AFTER {evento} {condicion or f'ON {tabla}'} BEGIN
+                UPDATE versiones_datos SET version = version + 1 WHERE nombre = '{nombre}';
+            END""")
+    return triggers
+
+
+MIGRACIONES = [
+    (1, 'Índices de claves foráneas y filtros frecuentes', [
+        "CREATE INDEX IF NOT EXISTS idx_pedidos_estado_entrega ON pedidos(estado, fecha_entrega)",
+        "CREATE INDEX IF NOT EXISTS idx_pedidos_entrega ON pedidos(fecha_entrega)",
+        "CREATE INDEX IF NOT EXISTS idx_pedidos_cliente ON pedidos(id_cliente)",
+        "CREATE INDEX IF NOT EXISTS idx_detalle_pedido_pedido ON detalle_pedido(id_pedido)",
+        "CREATE INDEX IF NOT EXISTS idx_detalle_pedido_producto ON detalle_pedido(id_producto)",
+        "CREATE INDEX IF NOT EXISTS idx_cotizaciones_cliente ON cotizaciones(id_cliente)",
+        "CREATE INDEX IF NOT EXISTS idx_cotizaciones_emision ON cotizaciones(fecha_emision)",
+        "CREATE INDEX IF NOT EXISTS idx_detalle_cotizacion_cotizacion ON detalle_cotizacion(id_cotizacion)",
+        "CREATE INDEX IF NOT EXISTS idx_detalle_cotizacion_material ON detalle_cotizacion(id_material)",
+        "CREATE INDEX IF NOT EXISTS idx_pagos_pedido ON pagos(id_pedido)",
+        "CREATE INDEX IF NOT EXISTS idx_pagos_fecha ON pagos(fecha_pago)",
+        "CREATE INDEX IF NOT EXISTS idx_facturas_pedido ON facturas(id_pedido)",
+        "CREATE INDEX IF NOT EXISTS idx_colores_paleta ON colores(id_paleta)",
+        "CREATE INDEX IF NOT EXISTS idx_combinaciones_fecha ON combinaciones(fecha_creacion)",
+    ]),
+    (2, 'Índices únicos donde el código ya asume unicidad', [
+        _deduplicar_colores,
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_colores_hex ON colores(codigo_hex)",
+        _renombrar_combinaciones_repetidas,
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_combinaciones_nombre ON combinaciones(nombre_guardado)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_inventario_material ON inventario_materiales(id_material)",
+    ]),
+    (3, 'Libro de pagos: total_pagado, saldo y estado_pago en pedidos', [
+        "ALTER TABLE pedidos ADD COLUMN total_pagado REAL NOT NULL DEFAULT 0",
+        "ALTER TABLE pedidos ADD COLUMN saldo REAL NOT NULL DEFAULT 0",
+        "ALTER TABLE pedidos ADD COLUMN estado_pago TEXT NOT NULL DEFAULT 'pendiente'",
+        # Los pagos mantienen total_pagado; los pedidos derivan saldo y estado_pago
+        """CREATE TRIGGER IF NOT EXISTS trg_pagos_insertar AFTER INSERT ON pagos BEGIN
+            UPDATE pedidos SET total_pagado = ROUND(total_pagado + NEW.monto, 2)
+            WHERE id_pedido = NEW.id_pedido;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_pagos_eliminar AFTER DELETE ON pagos BEGIN
+            UPDATE pedidos SET total_pagado = ROUND(total_pagado - OLD.monto, 2)
+            WHERE id_pedido = OLD.id_pedido;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_pagos_actualizar AFTER UPDATE OF monto, id_pedido ON pagos BEGIN
+            UPDATE pedidos SET total_pagado = ROUND(total_pagado - OLD.monto, 2)
+            WHERE id_pedido = OLD.id_pedido;
+            UPDATE pedidos SET total_pagado = ROUND(total_pagado + NEW.monto, 2)
+            WHERE id_pedido = NEW.id_pedido;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_pedidos_saldo_insertar AFTER INSERT ON pedidos BEGIN
+            {_DERIVAR_SALDO}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_pedidos_saldo AFTER UPDATE OF total, total_pagado ON pedidos BEGIN
+            {_DERIVAR_SALDO}
+        END""",
+        # Carga inicial desde los pagos existentes (dispara trg_pedidos_saldo)
+        """UPDATE pedidos SET total_pagado = ROUND(COALESCE(
+            (SELECT SUM(monto) FROM pagos WHERE pagos.id_pedido = pedidos.id_pedido), 0), 2)""",
+        "CREATE INDEX IF NOT EXISTS idx_pedidos_estado_pago ON pedidos(estado_pago, estado)",
+    ]),
+    (4, 'Tablas de resumen del dashboard mantenidas por triggers', [
+        """CREATE TABLE IF NOT EXISTS resumen_estado (
+            estado TEXT PRIMARY KEY,
+            pedidos INTEGER NOT NULL DEFAULT 0,
+            monto REAL NOT NULL DEFAULT 0
+        )""",
+        """CREATE TABLE IF NOT EXISTS resumen_diario (
+            fecha TEXT PRIMARY KEY,
+            pedidos INTEGER NOT NULL DEFAULT 0,
+            ventas REAL NOT NULL DEFAULT 0
+        )""",
+        """CREATE TABLE IF NOT EXISTS resumen_mensual (
+            mes TEXT PRIMARY KEY,
+            pedidos INTEGER NOT NULL DEFAULT 0,
+            ventas REAL NOT NULL DEFAULT 0
+        )""",
+        """CREATE TABLE IF NOT EXISTS resumen_cliente (
+            id_cliente INTEGER PRIMARY KEY,
+            pedidos INTEGER NOT NULL DEFAULT 0
+        )""",
+        """CREATE TABLE IF NOT EXISTS resumen_producto (
+            id_producto INTEGER PRIMARY KEY,
+            unidades INTEGER NOT NULL DEFAULT 0
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_resumen_producto_unidades ON resumen_producto(unidades)",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_resumen_pedido_insertar AFTER INSERT ON pedidos BEGIN
+            {_sql_resumen_pedido('NEW', 1)}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_resumen_pedido_eliminar AFTER DELETE ON pedidos BEGIN
+            {_sql_resumen_pedido('OLD', -1)}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_resumen_pedido_actualizar
+            AFTER UPDATE OF estado, total, fecha_pedido, id_cliente ON pedidos BEGIN
+            {_sql_resumen_pedido('OLD', -1)}
+            {_sql_resumen_pedido('NEW', 1)}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_resumen_detalle_insertar AFTER INSERT ON detalle_pedido BEGIN
+            {_sql_resumen_detalle('NEW', 1)}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_resumen_detalle_eliminar AFTER DELETE ON detalle_pedido BEGIN
+            {_sql_resumen_detalle('OLD', -1)}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_resumen_detalle_actualizar
+            AFTER UPDATE OF cantidad, id_producto, id_pedido ON detalle_pedido BEGIN
+            {_sql_resumen_detalle('OLD', -1)}
+            {_sql_resumen_detalle('NEW', 1)}
+        END""",
+        reconstruir_resumenes,
+    ]),
+    (5, 'Índice de búsqueda de texto completo (FTS5)', [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS busqueda USING fts5(
+            tipo UNINDEXED,
+            id_ref UNINDEXED,
+            titulo,
+            contenido,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )""",
+        *_triggers_busqueda(),
+        reconstruir_busqueda,
+    ]),
+    (6, 'Contador de cambios de modelos, paletas y colores', [
+        """CREATE TABLE IF NOT EXISTS versiones_datos (
+            nombre TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )""",
+        "INSERT OR IGNORE INTO versiones_datos (nombre, version) VALUES ('referencia', 0)",
+        *_triggers_versiones(),
+    ]),
+    (7, 'Tabla de precios por modelo con escalas por volumen', [
+        """CREATE TABLE IF NOT EXISTS precios_modelo (
+            id_modelo INTEGER NOT NULL REFERENCES modelos_bolsas(id_modelo) ON DELETE CASCADE,
+            cantidad_minima INTEGER NOT NULL DEFAULT 1 CHECK (cantidad_minima >= 1),
+            precio_unitario REAL NOT NULL CHECK (precio_unitario >= 0),
+            PRIMARY KEY (id_modelo, cantidad_minima)
+        ) WITHOUT ROWID""",
+        # Precio base de siempre según el tipo del modelo
+        """INSERT OR IGNORE INTO precios_modelo (id_modelo, cantidad_minima, precio_unitario)
+            SELECT id_modelo, 1,
+                   CASE tipo WHEN 'combinado' THEN 220.0 WHEN 'especial' THEN 250.0 ELSE 180.0 END
+            FROM modelos_bolsas""",
+        *_triggers_versiones(('precios_modelo',)),
+    ]),
+    (8, 'Huella de contenido en pedidos y cotizaciones', [
+        "ALTER TABLE pedidos ADD COLUMN huella TEXT",
+        "ALTER TABLE cotizaciones ADD COLUMN huella TEXT",
+        *_triggers_huella('pedidos', 'detalle_pedido', 'id_producto', 'id_pedido'),
+        *_triggers_huella('cotizaciones', 'detalle_cotizacion', 'id_material', 'id_cotizacion'),
+        _sql_huella('pedidos', 'detalle_pedido', 'id_producto', 'id_pedido', 'pedidos.id_pedido'),
+        _sql_huella('cotizaciones', 'detalle_cotizacion', 'id_material', 'id_cotizacion',
+                    'cotizaciones.id_cotizacion'),
+        "CREATE INDEX IF NOT EXISTS idx_pedidos_huella ON pedidos(id_cliente, huella)",
+        "CREATE INDEX IF NOT EXISTS idx_cotizaciones_huella ON cotizaciones(id_cliente, huella)",
+    ]),
+    (9, 'Kardex de inventario: movimientos y cortes de saldos', [
+        _sql_tabla_movimientos(),
+        *_INDICES_KARDEX,
+        *_TRIGGERS_KARDEX,
+        """CREATE TABLE IF NOT EXISTS cortes_inventario (
+            fecha_corte TEXT NOT NULL,
+            id_material INTEGER NOT NULL,
+            cantidad REAL NOT NULL,
+            id_movimiento INTEGER NOT NULL,
+            PRIMARY KEY (fecha_corte, id_material)
+        ) WITHOUT ROWID""",
+        # Saldo inicial: el stock existente entra al kardex como un ajuste
+        """INSERT INTO movimientos_inventario (id_material, tipo, cantidad, saldo, nota)
+            SELECT id_material, 'ajuste', cantidad, cantidad, 'Saldo inicial'
+            FROM inventario_materiales
+            WHERE id_material IS NOT NULL
+            ORDER BY id_material""",
+    ]),
+    (10, 'Lista de materiales por modelo de bolsa', [
+        # region: '' (general) o la parte de la bolsa cuyo color define la combinación
+        """CREATE TABLE IF NOT EXISTS lista_materiales (
+            id_modelo INTEGER NOT NULL,
+            region TEXT NOT NULL DEFAULT ''
+                CHECK (region IN ('', 'principal', 'secundario', 'hilo', 'asa')),
+            id_material INTEGER NOT NULL,
+            cantidad REAL NOT NULL CHECK (cantidad > 0),
+            PRIMARY KEY (id_modelo, region, id_material),
+            FOREIGN KEY (id_modelo) REFERENCES modelos_bolsas(id_modelo),
+            FOREIGN KEY (id_material) REFERENCES materiales(id_material)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_lista_materiales_material ON lista_materiales(id_material)",
+    ]),
+    (11, 'Reservas de inventario para pedidos y cotizaciones', [
+        """CREATE TABLE IF NOT EXISTS reservas_inventario (
+            id_reserva INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_material INTEGER NOT NULL,
+            cantidad REAL NOT NULL CHECK (cantidad > 0),
+            referencia_tipo TEXT NOT NULL CHECK (referencia_tipo IN ('pedido', 'cotizacion')),
+            id_referencia INTEGER NOT NULL,
+            fecha TEXT NOT NULL DEFAULT (datetime('now')),
+            expira TEXT NOT NULL,
+            FOREIGN KEY (id_material) REFERENCES materiales(id_material)
+        )""",
+        # Suma de reservas vigentes por material: rango sobre (id_material, expira)
+        "CREATE INDEX IF NOT EXISTS idx_reservas_material ON reservas_inventario(id_material, expira)",
+        "CREATE INDEX IF NOT EXISTS idx_reservas_referencia "
+        "ON reservas_inventario(referencia_tipo, id_referencia)",
+    ]),
+    (12, 'Stock mínimo por material y alertas mantenidas por triggers', [
+        # 100 era el umbral global que usaba la página de inventario
+        "ALTER TABLE materiales ADD COLUMN stock_minimo REAL NOT NULL DEFAULT 100",
+        """CREATE TABLE IF NOT EXISTS alertas_stock (
+            id_material INTEGER PRIMARY KEY,
+            cantidad REAL,
+            stock_minimo REAL NOT NULL,
+            activa INTEGER NOT NULL DEFAULT 1,
+            desde TEXT NOT NULL,
+            version INTEGER NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_alertas_activas ON alertas_stock(activa, cantidad)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_alertas_version ON alertas_stock(version)",
+        *_TRIGGERS_ALERTAS,
+        # Estado inicial: una alerta por material que ya está por debajo del mínimo
+        """INSERT INTO alertas_stock (id_material, cantidad, stock_minimo, activa, desde, version)
+            SELECT i.id_material, i.cantidad, m.stock_minimo, 1, datetime('now','localtime'),
+                   ROW_NUMBER() OVER (ORDER BY i.id_material)
+            FROM inventario_materiales i
+            JOIN materiales m ON m.id_material = i.id_material
+            WHERE i.cantidad < m.stock_minimo""",
+    ]),
+    (13, 'Contador de cambios para la caché de costos de producción', [
+        "INSERT OR IGNORE INTO versiones_datos (nombre, version) VALUES ('costos', 0)",
+        *_triggers_versiones(TABLAS_COSTOS, nombre='costos'),
+        "CREATE INDEX IF NOT EXISTS idx_productos_terminados_modelo ON productos_terminados(id_modelo)",
+    ]),
+    (14, 'Trabajos en segundo plano y contadores de los datos que exportan', [
+        """CREATE TABLE IF NOT EXISTS trabajos (
+            id_trabajo TEXT PRIMARY KEY,
+            tipo TEXT NOT NULL,
+            parametros TEXT NOT NULL DEFAULT '{}',
+            clave TEXT NOT NULL,
+            huella TEXT NOT NULL,
+            estado TEXT NOT NULL DEFAULT 'pendiente'
+                CHECK (estado IN ('pendiente', 'en_proceso', 'terminado', 'error')),
+            progreso REAL NOT NULL DEFAULT 0,
+            ruta_resultado TEXT,
+            nombre_archivo TEXT,
+            error TEXT,
+            fecha_creacion TEXT DEFAULT (datetime('now','localtime')),
+            fecha_fin TEXT
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_trabajos_huella ON trabajos(huella, estado)",
+        "CREATE INDEX IF NOT EXISTS idx_trabajos_clave ON trabajos(clave)",
+        *[f"INSERT OR IGNORE INTO versiones_datos (nombre, version) VALUES ('{nombre}', 0)"
+          for nombre in TABLAS_EXPORTACION],
+        *[trigger for nombre, tablas in TABLAS_EXPORTACION.items()
+          for trigger in _triggers_versiones(tablas, nombre=nombre)],
+    ]),
+    (15, 'Facturas emitidas: una vigente por pedido y folio único', [
+        """CREATE UNIQUE INDEX IF NOT EXISTS ux_facturas_pedido_emitida
+            ON facturas(id_pedido) WHERE estado = 'emitida'""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_facturas_folio ON facturas(folio)",
+        # El trabajo de factura entrega el PDF emitido: emitir o regenerar cambia su huella
+        *_triggers_versiones(('facturas',), nombre='pedidos'),
+    ]),
+    (16, 'Huella de contenido con cantidades exactas', [
+        *[f"DROP TRIGGER IF EXISTS trg_huella_{detalle}_{evento}"
+          for detalle in ('detalle_pedido', 'detalle_cotizacion')
+          for evento in ('insertar', 'eliminar', 'actualizar')],
+        *_triggers_huella('pedidos', 'detalle_pedido', 'id_producto', 'id_pedido'),
+        *_triggers_huella('cotizaciones', 'detalle_cotizacion', 'id_material', 'id_cotizacion'),
+        _sql_huella('pedidos', 'detalle_pedido', 'id_producto', 'id_pedido', 'pedidos.id_pedido'),
+        _sql_huella('cotizaciones', 'detalle_cotizacion', 'id_material', 'id_cotizacion',
+                    'cotizaciones.id_cotizacion'),
+    ]),
+    (17, 'Fechas del kardex en hora local, igual que los cortes', [
+        _kardex_en_hora_local,
+    ]),
+    (18, 'Fechas de las alertas de stock en hora local, igual que el kardex', [
+        _alertas_en_hora_local,
+    ]),
+]
+
+
+def _crear_tabla_control(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migraciones (
+            version INTEGER PRIMARY KEY,
+            descripcion TEXT NOT NULL,
+            fecha_aplicacion TEXT DEFAULT (datetime('now','localtime'))
+        )
+    """)
+
+
+def version_actual(conn):
+    """
+    Devuelve la versión de esquema aplicada (0 si no hay migraciones)
+    """
+    cur = conn.cursor()
+    _crear_tabla_control(cur)
+    cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migraciones")
+    return cur.fetchone()[0]
+
+
+def aplicar_migraciones(conn=None, verbose=False):
+    """
+    Aplica en orden las migraciones pendientes, cada una en su propia transacción.
+    Retorna la lista de versiones aplicadas.
+    """
+    propia = conn is None
+    if propia:
+        conn = get_connection()
+    if not conn:
+        return []
+
+    aplicadas = []
+    try:
+        cur = conn.cursor()
+        _crear_tabla_control(cur)
+        conn.commit()
+
+        for version, descripcion, pasos in MIGRACIONES:
+            # BEGIN IMMEDIATE: si varios procesos arrancan a la vez, solo uno migra
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                cur.execute("SELECT 1 FROM schema_migraciones WHERE version = ?", (version,))
+                if cur.fetchone():
+                    conn.rollback()
+                    continue
+
+                for paso in pasos:
+                    if callable(paso):
+                        paso(cur)
+                    else:
+                        cur.execute(paso)
+
+                cur.execute("""
+                    INSERT INTO schema_migraciones (version, descripcion)
+                    VALUES (?, ?)
+                """, (version, descripcion))
+                conn.commit()
+                aplicadas.append(version)
+                if verbose:
+                    print(f"  ✅ Migración {version}: {descripcion}")
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+
+        return aplicadas
+
+    finally:
+        if propia:
+            conn.close()
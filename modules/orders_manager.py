@@ -1,9 +1,17 @@
 """
 Módulo para gestión de pedidos y reportes
 """
-from db_connection import get_connection
+from db_connection import get_connection, get_read_connection
+from modules.migraciones import reconstruir_resumenes
+from modules.pricing_manager import PricingManager
 from datetime import datetime
 
+def _pedidos_por_estado_vacio():
+    return {
+        'por_entregar': [], 'entregados': [], 'vencidos': [], 'todos': [],
+        'conteos': {'por_entregar': 0, 'entregados': 0, 'vencidos': 0, 'todos': 0}
+    }
+
 class OrdersManager:
     """Gestiona pedidos de productos"""
     
@@ -19,30 +27,15 @@ class OrdersManager:
         try:
             cur = conn.cursor()
             
-            # Obtener información de la combinación
-            cur.execute("""
-                SELECT c.nombre_guardado, mb.tipo
-                FROM combinaciones c
-                JOIN modelos_bolsas mb ON c.id_modelo = mb.id_modelo
-                WHERE c.id_combinacion = ?
-            """, (id_combinacion,))
-            
-            combinacion = cur.fetchone()
-            if not combinacion:
+            # Precio según el modelo de la combinación y la cantidad
+            linea = PricingManager.cotizar_lineas(
+                [{'id_combinacion': id_combinacion, 'cantidad': cantidad}], conn
+            )[0]
+            if linea['id_modelo'] is None:
                 return {'success': False, 'error': 'Combinación no encontrada'}
             
-            # Calcular precio según tipo de modelo
-            tipo_modelo = combinacion[1]
-            if tipo_modelo == 'simple':
-                precio_unitario = 180.0
-            elif tipo_modelo == 'combinado':
-                precio_unitario = 220.0
-            elif tipo_modelo == 'especial':
-                precio_unitario = 250.0
-            else:
-                precio_unitario = 180.0
-            
-            subtotal = precio_unitario * cantidad
+            precio_unitario = linea['precio_unitario']
+            subtotal = linea['subtotal']
             
             # Obtener fecha actual
             fecha_actual = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -75,9 +68,11 @@ class OrdersManager:
             return {'success': False, 'error': str(e)}
     
     @staticmethod
-    def obtener_pedidos():
+    def obtener_pedidos(limite=None, despues=None):
         """
-        Obtiene todos los pedidos con información completa
+        Obtiene los pedidos con información completa, del más reciente al más antiguo.
+        Con limite/despues (id_pedido del último pedido de la página anterior)
+        entrega una página por clave; limite cuenta pedidos, no líneas de detalle.
         """
         conn = get_connection()
         if not conn:
@@ -86,7 +81,10 @@ class OrdersManager:
         try:
             cur = conn.cursor()
             
-            cur.execute("""
+            filtro = "WHERE id_pedido < ?" if despues is not None else ""
+            parametros = ([despues] if despues is not None else []) + [limite or -1]
+            
+            cur.execute(f"""
                 SELECT p.id_pedido, 
                        COALESCE(c.nombre_cliente, 'Cliente Eliminado'),
                        COALESCE(comb.nombre_guardado, 'Producto sin nombre'),
@@ -95,12 +93,16 @@ class OrdersManager:
                        p.estado,
                        p.total,
                        dp.cantidad
-                FROM pedidos p
+                FROM (
+                    SELECT * FROM pedidos {filtro}
+                    ORDER BY id_pedido DESC
+                    LIMIT ?
+                ) p
                 LEFT JOIN clientes c ON p.id_cliente = c.id_cliente
                 LEFT JOIN detalle_pedido dp ON p.id_pedido = dp.id_pedido
                 LEFT JOIN combinaciones comb ON dp.id_producto = comb.id_combinacion
                 ORDER BY p.id_pedido DESC
-            """)
+            """, parametros)
             
             pedidos = []
             for row in cur.fetchall():
@@ -137,7 +139,8 @@ class OrdersManager:
             cur = conn.cursor()
             
             cur.execute("""
-                SELECT p.*, 
+                SELECT p.id_pedido, p.id_cliente, p.fecha_pedido, p.fecha_entrega,
+                       p.estado, p.total,
                        COALESCE(c.nombre_cliente, 'Cliente Eliminado'), 
                        COALESCE(comb.nombre_guardado, 'Producto sin nombre'), 
                        dp.cantidad
@@ -240,135 +243,141 @@ class OrdersManager:
             return {'success': False, 'error': str(e)}
     
     @staticmethod
-    def obtener_pedidos_por_estado():
+    def obtener_pedidos_por_estado(limite=None, despues=None, limite_grupo=5):
         """
-        Obtiene pedidos categorizados por estado para reportes
+        Obtiene pedidos categorizados por estado para reportes.
+        Una sola pasada sobre pedidos clasifica cada pedido en su grupo y
+        entrega los primeros `limite_grupo` de cada uno junto con los conteos.
+        limite/despues paginan la lista 'todos' por id_pedido descendente.
         """
-        conn = get_connection()
+        conn = get_read_connection()
         if not conn:
-            return {'por_entregar': [], 'entregados': [], 'vencidos': [], 'todos': []}
+            return _pedidos_por_estado_vacio()
         
         try:
             cur = conn.cursor()
             fecha_actual = datetime.now().strftime('%Y-%m-%d')
             
-            # Pedidos POR ENTREGAR (pendientes, en proceso, finalizados - NO entregados ni cancelados)
-            # Y que su fecha de entrega sea hoy o futura
-            cur.execute("""
-                SELECT p.id_pedido, 
-                       COALESCE(c.nombre_cliente, 'Cliente Eliminado'), 
-                       COALESCE(comb.nombre_guardado, 'Producto sin nombre'),
-                       p.fecha_pedido, 
-                       p.fecha_entrega, 
-                       p.estado, 
-                       p.total
-                FROM pedidos p
-                LEFT JOIN clientes c ON p.id_cliente = c.id_cliente
-                LEFT JOIN detalle_pedido dp ON p.id_pedido = dp.id_pedido
-                LEFT JOIN combinaciones comb ON dp.id_producto = comb.id_combinacion
-                WHERE p.estado IN ('pendiente', 'en_proceso', 'finalizado')
-                AND p.fecha_entrega >= ?
-                GROUP BY p.id_pedido
-                ORDER BY p.fecha_entrega ASC
-            """, (fecha_actual,))
-            por_entregar = cur.fetchall()
-            
-            # Pedidos ENTREGADOS
-            cur.execute("""
-                SELECT p.id_pedido, 
-                       COALESCE(c.nombre_cliente, 'Cliente Eliminado'), 
-                       COALESCE(comb.nombre_guardado, 'Producto sin nombre'),
-                       p.fecha_pedido, 
-                       p.fecha_entrega, 
-                       p.estado, 
-                       p.total
-                FROM pedidos p
-                LEFT JOIN clientes c ON p.id_cliente = c.id_cliente
-                LEFT JOIN detalle_pedido dp ON p.id_pedido = dp.id_pedido
-                LEFT JOIN combinaciones comb ON dp.id_producto = comb.id_combinacion
-                WHERE p.estado = 'entregado'
-                GROUP BY p.id_pedido
-                ORDER BY p.fecha_entrega DESC
-            """)
-            entregados = cur.fetchall()
-            
-            # Pedidos VENCIDOS (fecha pasada y NO entregados ni cancelados)
-            cur.execute("""
-                SELECT p.id_pedido, 
-                       COALESCE(c.nombre_cliente, 'Cliente Eliminado'), 
-                       COALESCE(comb.nombre_guardado, 'Producto sin nombre'),
-                       p.fecha_pedido, 
-                       p.fecha_entrega, 
-                       p.estado, 
-                       p.total
-                FROM pedidos p
-                LEFT JOIN clientes c ON p.id_cliente = c.id_cliente
-                LEFT JOIN detalle_pedido dp ON p.id_pedido = dp.id_pedido
-                LEFT JOIN combinaciones comb ON dp.id_producto = comb.id_combinacion
-                WHERE p.fecha_entrega < ?
-                AND p.estado NOT IN ('entregado', 'cancelado')
-                GROUP BY p.id_pedido
-                ORDER BY p.fecha_entrega ASC
-            """, (fecha_actual,))
-            vencidos = cur.fetchall()
-            
-            # TODOS los pedidos
+            # POR ENTREGAR: pendientes, en proceso o finalizados con entrega hoy o futura
+            # ENTREGADOS: estado entregado
+            # VENCIDOS: fecha de entrega pasada y NO entregados ni cancelados
             cur.execute("""
+                WITH clasificados AS (
+                    SELECT id_pedido, id_cliente, fecha_pedido, fecha_entrega, estado, total,
+                           CASE
+                               WHEN estado = 'entregado' THEN 'entregados'
+                               WHEN estado IN ('pendiente', 'en_proceso', 'finalizado')
+                                    AND fecha_entrega >= :hoy THEN 'por_entregar'
+                               WHEN estado NOT IN ('entregado', 'cancelado')
+                                    AND fecha_entrega < :hoy THEN 'vencidos'
+                           END AS grupo
+                    FROM pedidos
+                ),
+                numerados AS (
+                    SELECT *,
+                           ROW_NUMBER() OVER (
+                               PARTITION BY grupo
+                               ORDER BY CASE WHEN grupo = 'entregados' THEN NULL ELSE fecha_entrega END ASC,
+                                        CASE WHEN grupo = 'entregados' THEN fecha_entrega END DESC,
+                                        id_pedido
+                           ) AS posicion,
+                           COUNT(*) OVER (PARTITION BY grupo) AS en_grupo,
+                           COUNT(*) OVER () AS en_total
+                    FROM clasificados
+                )
+                SELECT n.id_pedido,
+                       COALESCE(c.nombre_cliente, 'Cliente Eliminado'),
+                       COALESCE((
+                           SELECT comb.nombre_guardado
+                           FROM detalle_pedido dp
+                           JOIN combinaciones comb ON dp.id_producto = comb.id_combinacion
+                           WHERE dp.id_pedido = n.id_pedido
+                           ORDER BY dp.id_detalle
+                           LIMIT 1
+                       ), 'Producto sin nombre'),
+                       n.fecha_pedido,
+                       n.fecha_entrega,
+                       n.estado,
+                       n.total,
+                       n.grupo,
+                       n.en_grupo,
+                       n.en_total
+                FROM numerados n
+                LEFT JOIN clientes c ON n.id_cliente = c.id_cliente
+                -- Una fila de los pedidos sin grupo basta para conocer el total
+                WHERE n.posicion <= :limite_grupo OR n.grupo IS NULL AND n.posicion = 1
+                ORDER BY n.grupo, n.posicion
+            """, {'hoy': fecha_actual, 'limite_grupo': limite_grupo})
+            
+            resultado = _pedidos_por_estado_vacio()
+            for row in cur.fetchall():
+                resultado['conteos']['todos'] = row[9]
+                if row[7] is None:
+                    continue
+                resultado[row[7]].append(tuple(row[:7]))
+                resultado['conteos'][row[7]] = row[8]
+            
+            # TODOS los pedidos (página por clave)
+            cur.execute(f"""
                 SELECT p.id_pedido, 
                        COALESCE(c.nombre_cliente, 'Cliente Eliminado'), 
-                       COALESCE(comb.nombre_guardado, 'Producto sin nombre'),
+                       COALESCE((
+                           SELECT comb.nombre_guardado
+                           FROM detalle_pedido dp
+                           JOIN combinaciones comb ON dp.id_producto = comb.id_combinacion
+                           WHERE dp.id_pedido = p.id_pedido
+                           ORDER BY dp.id_detalle
+                           LIMIT 1
+                       ), 'Producto sin nombre'),
                        p.fecha_pedido, 
                        p.fecha_entrega, 
                        p.estado, 
                        p.total
-                FROM pedidos p
+                FROM (
+                    SELECT * FROM pedidos
+                    {'WHERE id_pedido < ?' if despues is not None else ''}
+                    ORDER BY id_pedido DESC
+                    LIMIT ?
+                ) p
                 LEFT JOIN clientes c ON p.id_cliente = c.id_cliente
-                LEFT JOIN detalle_pedido dp ON p.id_pedido = dp.id_pedido
-                LEFT JOIN combinaciones comb ON dp.id_producto = comb.id_combinacion
-                GROUP BY p.id_pedido
                 ORDER BY p.id_pedido DESC
-            """)
-            todos = cur.fetchall()
+            """, ([despues] if despues is not None else []) + [limite or -1])
+            resultado['todos'] = [tuple(row) for row in cur.fetchall()]
             
             cur.close()
             conn.close()
             
-            print(f"📊 REPORTES - Por entregar: {len(por_entregar)}, Entregados: {len(entregados)}, Vencidos: {len(vencidos)}, Todos: {len(todos)}")
+            conteos = resultado['conteos']
+            print(f"📊 REPORTES - Por entregar: {conteos['por_entregar']}, Entregados: {conteos['entregados']}, Vencidos: {conteos['vencidos']}, Todos: {conteos['todos']}")
             
-            return {
-                'por_entregar': por_entregar,
-                'entregados': entregados,
-                'vencidos': vencidos,
-                'todos': todos
-            }
+            return resultado
         
         except Exception as e:
             print(f"❌ Error obteniendo pedidos por estado: {e}")
             import traceback
             traceback.print_exc()
-            return {'por_entregar': [], 'entregados': [], 'vencidos': [], 'todos': []}
+            return _pedidos_por_estado_vacio()
     
     @staticmethod
     def obtener_estadisticas_dashboard():
         """
         Obtiene estadísticas para el dashboard de reportes
         """
-        conn = get_connection()
+        conn = get_read_connection()
         if not conn:
             return None
         
         try:
             cur = conn.cursor()
             
-            # Total de pedidos (sin incluir cancelados)
-            cur.execute("SELECT COUNT(*) FROM pedidos WHERE estado != 'cancelado'")
-            total_pedidos = cur.fetchone()[0] or 0
+            # Las cifras salen de las tablas de resumen (migración 4), que los
+            # triggers mantienen al crear, modificar o eliminar pedidos
             
             # Pedidos por estado
             cur.execute("""
-                SELECT estado, COUNT(*) as cantidad, SUM(total) as monto_total
-                FROM pedidos
-                GROUP BY estado
+                SELECT estado, pedidos, monto
+                FROM resumen_estado
+                WHERE pedidos > 0
             """)
             por_estado = {}
             for row in cur.fetchall():
@@ -377,41 +386,38 @@ class OrdersManager:
                     'monto': row[2] or 0
                 }
             
+            # Total de pedidos (sin incluir cancelados)
+            total_pedidos = sum(
+                datos['cantidad'] for estado, datos in por_estado.items()
+                if estado != 'cancelado'
+            )
+            
             # Ingresos totales (solo entregados)
-            cur.execute("SELECT COALESCE(SUM(total), 0) FROM pedidos WHERE estado = 'entregado'")
-            ingresos_totales = cur.fetchone()[0] or 0
+            ingresos_totales = por_estado.get('entregado', {}).get('monto', 0)
             
             # Pedidos del mes actual
             cur.execute("""
-                SELECT COUNT(*), COALESCE(SUM(total), 0)
-                FROM pedidos
-                WHERE strftime('%Y-%m', fecha_pedido) = strftime('%Y-%m', 'now')
-                AND estado != 'cancelado'
+                SELECT pedidos, ventas
+                FROM resumen_mensual
+                WHERE mes = strftime('%Y-%m', 'now')
             """)
             mes_actual = cur.fetchone()
-            pedidos_mes = mes_actual[0] or 0
-            ingresos_mes = mes_actual[1] or 0
+            pedidos_mes = mes_actual[0] if mes_actual else 0
+            ingresos_mes = mes_actual[1] if mes_actual else 0
             
             # Clientes activos (que tienen al menos un pedido)
-            cur.execute("""
-                SELECT COUNT(DISTINCT id_cliente) 
-                FROM pedidos 
-                WHERE estado != 'cancelado'
-            """)
+            cur.execute("SELECT COUNT(*) FROM resumen_cliente WHERE pedidos > 0")
             clientes_activos = cur.fetchone()[0] or 0
             
             # Productos más vendidos
             cur.execute("""
                 SELECT 
                     COALESCE(comb.nombre_guardado, 'Diseño sin nombre') as nombre,
-                    SUM(dp.cantidad) as total_vendido
-                FROM detalle_pedido dp
-                LEFT JOIN pedidos p ON dp.id_pedido = p.id_pedido
-                LEFT JOIN combinaciones comb ON dp.id_producto = comb.id_combinacion
-                WHERE p.estado != 'cancelado'
-                GROUP BY dp.id_producto
-                HAVING total_vendido > 0
-                ORDER BY total_vendido DESC
+                    rp.unidades as total_vendido
+                FROM resumen_producto rp
+                LEFT JOIN combinaciones comb ON rp.id_producto = comb.id_combinacion
+                WHERE rp.unidades > 0
+                ORDER BY rp.unidades DESC
                 LIMIT 5
             """)
             productos_top = [tuple(row) for row in cur.fetchall()]
@@ -419,13 +425,13 @@ class OrdersManager:
             # Ventas por mes (últimos 6 meses)
             cur.execute("""
                 SELECT 
-                    strftime('%Y-%m', fecha_pedido) as mes,
-                    COUNT(*) as pedidos,
-                    COALESCE(SUM(total), 0) as ventas
-                FROM pedidos
-                WHERE fecha_pedido >= date('now', '-6 months')
-                AND estado != 'cancelado'
+                    substr(fecha, 1, 7) as mes,
+                    SUM(pedidos) as pedidos,
+                    ROUND(SUM(ventas), 2) as ventas
+                FROM resumen_diario
+                WHERE fecha >= date('now', '-6 months')
                 GROUP BY mes
+                HAVING SUM(pedidos) > 0
                 ORDER BY mes ASC
             """)
             ventas_mensuales = [tuple(row) for row in cur.fetchall()]
@@ -459,4 +465,33 @@ class OrdersManager:
                 'clientes_activos': 0,
                 'productos_top': [],
                 'ventas_mensuales': []
-            }
\ No newline at end of file
+            }
+
+    @staticmethod
+    def reconstruir_resumenes():
+        """
+        Recalcula desde cero las tablas de resumen del dashboard
+        """
+        conn = get_connection()
+        if not conn:
+            return {'success': False, 'error': 'Error de conexión a BD'}
+        
+        try:
+            cur = conn.cursor()
+            reconstruir_resumenes(cur)
+            
+            cur.execute("SELECT COALESCE(SUM(pedidos), 0) FROM resumen_estado")
+            pedidos = cur.fetchone()[0]
+            
+            conn.commit()
+            cur.close()
+            conn.close()
+            
+            return {'success': True, 'pedidos': pedidos}
+        
+        except Exception as e:
+            print(f"Error reconstruyendo resúmenes: {e}")
+            if conn:
+                conn.rollback()
+                conn.close()
+            return {'success': False, 'error': str(e)}
@@ -0,0 +1,65 @@
+"""
+Paginación por clave (keyset / seek) para listados y sus APIs
+El cursor es opaco para el cliente: codifica la clave de orden del último
+registro de la página y la consulta siguiente continúa desde ahí con un
+WHERE sobre índice, sin OFFSET.
+"""
+import base64
+import json
+
+TAMANO_PAGINA = 25
+TAMANO_MAXIMO = 100
+
+
+def limitar_tamano(valor, defecto=TAMANO_PAGINA):
+    """
+    Tamaño de página solicitado, acotado a [1, TAMANO_MAXIMO]
+    """
+    try:
+        tamano = int(valor) if valor not in (None, '') else defecto
+    except (TypeError, ValueError):
+        tamano = defecto
+    return max(1, min(tamano, TAMANO_MAXIMO))
+
+
+def codificar_cursor(clave):
+    texto = json.dumps(list(clave), separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor, longitud):
+    """
+    Retorna la clave (tupla de `longitud` valores) o None si el cursor
+    está vacío o no es válido (se empieza desde la primera página)
+    """
+    if not cursor:
+        return None
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        clave = json.loads(base64.urlsafe_b64decode(cursor + relleno).decode('utf-8'))
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(clave, list) or len(clave) != longitud:
+        return None
+    # Solo valores que SQLite pueda enlazar; un [[1]] o [{}] se ignora
+    if not all(isinstance(valor, (int, float, str)) for valor in clave):
+        return None
+    return tuple(clave)
+
+
+def paginar(filas, tamano, clave):
+    """
+    Arma la página a partir de filas consultadas con limite=tamano + 1.
+    Los registros se cuentan por clave distinta (un pedido con varias líneas
+    de detalle es un solo registro). Retorna {'items', 'siguiente'}.
+    """
+    claves = []
+    items = []
+    for fila in filas:
+        k = tuple(clave(fila))
+        if not claves or claves[-1] != k:
+            if len(claves) == tamano:
+                return {'items': items, 'siguiente': codificar_cursor(claves[-1])}
+            claves.append(k)
+        items.append(fila)
+    return {'items': items, 'siguiente': None}
@@ -0,0 +1,250 @@
+"""
+Módulo para gestión de pagos y saldos de pedidos
+Los totales por pedido (total_pagado, saldo, estado_pago) los mantienen
+los triggers de la migración 3 al insertar, modificar o borrar pagos.
+"""
+from db_connection import get_connection
+
+# Diferencia máxima aceptada entre el libro y la suma de pagos (centavos)
+TOLERANCIA = 0.005
+
+
+def calcular_estado_pago(total, total_pagado):
+    """
+    Mismo criterio que el trigger trg_pedidos_saldo: retorna (saldo, estado_pago)
+    """
+    total = total or 0
+    saldo = max(0, round(total - total_pagado, 2))
+    if total_pagado >= total:
+        return saldo, 'pagado'
+    if total_pagado > 0:
+        return saldo, 'parcial'
+    return saldo, 'pendiente'
+
+
+class PaymentsManager:
+    """Gestiona pagos y cuentas por cobrar"""
+
+    @staticmethod
+    def registrar_pago(id_pedido, monto, metodo):
+        """
+        Registra un pago sin exceder el saldo del pedido
+        """
+        conn = get_connection()
+        if not conn:
+            return {'success': False, 'error': 'Error de conexión a BD'}
+
+        try:
+            cur = conn.cursor()
+
+            cur.execute("SELECT saldo FROM pedidos WHERE id_pedido = ?", (id_pedido,))
+            row = cur.fetchone()
+            if not row:
+                cur.close()
+                conn.close()
+                return {'success': False, 'error': 'Pedido no encontrado'}
+
+            # Validar que el monto no exceda lo que falta
+            monto = min(monto, row[0])
+
+            cur.execute("""
+                INSERT INTO pagos (id_pedido, monto, metodo)
+                VALUES (?, ?, ?)
+            """, (id_pedido, monto, metodo))
+            id_pago = cur.lastrowid
+
+            conn.commit()
+            cur.close()
+            conn.close()
+
+            return {'success': True, 'id_pago': id_pago, 'monto': monto}
+
+        except Exception as e:
+            print(f"Error registrando pago: {e}")
+            if conn:
+                conn.rollback()
+                conn.close()
+            return {'success': False, 'error': str(e)}
+
+    @staticmethod
+    def obtener_cuentas_por_cobrar():
+        """
+        Pedidos finalizados o entregados con su estado de pago
+        """
+        conn = get_connection()
+        if not conn:
+            return []
+
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT p.id_pedido, c.nombre_cliente, p.total,
+                       p.total_pagado, p.saldo, p.estado_pago
+                FROM pedidos p
+                JOIN clientes c ON p.id_cliente = c.id_cliente
+                WHERE p.estado IN ('finalizado', 'entregado')
+                ORDER BY p.fecha_pedido DESC
+            """)
+
+            cuentas = [{
+                'id_pedido': row[0],
+                'nombre_cliente': row[1],
+                'total': row[2],
+                'total_pagado': row[3],
+                'falta_pagar': row[4],
+                'estado': row[5]
+            } for row in cur.fetchall()]
+
+            cur.close()
+            conn.close()
+            return cuentas
+
+        except Exception as e:
+            print(f"Error obteniendo cuentas por cobrar: {e}")
+            if conn:
+                conn.close()
+            return []
+
+    @staticmethod
+    def obtener_pedidos_facturables():
+        """
+        Pedidos finalizados o entregados completamente pagados, con el folio
+        de su factura si ya se emitió
+        """
+        conn = get_connection()
+        if not conn:
+            return []
+
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT p.id_pedido, c.nombre_cliente, p.total, p.estado, p.fecha_pedido, f.folio
+                FROM pedidos p
+                JOIN clientes c ON p.id_cliente = c.id_cliente
+                LEFT JOIN facturas f ON f.id_pedido = p.id_pedido AND f.estado = 'emitida'
+                WHERE p.estado_pago = 'pagado'
+                AND p.estado IN ('finalizado', 'entregado')
+            """)
+
+            pedidos = [{
+                'id_pedido': row[0],
+                'nombre_cliente': row[1],
+                'total': row[2],
+                'estado': row[3],
+                'fecha_pedido': row[4],
+                'folio': row[5]
+            } for row in cur.fetchall()]
+
+            cur.close()
+            conn.close()
+            return pedidos
+
+        except Exception as e:
+            print(f"Error obteniendo pedidos facturables: {e}")
+            if conn:
+                conn.close()
+            return []
+
+    @staticmethod
+    def obtener_historial(limite=50):
+        """
+        Últimos pagos registrados
+        """
+        conn = get_connection()
+        if not conn:
+            return []
+
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT pg.id_pago, pg.id_pedido, c.nombre_cliente,
+                       pg.monto, pg.metodo, pg.fecha_pago
+                FROM pagos pg
+                JOIN pedidos p ON pg.id_pedido = p.id_pedido
+                JOIN clientes c ON p.id_cliente = c.id_cliente
+                ORDER BY pg.fecha_pago DESC
+                LIMIT ?
+            """, (limite,))
+
+            historial = [{
+                'id_pago': row[0],
+                'id_pedido': row[1],
+                'nombre_cliente': row[2],
+                'monto': row[3],
+                'metodo': row[4],
+                'fecha_pago': row[5]
+            } for row in cur.fetchall()]
+
+            cur.close()
+            conn.close()
+            return historial
+
+        except Exception as e:
+            print(f"Error obteniendo historial de pagos: {e}")
+            if conn:
+                conn.close()
+            return []
+
+    @staticmethod
+    def verificar_saldos(reparar=False):
+        """
+        Compara el libro de pagos de cada pedido con la suma real de sus pagos.
+        Con reparar=True recalcula los pedidos con diferencias.
+        """
+        conn = get_connection()
+        if not conn:
+            return {'success': False, 'error': 'Error de conexión a BD'}
+
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT p.id_pedido, p.total, p.total_pagado, p.saldo, p.estado_pago,
+                       ROUND(COALESCE(s.suma, 0), 2)
+                FROM pedidos p
+                LEFT JOIN (
+                    SELECT id_pedido, SUM(monto) AS suma FROM pagos GROUP BY id_pedido
+                ) s ON s.id_pedido = p.id_pedido
+            """)
+
+            revisados = 0
+            diferencias = []
+            for id_pedido, total, total_pagado, saldo, estado_pago, suma in cur.fetchall():
+                revisados += 1
+                saldo_real, estado_real = calcular_estado_pago(total, suma)
+                if (abs(total_pagado - suma) > TOLERANCIA
+                        or abs(saldo - saldo_real) > TOLERANCIA
+                        or estado_pago != estado_real):
+                    diferencias.append({
+                        'id_pedido': id_pedido,
+                        'total_pagado': total_pagado,
+                        'total_pagado_real': suma,
+                        'saldo': saldo,
+                        'saldo_real': saldo_real,
+                        'estado_pago': estado_pago,
+                        'estado_pago_real': estado_real
+                    })
+
+            if reparar and diferencias:
+                # trg_pedidos_saldo recalcula saldo y estado_pago
+                cur.executemany(
+                    "UPDATE pedidos SET total_pagado = ? WHERE id_pedido = ?",
+                    [(d['total_pagado_real'], d['id_pedido']) for d in diferencias]
+                )
+                conn.commit()
+
+            cur.close()
+            conn.close()
+
+            return {
+                'success': True,
+                'revisados': revisados,
+                'diferencias': diferencias,
+                'reparados': len(diferencias) if reparar else 0
+            }
+
+        except Exception as e:
+            print(f"Error verificando saldos: {e}")
+            if conn:
+                conn.rollback()
+                conn.close()
+            return {'success': False, 'error': str(e)}
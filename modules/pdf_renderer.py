@@ -0,0 +1,159 @@
+"""
+Módulo de generación de PDFs con el encabezado de ChromaBags
+El logo se decodifica una vez por proceso y el encabezado fijo (logo, nombre
+del sistema, marca y línea) se dibuja una vez por documento como form XObject;
+cada página solo lo referencia y escribe su título.
+"""
+import os
+import threading
+from io import BytesIO
+
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+RUTA_LOGO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         'static', 'images', 'logo_chromabags.png')
+
+# El logo se dibuja a 80x80 pt; 3 px por punto bastan para impresión
+LADO_LOGO = 80
+PIXELES_LOGO = 240
+
+COLOR_MARCA = (0.7, 0.3, 0.5)   # Morado/rosa de las líneas
+MARGEN = 40
+MARGEN_INFERIOR = 100
+
+_logo = None
+_lock = threading.Lock()
+
+
+def _cargar_logo():
+    """ImageReader del logo ya reducido, o False si no se puede leer"""
+    try:
+        from PIL import Image
+        with Image.open(RUTA_LOGO) as imagen:
+            imagen.thumbnail((PIXELES_LOGO, PIXELES_LOGO))
+            imagen.load()
+            return ImageReader(imagen.copy())
+    except ImportError:
+        return ImageReader(RUTA_LOGO)
+    except Exception as e:
+        print(f"No se pudo cargar el logo para PDFs: {e}")
+        return False
+
+
+def obtener_logo():
+    """Logo decodificado (una vez por proceso); None si no existe"""
+    global _logo
+    if _logo is None:
+        with _lock:
+            if _logo is None:
+                _logo = _cargar_logo() if os.path.exists(RUTA_LOGO) else False
+    return _logo or None
+
+
+class DocumentoPDF:
+    """
+    Documento tamaño carta con el encabezado estándar y un cursor vertical.
+    Las líneas se escriben de arriba hacia abajo; si no caben, se abre otra
+    página con el título "(continuación)".
+    """
+
+    def __init__(self, titulo, pagesize=letter, destino=None):
+        """destino: archivo donde escribir el PDF (por defecto, un BytesIO)"""
+        self.titulo = titulo
+        self.width, self.height = pagesize
+        self.buffer = destino if destino is not None else BytesIO()
+        self.canvas = canvas.Canvas(self.buffer, pagesize=pagesize, pageCompression=1)
+        self._fuente = None
+        self._definir_encabezado()
+        self.y = self._encabezado(titulo)
+
+    def _definir_encabezado(self):
+        """Parte fija del encabezado, guardada una sola vez en el documento"""
+        c = self.canvas
+        c.beginForm('encabezado')
+        logo = obtener_logo()
+        if logo:
+            c.drawImage(logo, MARGEN, self.height - 100, width=LADO_LOGO, height=LADO_LOGO,
+                        preserveAspectRatio=True, mask='auto')
+
+        # Título del sistema y marca - CENTRADOS
+        c.setFont("Helvetica-Bold", 14)
+        c.drawCentredString(self.width / 2, self.height - 50, "Sistema Integral de Gestión")
+        c.drawCentredString(self.width / 2, self.height - 68, "para Confeccionistas de Bolsas")
+        c.setFont("Helvetica-Bold", 20)
+        c.drawCentredString(self.width / 2, self.height - 95, "CHROMABAGS")
+
+        # Línea divisoria
+        c.setStrokeColorRGB(*COLOR_MARCA)
+        c.setLineWidth(2)
+        c.line(MARGEN, self.height - 110, self.width - MARGEN, self.height - 110)
+        c.endForm()
+
+    def _encabezado(self, titulo):
+        """Coloca el encabezado en la página actual; retorna la Y donde empieza el contenido"""
+        c = self.canvas
+        c.doForm('encabezado')
+        c.setFillColorRGB(0, 0, 0)
+        self._fuente = None
+        self.fuente("Helvetica-Bold", 16)
+        c.drawString(MARGEN, self.height - 140, titulo)
+        return self.height - 160
+
+    def fuente(self, nombre, tamano):
+        """Cambia la fuente solo si es distinta de la actual"""
+        if self._fuente != (nombre, tamano):
+            self.canvas.setFont(nombre, tamano)
+            self._fuente = (nombre, tamano)
+
+    def color(self, r, g, b):
+        self.canvas.setFillColorRGB(r, g, b)
+
+    def nueva_pagina(self, titulo=None):
+        self.canvas.showPage()
+        self.y = self._encabezado(titulo or f"{self.titulo} (continuación)")
+
+    def asegurar_espacio(self, alto, despues_encabezado=20):
+        """Abre una página nueva si lo que sigue (alto en puntos) no cabe"""
+        if self.y - alto < MARGEN_INFERIOR:
+            self.nueva_pagina()
+            self.y -= despues_encabezado
+
+    def texto(self, texto, x=MARGEN, fuente="Helvetica", tamano=10, salto=15):
+        """Escribe una línea en la Y actual y baja salto puntos"""
+        self.fuente(fuente, tamano)
+        self.canvas.drawString(x, self.y, texto)
+        self.y -= salto
+
+    def columnas(self, celdas, fuente="Helvetica", tamano=10, salto=15):
+        """Escribe [(x, texto), ...] en la misma línea"""
+        self.fuente(fuente, tamano)
+        for x, texto in celdas:
+            self.canvas.drawString(x, self.y, texto)
+        self.y -= salto
+
+    def separador(self, x1=MARGEN, x2=None, color=COLOR_MARCA, grosor=1, salto=10):
+        """Línea horizontal en la Y actual"""
+        c = self.canvas
+        c.setStrokeColorRGB(*color)
+        c.setLineWidth(grosor)
+        c.line(x1, self.y, self.width - MARGEN if x2 is None else x2, self.y)
+        self.y -= salto
+
+    def espacio(self, puntos):
+        self.y -= puntos
+
+    def pie(self, lineas):
+        """Líneas fijas al pie de la página actual: [(texto, fuente, tamano), ...]"""
+        y = 60
+        for texto, fuente, tamano in lineas:
+            self.fuente(fuente, tamano)
+            self.canvas.drawString(MARGEN, y, texto)
+            y -= 15
+
+    def terminar(self):
+        """Cierra el documento y retorna el buffer (o el destino) listo para send_file"""
+        self.canvas.save()
+        self.buffer.seek(0)
+        return self.buffer
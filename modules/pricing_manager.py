@@ -0,0 +1,93 @@
+"""
+Módulo de precios de venta
+Los precios salen de la tabla precios_modelo (por modelo, con escalas por
+volumen) a través de la caché de referencia; cotizaciones, pedidos y la API
+de productos calculan el precio aquí.
+"""
+from bisect import bisect_right
+
+from db_connection import get_connection
+from modules.reference_cache import ReferenceCache
+
+# Respaldo para modelos sin fila en precios_modelo
+PRECIOS_POR_TIPO = {'simple': 180.0, 'combinado': 220.0, 'especial': 250.0}
+PRECIO_DEFECTO = 180.0
+
+
+class PricingManager:
+    """Calcula precios unitarios y totales de líneas de venta"""
+
+    @staticmethod
+    def precio_unitario(id_modelo, cantidad=1):
+        """
+        Precio de la escala que corresponde a la cantidad: la de mayor
+        cantidad_minima que no supere la cantidad pedida
+        """
+        escalas = ReferenceCache.escalas_precio(id_modelo)
+        if escalas:
+            posicion = bisect_right([minima for minima, _ in escalas], max(cantidad, 1))
+            if posicion:
+                return escalas[posicion - 1][1]
+
+        tipo = ReferenceCache.tipo_modelo(id_modelo)
+        return PRECIOS_POR_TIPO.get(tipo, PRECIO_DEFECTO)
+
+    @staticmethod
+    def modelos_de_combinaciones(ids_combinacion, conn=None):
+        """
+        Retorna {id_combinacion: id_modelo} con una sola consulta.
+        Las combinaciones inexistentes o sin modelo válido no aparecen.
+        """
+        ids = sorted({int(i) for i in ids_combinacion})
+        if not ids:
+            return {}
+
+        propia = conn is None
+        if propia:
+            conn = get_connection()
+        if not conn:
+            return {}
+
+        try:
+            cur = conn.cursor()
+            cur.execute(f"""
+                SELECT id_combinacion, id_modelo
+                FROM combinaciones
+                WHERE id_combinacion IN ({','.join('?' * len(ids))})
+            """, ids)
+            filas = cur.fetchall()
+            cur.close()
+        finally:
+            if propia:
+                conn.close()
+
+        return {
+            id_combinacion: id_modelo for id_combinacion, id_modelo in filas
+            if ReferenceCache.modelo(id_modelo)
+        }
+
+    @staticmethod
+    def cotizar_lineas(lineas, conn=None):
+        """
+        Pone precio a una lista de líneas [{id_combinacion, cantidad}, ...]
+        con una sola consulta para todas. Cada línea regresa con id_modelo
+        (None si la combinación no existe), precio_unitario y subtotal.
+        """
+        modelos = PricingManager.modelos_de_combinaciones(
+            [linea['id_combinacion'] for linea in lineas], conn
+        )
+
+        resultado = []
+        for linea in lineas:
+            id_combinacion = int(linea['id_combinacion'])
+            cantidad = int(linea['cantidad'])
+            id_modelo = modelos.get(id_combinacion)
+            precio = PricingManager.precio_unitario(id_modelo, cantidad)
+            resultado.append({
+                'id_combinacion': id_combinacion,
+                'cantidad': cantidad,
+                'id_modelo': id_modelo,
+                'precio_unitario': precio,
+                'subtotal': round(precio * cantidad, 2)
+            })
+        return resultado
@@ -1,8 +1,11 @@
 """
 Módulo para gestión de cotizaciones
 """
-from db_connection import get_connection
-from datetime import datetime
+from db_connection import get_connection, get_read_connection
+from modules.reference_cache import ReferenceCache
+from modules.pricing_manager import PricingManager
+from datetime import datetime, timedelta
+import json
 
 class QuotationManager:
     """Gestiona cotizaciones de productos"""
@@ -58,9 +61,11 @@ class QuotationManager:
             return {'success': False, 'error': str(e)}
     
     @staticmethod
-    def obtener_cotizaciones():
+    def obtener_cotizaciones(limite=None, despues=None):
         """
-        Obtiene todas las cotizaciones con información del cliente
+        Obtiene las cotizaciones con información del cliente, de la más reciente
+        a la más antigua. Con limite/despues ((fecha_emision, id_cotizacion) de la
+        última de la página anterior) entrega una página por clave.
         """
         conn = get_connection()
         if not conn:
@@ -69,7 +74,10 @@ class QuotationManager:
         try:
             cur = conn.cursor()
             
-            cur.execute("""
+            filtro = "WHERE (fecha_emision, id_cotizacion) < (?, ?)" if despues else ""
+            parametros = (list(despues) if despues else []) + [limite or -1]
+            
+            cur.execute(f"""
                 SELECT 
                     c.id_cotizacion,
                     c.id_cliente,
@@ -79,12 +87,16 @@ class QuotationManager:
                     c.estado,
                     COUNT(dc.id_detalle) as cantidad_productos,
                     SUM(dc.cantidad) as cantidad_total
-                FROM cotizaciones c
+                FROM (
+                    SELECT * FROM cotizaciones {filtro}
+                    ORDER BY fecha_emision DESC, id_cotizacion DESC
+                    LIMIT ?
+                ) c
                 LEFT JOIN clientes cl ON c.id_cliente = cl.id_cliente
                 LEFT JOIN detalle_cotizacion dc ON c.id_cotizacion = dc.id_cotizacion
                 GROUP BY c.id_cotizacion
-                ORDER BY c.fecha_emision DESC
-            """)
+                ORDER BY c.fecha_emision DESC, c.id_cotizacion DESC
+            """, parametros)
             
             cotizaciones = []
             for row in cur.fetchall():
@@ -108,6 +120,103 @@ class QuotationManager:
             print(f"Error obteniendo cotizaciones: {e}")
             return []
     
+    @staticmethod
+    def _filtros_historial(desde=None, hasta=None, id_cliente=None, estado=None):
+        """WHERE y parámetros comunes del historial filtrado"""
+        condiciones, parametros = [], []
+        if desde:
+            condiciones.append("c.fecha_emision >= ?")
+            parametros.append(desde)
+        if hasta:
+            # Fecha sin hora: incluye todo ese día
+            condiciones.append("c.fecha_emision <= ?")
+            parametros.append(f"{hasta} 23:59:59" if len(hasta) == 10 else hasta)
+        if id_cliente:
+            condiciones.append("c.id_cliente = ?")
+            parametros.append(id_cliente)
+        if estado:
+            condiciones.append("c.estado = ?")
+            parametros.append(estado)
+        filtro = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        return filtro, parametros
+    
+    @staticmethod
+    def contar_cotizaciones(desde=None, hasta=None, id_cliente=None, estado=None):
+        """
+        Cantidad de cotizaciones que cumplen los filtros del historial
+        """
+        conn = get_read_connection()
+        if not conn:
+            return 0
+        
+        try:
+            filtro, parametros = QuotationManager._filtros_historial(desde, hasta, id_cliente, estado)
+            cur = conn.cursor()
+            cur.execute(f"SELECT COUNT(*) FROM cotizaciones c {filtro}", parametros)
+            total = cur.fetchone()[0]
+            cur.close()
+            conn.close()
+            return total
+        
+        except Exception as e:
+            print(f"Error contando cotizaciones: {e}")
+            return 0
+    
+    @staticmethod
+    def iterar_cotizaciones(desde=None, hasta=None, id_cliente=None, estado=None, lote=500):
+        """
+        Recorre el historial (de la más reciente a la más antigua) leyendo de
+        a lote filas con fetchmany, sin cargarlo completo en memoria.
+        Filtros: fecha_emision entre desde y hasta (YYYY-MM-DD), cliente y estado.
+        """
+        conn = get_read_connection()
+        if not conn:
+            return
+        
+        try:
+            filtro, parametros = QuotationManager._filtros_historial(desde, hasta, id_cliente, estado)
+            cur = conn.cursor()
+            # Subconsultas por fila en lugar de GROUP BY: el orden sale del
+            # índice de fecha y las filas llegan sin ordenar todo el resultado
+            cur.execute(f"""
+                SELECT 
+                    c.id_cotizacion,
+                    c.id_cliente,
+                    cl.nombre_cliente,
+                    c.fecha_emision,
+                    c.total_estimado,
+                    c.estado,
+                    (SELECT COUNT(*) FROM detalle_cotizacion dc
+                     WHERE dc.id_cotizacion = c.id_cotizacion) as cantidad_productos,
+                    (SELECT SUM(dc.cantidad) FROM detalle_cotizacion dc
+                     WHERE dc.id_cotizacion = c.id_cotizacion) as cantidad_total
+                FROM cotizaciones c
+                LEFT JOIN clientes cl ON c.id_cliente = cl.id_cliente
+                {filtro}
+                ORDER BY c.fecha_emision DESC, c.id_cotizacion DESC
+            """, parametros)
+            
+            while True:
+                filas = cur.fetchmany(lote)
+                if not filas:
+                    break
+                for row in filas:
+                    yield {
+                        'id_cotizacion': row[0],
+                        'id_cliente': row[1],
+                        'nombre_cliente': row[2],
+                        'fecha_emision': row[3],
+                        'total_estimado': row[4],
+                        'estado': row[5],
+                        'cantidad_productos': row[6] or 0,
+                        'cantidad_total': row[7] or 0
+                    }
+            
+            cur.close()
+        
+        finally:
+            conn.close()
+    
     @staticmethod
     def obtener_cotizacion_detalle(id_cotizacion):
         """
@@ -202,9 +311,9 @@ class QuotationManager:
             
             # Si se va a aprobar, verificar que no exista ya un pedido
             if nuevo_estado == 'aprobada':
-                # Obtener datos de la cotización
+                # Obtener datos de la cotización (la huella resume sus productos)
                 cur.execute("""
-                    SELECT id_cliente, total_estimado
+                    SELECT id_cliente, total_estimado, huella
                     FROM cotizaciones
                     WHERE id_cotizacion = ?
                 """, (id_cotizacion,))
@@ -214,65 +323,26 @@ class QuotationManager:
                 if cotizacion:
                     id_cliente = cotizacion[0]
                     total = cotizacion[1]
+                    huella = cotizacion[2]
                     
-                    # Obtener los productos de esta cotización
-                    cur.execute("""
-                        SELECT id_material, cantidad, costo_unitario
-                        FROM detalle_cotizacion
-                        WHERE id_cotizacion = ?
-                        ORDER BY id_material
-                    """, (id_cotizacion,))
-                    
-                    productos_cotizacion = cur.fetchall()
-                    
-                    if not productos_cotizacion:
+                    if not huella:
                         cur.close()
                         conn.close()
                         return {'success': False, 'error': 'Cotización sin productos'}
                     
-                    # Buscar pedidos del mismo cliente con el mismo total
+                    # Pedido del mismo cliente con los mismos productos y total:
+                    # una búsqueda en idx_pedidos_huella
                     cur.execute("""
-                        SELECT p.id_pedido
-                        FROM pedidos p
-                        WHERE p.id_cliente = ?
-                        AND ABS(p.total - ?) < 0.01
-                        AND p.estado NOT IN ('cancelado')
-                        ORDER BY p.fecha_pedido DESC
-                    """, (id_cliente, total))
-                    
-                    pedidos_similares = cur.fetchall()
+                        SELECT id_pedido
+                        FROM pedidos
+                        WHERE id_cliente = ?
+                        AND huella = ?
+                        AND ABS(total - ?) < 0.01
+                        AND estado NOT IN ('cancelado')
+                        LIMIT 1
+                    """, (id_cliente, huella, total))
                     
-                    # Verificar si algún pedido tiene exactamente los mismos productos
-                    pedido_duplicado = False
-                    for pedido_row in pedidos_similares:
-                        id_pedido_similar = pedido_row[0]
-                        
-                        # Obtener productos de este pedido
-                        cur.execute("""
-                            SELECT id_producto, cantidad, precio_unitario
-                            FROM detalle_pedido
-                            WHERE id_pedido = ?
-                            ORDER BY id_producto
-                        """, (id_pedido_similar,))
-                        
-                        productos_pedido = cur.fetchall()
-                        
-                        # Comparar si son exactamente iguales
-                        if len(productos_cotizacion) == len(productos_pedido):
-                            productos_iguales = True
-                            for i, prod_cot in enumerate(productos_cotizacion):
-                                prod_ped = productos_pedido[i]
-                                # Comparar id_producto, cantidad
-                                if (prod_cot[0] != prod_ped[0] or 
-                                    prod_cot[1] != prod_ped[1]):
-                                    productos_iguales = False
-                                    break
-                            
-                            if productos_iguales:
-                                pedido_duplicado = True
-                                break
-                    
-                    if pedido_duplicado:
+                    if cur.fetchone():
                         cur.close()
                         conn.close()
                         return {
@@ -362,6 +432,103 @@ class QuotationManager:
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
+    @staticmethod
+    def aprobar_cotizaciones(ids_cotizacion):
+        """
+        Aprueba un lote de cotizaciones en una sola transacción y crea sus pedidos.
+        La verificación de duplicados es una sola consulta para todo el lote
+        (más los repetidos dentro del mismo lote) y los detalles se copian con
+        executemany. Retorna un resultado por cotización.
+        """
+        ids = list(dict.fromkeys(int(i) for i in ids_cotizacion))
+        if not ids:
+            return {'success': True, 'aprobadas': 0, 'resultados': []}
+        
+        conn = get_connection()
+        if not conn:
+            return {'success': False, 'error': 'Error de conexión a BD'}
+        
+        try:
+            cur = conn.cursor()
+            
+            cur.execute("""
+                SELECT c.id_cotizacion, c.id_cliente, c.total_estimado, c.huella,
+                       EXISTS (
+                           SELECT 1 FROM pedidos p
+                           WHERE p.id_cliente = c.id_cliente
+                           AND p.huella = c.huella
+                           AND ABS(p.total - c.total_estimado) < 0.01
+                           AND p.estado NOT IN ('cancelado')
+                       ) AS duplicado
+                FROM cotizaciones c
+                WHERE c.id_cotizacion IN (SELECT value FROM json_each(?))
+            """, (json.dumps(ids),))
+            cotizaciones = {row[0]: row for row in cur.fetchall()}
+            
+            fecha_entrega = (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d')
+            creados = set()
+            detalles = []
+            aprobadas = []
+            resultados = []
+            
+            for id_cotizacion in ids:
+                cotizacion = cotizaciones.get(id_cotizacion)
+                if not cotizacion:
+                    resultados.append({'id_cotizacion': id_cotizacion, 'success': False,
+                                       'error': 'Cotización no encontrada'})
+                    continue
+                
+                _, id_cliente, total, huella, duplicado = cotizacion
+                if not huella:
+                    resultados.append({'id_cotizacion': id_cotizacion, 'success': False,
+                                       'error': 'Cotización sin productos'})
+                    continue
+                
+                clave = (id_cliente, huella, round(total or 0, 2))
+                if duplicado or clave in creados:
+                    resultados.append({'id_cotizacion': id_cotizacion, 'success': False,
+                                       'error': 'Ya existe un pedido idéntico para esta cotización'})
+                    continue
+                
+                cur.execute("""
+                    INSERT INTO pedidos (id_cliente, total, fecha_entrega, estado)
+                    VALUES (?, ?, ?, 'pendiente')
+                """, (id_cliente, total, fecha_entrega))
+                id_pedido = cur.lastrowid
+                
+                creados.add(clave)
+                detalles.append((id_pedido, id_cotizacion))
+                aprobadas.append((id_cotizacion,))
+                resultados.append({'id_cotizacion': id_cotizacion, 'success': True,
+                                   'id_pedido': id_pedido})
+            
+            # Detalles de todos los pedidos nuevos y estados en bloque
+            cur.executemany("""
+                INSERT INTO detalle_pedido (id_pedido, id_producto, cantidad, precio_unitario, subtotal)
+                SELECT ?, id_material, CAST(cantidad AS INTEGER), costo_unitario, subtotal
+                FROM detalle_cotizacion
+                WHERE id_cotizacion = ?
+            """, detalles)
+            cur.executemany("""
+                UPDATE cotizaciones
+                SET estado = 'aprobada'
+                WHERE id_cotizacion = ?
+            """, aprobadas)
+            
+            conn.commit()
+            cur.close()
+            conn.close()
+            
+            print(f"✅ {len(aprobadas)} de {len(ids)} cotizaciones aprobadas en lote")
+            return {'success': True, 'aprobadas': len(aprobadas), 'resultados': resultados}
+        
+        except Exception as e:
+            print(f"❌ Error aprobando cotizaciones en lote: {e}")
+            if conn:
+                conn.rollback()
+                conn.close()
+            return {'success': False, 'error': str(e)}
+    
     @staticmethod
     def duplicar_cotizacion(id_cotizacion):
         """
@@ -425,34 +592,29 @@ class QuotationManager:
         try:
             cur = conn.cursor()
             
-            # Obtener combinaciones como productos
+            # Obtener combinaciones como productos; el modelo sale de la caché
             cur.execute("""
-                SELECT 
-                    c.id_combinacion,
-                    c.nombre_guardado,
-                    mb.nombre_modelo,
-                    mb.tipo,
-                    180 as precio_base
-                FROM combinaciones c
-                JOIN modelos_bolsas mb ON c.id_modelo = mb.id_modelo
-                ORDER BY c.fecha_creacion DESC
+                SELECT id_combinacion, nombre_guardado, id_modelo
+                FROM combinaciones
+                ORDER BY fecha_creacion DESC
             """)
             
             productos = []
             for row in cur.fetchall():
-                # Calcular precio según tipo
-                precio_base = 180
-                if row[3] == 'combinado':
-                    precio_base = 220
-                elif row[3] == 'especial':
-                    precio_base = 250
+                modelo = ReferenceCache.modelo(row[2])
+                if not modelo:
+                    continue
                 
                 productos.append({
                     'id_combinacion': row[0],
                     'nombre': row[1],
-                    'modelo': row[2],
-                    'tipo': row[3],
-                    'precio': precio_base
+                    'modelo': modelo[1],
+                    'tipo': modelo[2],
+                    'precio': PricingManager.precio_unitario(row[2]),
+                    'escalas': [
+                        {'cantidad_minima': minima, 'precio': precio}
+                        for minima, precio in ReferenceCache.escalas_precio(row[2])
+                    ]
                 })
             
             cur.close()
@@ -469,7 +631,7 @@ class QuotationManager:
         """
         Genera reporte de cotizaciones en un rango de fechas
         """
-        conn = get_connection()
+        conn = get_read_connection()
         if not conn:
             return None
         
@@ -0,0 +1,174 @@
+"""
+Caché en memoria de los datos de referencia: modelos de bolsa, paletas, colores
+y precios por modelo
+Estas tablas casi nunca cambian, así que cada proceso guarda una copia y la
+recarga solo cuando cambia el contador versiones_datos, que incrementan los
+triggers de cada una (migraciones 6 y 7). Comparar el contador es una sola
+lectura por clave primaria y funciona entre varios workers de gunicorn.
+"""
+import threading
+
+from flask import g, has_app_context
+
+import db_connection
+from db_connection import get_connection
+
+
+class DatosReferencia:
+    """Copia inmutable de las tablas de referencia en una versión dada"""
+
+    def __init__(self, db_path, version, modelos, paletas, colores, precios=()):
+        self.db_path = db_path
+        self.version = version
+        # Filas en el mismo formato que las consultas originales
+        self.modelos = modelos      # (id_modelo, nombre_modelo, tipo)
+        self.paletas = paletas      # (id_paleta, nombre, esquema)
+        self.colores = colores      # (id_color, nombre_color, codigo_hex, id_paleta)
+
+        self.modelo_por_id = {m[0]: m for m in modelos}
+        self.tipo_por_modelo = {m[0]: m[2] for m in modelos}
+        self.hex_por_color = {c[0]: c[2] for c in colores}
+        self.color_por_id = {c[0]: (c[1], c[2]) for c in colores}
+        self.id_por_hex = {c[2]: c[0] for c in colores}
+
+        # Escalas de precio por modelo, ordenadas por cantidad mínima
+        self.precios_por_modelo = {}
+        for id_modelo, cantidad_minima, precio_unitario in precios:
+            self.precios_por_modelo.setdefault(id_modelo, []).append(
+                (cantidad_minima, precio_unitario)
+            )
+
+        self.colores_por_paleta = {}
+        for id_color, nombre, codigo_hex, id_paleta in colores:
+            if id_paleta is not None:
+                self.colores_por_paleta.setdefault(id_paleta, []).append(
+                    {'nombre': nombre, 'hex': codigo_hex}
+                )
+
+
+_datos = None
+_lock = threading.Lock()
+
+
+def _leer_version(cur):
+    cur.execute("SELECT version FROM versiones_datos WHERE nombre = 'referencia'")
+    fila = cur.fetchone()
+    return fila[0] if fila else 0
+
+
+def _cargar(cur, version):
+    cur.execute("SELECT id_modelo, nombre_modelo, tipo FROM modelos_bolsas ORDER BY id_modelo")
+    modelos = cur.fetchall()
+    cur.execute("SELECT id_paleta, nombre, esquema FROM paletas_colores ORDER BY id_paleta")
+    paletas = cur.fetchall()
+    cur.execute("SELECT id_color, nombre_color, codigo_hex, id_paleta FROM colores ORDER BY id_color")
+    colores = cur.fetchall()
+    cur.execute("""
+        SELECT id_modelo, cantidad_minima, precio_unitario
+        FROM precios_modelo
+        ORDER BY id_modelo, cantidad_minima
+    """)
+    precios = cur.fetchall()
+    return DatosReferencia(db_connection.DB_PATH, version, modelos, paletas, colores, precios)
+
+
+class ReferenceCache:
+    """Acceso a modelos, paletas, colores y precios sin consultar la BD en cada solicitud"""
+
+    @staticmethod
+    def obtener():
+        """
+        Retorna los datos vigentes. Dentro de una solicitud el contador se
+        revisa una sola vez; fuera de ella, en cada llamada.
+        """
+        global _datos
+        datos = _datos
+        en_solicitud = has_app_context()
+        if (en_solicitud and datos is not None
+                and g.get('_referencia_revisada') is datos):
+            return datos
+
+        conn = get_connection()
+        if not conn:
+            return datos
+
+        try:
+            cur = conn.cursor()
+            version = _leer_version(cur)
+            if (datos is None or datos.version != version
+                    or datos.db_path != db_connection.DB_PATH):
+                with _lock:
+                    datos = _datos
+                    if (datos is None or datos.version != version
+                            or datos.db_path != db_connection.DB_PATH):
+                        datos = _cargar(cur, version)
+                        _datos = datos
+            cur.close()
+            conn.close()
+
+        except Exception as e:
+            print(f"Error cargando datos de referencia: {e}")
+            if conn:
+                conn.close()
+            return datos
+
+        if en_solicitud:
+            g._referencia_revisada = datos
+        return datos
+
+    @staticmethod
+    def invalidar():
+        """
+        Obliga a revisar el contador en la siguiente lectura (tras escribir
+        en las tablas de referencia dentro de la misma solicitud)
+        """
+        if has_app_context():
+            g.pop('_referencia_revisada', None)
+
+    @staticmethod
+    def modelos():
+        datos = ReferenceCache.obtener()
+        return list(datos.modelos) if datos else []
+
+    @staticmethod
+    def paletas():
+        datos = ReferenceCache.obtener()
+        return list(datos.paletas) if datos else []
+
+    @staticmethod
+    def colores_paleta(id_paleta):
+        datos = ReferenceCache.obtener()
+        return list(datos.colores_por_paleta.get(id_paleta, [])) if datos else []
+
+    @staticmethod
+    def modelo(id_modelo):
+        """(id_modelo, nombre_modelo, tipo) o None"""
+        datos = ReferenceCache.obtener()
+        return datos.modelo_por_id.get(id_modelo) if datos else None
+
+    @staticmethod
+    def tipo_modelo(id_modelo):
+        datos = ReferenceCache.obtener()
+        return datos.tipo_por_modelo.get(id_modelo) if datos else None
+
+    @staticmethod
+    def escalas_precio(id_modelo):
+        """[(cantidad_minima, precio_unitario), ...] ordenadas de menor a mayor"""
+        datos = ReferenceCache.obtener()
+        return list(datos.precios_por_modelo.get(id_modelo, [])) if datos else []
+
+    @staticmethod
+    def color(id_color):
+        """(nombre_color, codigo_hex) o None"""
+        datos = ReferenceCache.obtener()
+        return datos.color_por_id.get(id_color) if datos else None
+
+    @staticmethod
+    def hex_color(id_color):
+        datos = ReferenceCache.obtener()
+        return datos.hex_por_color.get(id_color) if datos else None
+
+    @staticmethod
+    def id_color(codigo_hex):
+        datos = ReferenceCache.obtener()
+        return datos.id_por_hex.get(codigo_hex) if datos else None
@@ -0,0 +1,103 @@
+"""
+Módulo de búsqueda de texto completo sobre clientes, diseños, pedidos y cotizaciones
+El índice (tabla FTS5 busqueda) lo mantienen los triggers de la migración 5.
+"""
+import re
+
+from db_connection import get_connection
+from modules.migraciones import DOCUMENTOS_BUSQUEDA, reconstruir_busqueda
+
+_RE_PALABRAS = re.compile(r'\w+', re.UNICODE)
+
+
+def construir_consulta(texto):
+    """
+    Convierte el texto del usuario en una consulta FTS5: cada palabra es un
+    prefijo y todas deben aparecer. Retorna None si no hay palabras.
+    """
+    palabras = _RE_PALABRAS.findall(texto or '')
+    if not palabras:
+        return None
+    return ' '.join(f'"{palabra}"*' for palabra in palabras)
+
+
+class SearchManager:
+    """Gestiona la búsqueda global"""
+
+    TIPOS = tuple(DOCUMENTOS_BUSQUEDA)
+
+    @staticmethod
+    def buscar(texto, tipo=None, limite=20):
+        """
+        Busca por prefijo en el índice y ordena por relevancia (bm25,
+        el título pesa más que el contenido)
+        """
+        consulta = construir_consulta(texto)
+        if not consulta:
+            return []
+
+        conn = get_connection()
+        if not conn:
+            return []
+
+        try:
+            cur = conn.cursor()
+            sql = """
+                SELECT tipo, id_ref, titulo,
+                       snippet(busqueda, 3, '', '', '…', 12) as detalle,
+                       bm25(busqueda, 0.0, 0.0, 10.0, 1.0) as puntaje
+                FROM busqueda
+                WHERE busqueda MATCH ?
+            """
+            parametros = [consulta]
+            if tipo:
+                sql += " AND tipo = ?"
+                parametros.append(tipo)
+            sql += " ORDER BY puntaje LIMIT ?"
+            parametros.append(limite)
+
+            cur.execute(sql, parametros)
+            resultados = [{
+                'tipo': row[0],
+                'id': row[1],
+                'titulo': row[2],
+                'detalle': ' '.join(row[3].split())
+            } for row in cur.fetchall()]
+
+            cur.close()
+            conn.close()
+            return resultados
+
+        except Exception as e:
+            print(f"Error en búsqueda: {e}")
+            if conn:
+                conn.close()
+            return []
+
+    @staticmethod
+    def reconstruir_indice():
+        """
+        Vuelve a indexar todos los documentos
+        """
+        conn = get_connection()
+        if not conn:
+            return {'success': False, 'error': 'Error de conexión a BD'}
+
+        try:
+            cur = conn.cursor()
+            reconstruir_busqueda(cur)
+            cur.execute("SELECT COUNT(*) FROM busqueda")
+            documentos = cur.fetchone()[0]
+
+            conn.commit()
+            cur.close()
+            conn.close()
+
+            return {'success': True, 'documentos': documentos}
+
+        except Exception as e:
+            print(f"Error reconstruyendo índice de búsqueda: {e}")
+            if conn:
+                conn.rollback()
+                conn.close()
+            return {'success': False, 'error': str(e)}
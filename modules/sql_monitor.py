@@ -0,0 +1,184 @@
+"""
+Instrumentación de SQL por solicitud
+Cuenta sentencias, tiempo total, las más lentas y las formas repetidas,
+y marca posibles N+1 (la misma consulta ejecutada muchas veces en una solicitud)
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from flask import request, jsonify, abort
+
+# Veces que una misma forma de consulta debe repetirse para marcarla como N+1
+UMBRAL_N1 = int(os.environ.get('CHROMABAGS_SQL_UMBRAL_N1', 5))
+# Sentencias más lentas que se conservan por solicitud
+MAXIMO_LENTAS = 5
+# Solicitudes recientes que muestra /_debug/sql
+HISTORIAL_MAXIMO = 50
+
+_local = threading.local()
+_historial = deque(maxlen=HISTORIAL_MAXIMO)
+_historial_lock = threading.Lock()
+
+_RE_ESPACIOS = re.compile(r'\s+')
+_RE_CADENAS = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMEROS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_RE_LISTAS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+
+
+def normalizar_sql(sql):
+    """
+    Forma de una sentencia: sin literales ni espacios extra, para agrupar
+    las ejecuciones repetidas de la misma consulta con distintos valores
+    """
+    forma = _RE_CADENAS.sub('?', sql)
+    forma = _RE_NUMEROS.sub('?', forma)
+    forma = _RE_ESPACIOS.sub(' ', forma).strip()
+    return _RE_LISTAS.sub('(?)', forma)
+
+
+class TrazaSQL:
+    """
+    Sentencias ejecutadas durante una solicitud
+    """
+
+    def __init__(self, ruta, umbral_n1=UMBRAL_N1):
+        self.ruta = ruta
+        self.umbral_n1 = umbral_n1
+        self.consultas = 0
+        self.tiempo = 0.0
+        self.formas = {}    # forma -> [veces, segundos]
+        self.lentas = []    # [(segundos, sql)] ordenada de mayor a menor
+        self._lock = threading.Lock()
+
+    def registrar(self, sql, segundos):
+        forma = normalizar_sql(sql)
+        with self._lock:
+            self.consultas += 1
+            self.tiempo += segundos
+            acumulado = self.formas.setdefault(forma, [0, 0.0])
+            acumulado[0] += 1
+            acumulado[1] += segundos
+            if len(self.lentas) < MAXIMO_LENTAS or segundos > self.lentas[-1][0]:
+                self.lentas.append((segundos, forma))
+                self.lentas.sort(key=lambda s: s[0], reverse=True)
+                del self.lentas[MAXIMO_LENTAS:]
+
+    def posibles_n1(self):
+        """
+        Formas de consulta repetidas al menos umbral_n1 veces
+        """
+        return [
+            {'sql': forma, 'veces': veces, 'tiempo_ms': round(segundos * 1000, 3)}
+            for forma, (veces, segundos) in sorted(
+                self.formas.items(), key=lambda f: f[1][0], reverse=True)
+            if veces >= self.umbral_n1
+        ]
+
+    def resumen(self):
+        repetidas = [
+            {'sql': forma, 'veces': veces, 'tiempo_ms': round(segundos * 1000, 3)}
+            for forma, (veces, segundos) in sorted(
+                self.formas.items(), key=lambda f: f[1][0], reverse=True)
+            if veces > 1
+        ]
+        return {
+            'ruta': self.ruta,
+            'consultas': self.consultas,
+            'tiempo_ms': round(self.tiempo * 1000, 3),
+            'lentas': [{'sql': sql, 'tiempo_ms': round(s * 1000, 3)} for s, sql in self.lentas],
+            'repetidas': repetidas,
+            'posibles_n1': self.posibles_n1(),
+        }
+
+
+def traza_actual():
+    return getattr(_local, 'traza', None)
+
+
+def activar(traza):
+    """
+    Asigna la traza al hilo actual (None la desactiva).
+    Retorna la traza anterior para poder restaurarla.
+    """
+    anterior = getattr(_local, 'traza', None)
+    _local.traza = traza
+    return anterior
+
+
+class CursorInstrumentado(sqlite3.Cursor):
+    """
+    Cursor que mide cada sentencia si hay una traza activa en el hilo.
+    El tiempo cubre la ejecución hasta la primera fila, no el fetch.
+    """
+
+    def execute(self, sql, parametros=()):
+        traza = traza_actual()
+        if traza is None:
+            return super().execute(sql, parametros)
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            traza.registrar(sql, time.perf_counter() - inicio)
+
+    def executemany(self, sql, secuencia):
+        traza = traza_actual()
+        if traza is None:
+            return super().executemany(sql, secuencia)
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, secuencia)
+        finally:
+            traza.registrar(sql, time.perf_counter() - inicio)
+
+
+def historial():
+    with _historial_lock:
+        return list(reversed(_historial))
+
+
+def _habilitado(app):
+    valor = app.config.get('SQL_TRAZA')
+    return app.debug if valor is None else bool(valor)
+
+
+def init_app(app):
+    """
+    Activa la traza en cada solicitud cuando app.config['SQL_TRAZA'] es verdadero
+    (por defecto, en modo debug) y registra /_debug/sql.
+    """
+    if os.environ.get('CHROMABAGS_SQL_TRAZA') == '1':
+        app.config.setdefault('SQL_TRAZA', True)
+
+    @app.before_request
+    def iniciar_traza():
+        if _habilitado(app) and request.endpoint != 'debug_sql':
+            activar(TrazaSQL(request.path))
+
+    @app.after_request
+    def publicar_traza(response):
+        traza = traza_actual()
+        if traza is not None:
+            response.headers['X-SQL-Consultas'] = str(traza.consultas)
+            response.headers['X-SQL-Tiempo-Ms'] = f"{traza.tiempo * 1000:.3f}"
+            response.headers['X-SQL-N1'] = str(len(traza.posibles_n1()))
+            with _historial_lock:
+                _historial.append(traza.resumen())
+        return response
+
+    @app.teardown_request
+    def terminar_traza(exception=None):
+        activar(None)
+
+    @app.route('/_debug/sql')
+    def debug_sql():
+        if not _habilitado(app):
+            abort(404)
+        solicitudes = historial()
+        if request.args.get('n1'):
+            solicitudes = [s for s in solicitudes if s['posibles_n1']]
+        return jsonify({'umbral_n1': UMBRAL_N1, 'solicitudes': solicitudes})
@@ -0,0 +1,50 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# La app migra la BD al importarse: nunca debe tocar la base de datos versionada
+_DIR_SESION = tempfile.mkdtemp(prefix='chromabags_tests_')
+os.environ['CHROMABAGS_DB'] = os.path.join(_DIR_SESION, 'ChromaBags.db')
+shutil.copy(os.path.join(RAIZ, 'database', 'ChromaBags.db'), os.environ['CHROMABAGS_DB'])
+
+import db_connection
+from modules.migraciones import aplicar_migraciones
+
+
+@pytest.fixture
+def db_temporal(tmp_path):
+    """
+    Copia la base de datos de ejemplo (migrada) a un directorio temporal
+    y apunta el pool a ella
+    """
+    ruta = tmp_path / 'ChromaBags.db'
+    shutil.copy(os.path.join(RAIZ, 'database', 'ChromaBags.db'), ruta)
+    ruta_original = db_connection.DB_PATH
+    db_connection.configurar(db_path=str(ruta))
+    aplicar_migraciones()
+    yield str(ruta)
+    db_connection.configurar(db_path=ruta_original)
+
+
+@pytest.fixture
+def app(db_temporal):
+    from app import app as flask_app
+    flask_app.config['TESTING'] = True
+    return flask_app
+
+
+@pytest.fixture
+def hora_mexico(monkeypatch):
+    """Zona horaria fija UTC-6 (sin depender de tzdata)"""
+    monkeypatch.setenv('TZ', 'CST+6')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
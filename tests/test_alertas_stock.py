@@ -0,0 +1,101 @@
+"""
+Alertas de stock bajo por material, mantenidas por triggers
+"""
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import db_connection
+from modules.inventory_manager import InventoryManager
+from modules.migraciones import _alertas_en_hora_local, _TRIGGERS_ALERTAS
+
+
+@pytest.fixture
+def material(app):
+    with app.test_request_context('/'):
+        resultado = InventoryManager.agregar_material('Hilo prueba', 'insumo', 'carrete', 8, stock_minimo=10)
+        InventoryManager.registrar_movimiento(resultado['id_material'], 'entrada', 25)
+    return resultado['id_material']
+
+
+def _activas(app):
+    with app.test_request_context('/'):
+        return {a['id_material']: a for a in InventoryManager.obtener_materiales_bajo_stock()}
+
+
+def test_alerta_se_activa_y_resuelve_con_el_stock(app, material):
+    # La base de ejemplo ya trae 'Tela cuadrillé' (70) bajo el mínimo por defecto (100)
+    activas = _activas(app)
+    assert 1 in activas and 2 not in activas
+    assert material not in activas
+
+    with app.test_request_context('/'):
+        InventoryManager.registrar_movimiento(material, 'salida', 16)
+    alerta = _activas(app)[material]
+    assert (alerta['nombre'], alerta['cantidad'], alerta['stock_minimo']) == ('Hilo prueba', 9, 10)
+
+    with app.test_request_context('/'):
+        InventoryManager.registrar_movimiento(material, 'entrada', 1)
+    assert material not in _activas(app)
+
+
+def test_cambiar_minimo_reevalua_y_cursor_entrega_cambios(app, material):
+    with app.test_request_context('/'):
+        cursor = InventoryManager.obtener_alertas_stock()['cursor']
+
+        datos = InventoryManager.obtener_material_por_id(material)
+        assert datos['stock_minimo'] == 10
+        InventoryManager.modificar_material(material, 'Hilo prueba', 'insumo', 'carrete', 8, None, 30)
+        # Sin stock_minimo se conserva el actual
+        InventoryManager.modificar_material(1, 'Tela cuadrillé', 'tela', 'm', 20, None)
+
+        cambios = InventoryManager.obtener_alertas_stock(cursor)
+        assert [(a['id_material'], a['activa']) for a in cambios['alertas']] == [(material, True)]
+        assert cambios['cursor'] > cursor
+
+        InventoryManager.modificar_material(material, 'Hilo prueba', 'insumo', 'carrete', 8, None, 5)
+        InventoryManager.actualizar_stock(1, 40)
+        siguientes = InventoryManager.obtener_alertas_stock(cambios['cursor'])
+
+    assert [(a['id_material'], a['activa']) for a in siguientes['alertas']] == [
+        (material, False), (1, False)
+    ]
+    assert app.test_client().get(f"/api/materiales_bajo_stock?desde={siguientes['cursor']}").get_json() == {
+        'alertas': [], 'cursor': siguientes['cursor']
+    }
+
+
+def test_alerta_en_hora_local_como_el_kardex(app, material, hora_mexico):
+    with app.test_request_context('/'):
+        InventoryManager.registrar_movimiento(material, 'salida', 20)
+        conn = db_connection.get_connection()
+        fecha = conn.execute("""
+            SELECT fecha FROM movimientos_inventario
+            WHERE id_material = ? ORDER BY id_movimiento DESC
+        """, (material,)).fetchone()[0]
+        alerta = next(a for a in InventoryManager.obtener_alertas_stock()['alertas']
+                      if a['id_material'] == material)
+    # Mismo reloj: a lo sumo el segundo que tarda la operación
+    assert abs((datetime.fromisoformat(alerta['desde']) - datetime.fromisoformat(fecha)).total_seconds()) <= 1
+
+
+def test_migracion_convierte_alertas_utc(hora_mexico):
+    conn = sqlite3.connect(':memory:')
+    cur = conn.cursor()
+    cur.execute("CREATE TABLE materiales (id_material INTEGER PRIMARY KEY, stock_minimo REAL)")
+    cur.execute("CREATE TABLE inventario_materiales (id_material INTEGER PRIMARY KEY, cantidad REAL)")
+    cur.execute("""CREATE TABLE alertas_stock (
+        id_material INTEGER PRIMARY KEY, cantidad REAL, stock_minimo REAL NOT NULL,
+        activa INTEGER NOT NULL DEFAULT 1, desde TEXT NOT NULL, version INTEGER NOT NULL
+    )""")
+    for trigger in _TRIGGERS_ALERTAS:
+        cur.execute(trigger.replace(",'localtime'", ''))
+    cur.execute("INSERT INTO alertas_stock VALUES (1, 5, 10, 1, '2025-01-01 12:00:00', 1)")
+
+    _alertas_en_hora_local(cur)
+    _alertas_en_hora_local(cur)
+
+    assert cur.execute("SELECT desde FROM alertas_stock").fetchone()[0] == '2025-01-01 06:00:00'
+    sql = cur.execute("SELECT sql FROM sqlite_master WHERE name = 'trg_alertas_inventario_insertar'").fetchone()[0]
+    assert "datetime('now','localtime')" in sql
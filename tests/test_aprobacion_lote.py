@@ -0,0 +1,67 @@
+"""
+Aprobación de cotizaciones en lote
+"""
+import db_connection
+from modules.quotation_manager import QuotationManager
+
+
+def _cotizacion(id_cliente, lineas):
+    return QuotationManager.crear_cotizacion(id_cliente, [
+        {'id_combinacion': c, 'cantidad': n, 'precio_unitario': 180} for c, n in lineas
+    ])['id_cotizacion']
+
+
+def test_aprobar_lote_con_reporte_por_cotizacion(app):
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        cur = conn.cursor()
+        cur.execute("INSERT INTO clientes (nombre_cliente) VALUES ('CLIENTE LOTE')")
+        id_cliente = cur.lastrowid
+        conn.commit()
+
+        previa = _cotizacion(id_cliente, [(20, 1)])
+        QuotationManager.actualizar_estado_cotizacion(previa, 'aprobada')
+
+        nuevas = [_cotizacion(id_cliente, [(20, n), (15, 1)]) for n in range(2, 7)]
+        ya_tiene_pedido = _cotizacion(id_cliente, [(20, 1)])
+        repetida_en_lote = _cotizacion(id_cliente, [(15, 1), (20, 2)])
+        conn.execute("INSERT INTO cotizaciones (id_cliente, total_estimado) VALUES (?, 0)", (id_cliente,))
+        vacia = conn.execute("SELECT MAX(id_cotizacion) FROM cotizaciones").fetchone()[0]
+        conn.commit()
+
+    ids = nuevas + [ya_tiene_pedido, repetida_en_lote, vacia, 999999]
+    respuesta = app.test_client().post('/api/cotizaciones/aprobar', json={'ids': ids})
+    datos = respuesta.get_json()
+
+    assert respuesta.status_code == 200
+    assert datos['aprobadas'] == 5
+    errores = {r['id_cotizacion']: r.get('error') for r in datos['resultados'] if not r['success']}
+    assert errores == {
+        ya_tiene_pedido: 'Ya existe un pedido idéntico para esta cotización',
+        repetida_en_lote: 'Ya existe un pedido idéntico para esta cotización',
+        vacia: 'Cotización sin productos',
+        999999: 'Cotización no encontrada',
+    }
+
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        pedidos = {r['id_cotizacion']: r['id_pedido'] for r in datos['resultados'] if r['success']}
+        for n, id_cotizacion in enumerate(nuevas, start=2):
+            lineas = conn.execute("""
+                SELECT id_producto, cantidad FROM detalle_pedido
+                WHERE id_pedido = ? ORDER BY id_producto
+            """, (pedidos[id_cotizacion],)).fetchall()
+            assert [tuple(l) for l in lineas] == [(15, 1), (20, n)]
+        estados = {e for e, in conn.execute(
+            f"SELECT estado FROM cotizaciones WHERE id_cotizacion IN ({','.join('?' * len(nuevas))})", nuevas
+        )}
+        assert estados == {'aprobada'}
+
+
+def test_aprobar_lote_valida_la_entrada(app):
+    cliente = app.test_client()
+    assert cliente.post('/api/cotizaciones/aprobar', json={'ids': 'x'}).status_code == 400
+    assert cliente.post('/api/cotizaciones/aprobar', json={'ids': [1, 'a']}).status_code == 400
+    assert cliente.post('/api/cotizaciones/aprobar', json={'ids': []}).get_json() == {
+        'success': True, 'aprobadas': 0, 'resultados': []
+    }
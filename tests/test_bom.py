@@ -0,0 +1,72 @@
+"""
+Lista de materiales por modelo y requerimientos de producción
+"""
+import db_connection
+from modules.bom_manager import BOMManager
+from modules.inventory_manager import InventoryManager
+from modules.orders_manager import OrdersManager
+from modules.quotation_manager import QuotationManager
+
+
+def _definir_listas(app):
+    cliente = app.test_client()
+    # Modelo 1 (combinación 20): tela principal y asa del color de la combinación, hilo general
+    respuesta = cliente.put('/api/modelos/1/materiales', json=[
+        {'id_material': 1, 'cantidad': 0.8, 'region': 'principal'},
+        {'id_material': 1, 'cantidad': 0.2, 'region': 'asa'},
+        {'id_material': 2, 'cantidad': 0.5},
+    ])
+    assert respuesta.get_json() == {'success': True, 'materiales': 3}
+    # Modelo 2 (combinación 15)
+    cliente.put('/api/modelos/2/materiales', json=[{'id_material': 2, 'cantidad': 1.5}])
+
+
+def test_definir_y_consultar_lista(app):
+    _definir_listas(app)
+    cliente = app.test_client()
+    lista = cliente.get('/api/modelos/1/materiales').get_json()
+    assert [(m['region'], m['id_material'], m['cantidad'], m['costo']) for m in lista] == [
+        ('', 2, 0.5, 10.0), ('asa', 1, 0.2, 4.0), ('principal', 1, 0.8, 16.0)
+    ]
+    assert cliente.put('/api/modelos/1/materiales', json=[{'id_material': 1, 'cantidad': 1, 'region': 'x'}]).status_code == 400
+    assert cliente.put('/api/modelos/1/materiales', json=[{'cantidad': 1}]).status_code == 400
+
+
+def test_requerimientos_de_pedidos_y_cotizaciones(app):
+    _definir_listas(app)
+    with app.test_request_context('/'):
+        pedido = OrdersManager.crear_pedido(1, 20, 10, '2030-01-08')['id_pedido']
+        otro = OrdersManager.crear_pedido(1, 15, 4, '2030-01-09')['id_pedido']
+        OrdersManager.crear_pedido(1, 15, 100, '2030-01-09', 'cancelado')
+        cotizacion = QuotationManager.crear_cotizacion(1, [
+            {'id_combinacion': 20, 'cantidad': 5, 'precio_unitario': 180},
+            {'id_combinacion': 15, 'cantidad': 2, 'precio_unitario': 220},
+        ])['id_cotizacion']
+        conn = db_connection.get_connection()
+        principal, asa = conn.execute(
+            "SELECT id_color_principal, id_color_asa FROM combinaciones WHERE id_combinacion = 20"
+        ).fetchone()
+
+        resultado = BOMManager.calcular_requerimientos([pedido, otro], [cotizacion])
+
+    assert resultado['success']
+    materiales = {m['id_material']: m for m in resultado['materiales']}
+    # 15 bolsas de la combinación 20 y 6 de la 15
+    assert materiales[1]['cantidad'] == 15 * 1.0
+    assert materiales[2]['cantidad'] == 15 * 0.5 + 6 * 1.5
+    assert resultado['costo_total'] == round((15 + 16.5) * 20.0, 2)
+    por_color = {c['id_color']: c['cantidad'] for c in materiales[1]['por_color']}
+    if principal == asa:
+        assert por_color == {principal: 15.0}
+    else:
+        assert por_color == {principal: 12.0, asa: 3.0}
+
+    semana = app.test_client().get('/api/produccion/requerimientos?desde=2030-01-01&hasta=2030-01-08').get_json()
+    assert semana['pedidos'] == 1
+    assert {m['id_material']: m['cantidad'] for m in semana['materiales']} == {1: 10.0, 2: 5.0}
+
+
+def test_costo_produccion_en_una_consulta(app):
+    with app.test_request_context('/'):
+        assert InventoryManager.calcular_costo_produccion({1: 2, 2: 1.5, 999: 4}) == 70.0
+        assert InventoryManager.calcular_costo_produccion({}) == 0
@@ -0,0 +1,93 @@
+"""
+Índice de búsqueda FTS5 sincronizado por triggers y /api/buscar
+"""
+import pytest
+
+import db_connection
+import mantenimiento_db
+from modules.orders_manager import OrdersManager
+from modules.quotation_manager import QuotationManager
+from modules.search_manager import SearchManager, construir_consulta
+
+
+@pytest.fixture
+def datos(app):
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO clientes (nombre_cliente, rfc, correo, telefono)
+            VALUES ('Mariana Gómez', 'GOMM800101AB1', 'mariana@correo.mx', '5512345678')
+        """)
+        id_cliente = cur.lastrowid
+        conn.commit()
+        id_pedido = OrdersManager.crear_pedido(id_cliente, 20, 2, '2030-01-01')['id_pedido']
+        id_cotizacion = QuotationManager.crear_cotizacion(
+            id_cliente, [{'id_combinacion': 15, 'cantidad': 1, 'precio_unitario': 220}]
+        )['id_cotizacion']
+    return {'id_cliente': id_cliente, 'id_pedido': id_pedido, 'id_cotizacion': id_cotizacion}
+
+
+def _buscar(app, texto, tipo=None):
+    with app.test_request_context('/'):
+        return [(r['tipo'], r['id']) for r in SearchManager.buscar(texto, tipo)]
+
+
+def test_construir_consulta():
+    assert construir_consulta('  mar  góm') == '"mar"* "góm"*'
+    assert construir_consulta('"; DROP') == '"DROP"*'
+    assert construir_consulta('***') is None
+
+
+def test_busca_por_prefijo_y_sin_acentos(app, datos):
+    encontrados = _buscar(app, 'mari gomez')
+    assert encontrados[0] == ('cliente', datos['id_cliente'])
+    assert ('pedido', datos['id_pedido']) in encontrados
+    assert ('cotizacion', datos['id_cotizacion']) in encontrados
+
+    assert _buscar(app, 'GOMM800') == [('cliente', datos['id_cliente'])]
+    assert _buscar(app, 'blue', 'pedido') == [('pedido', datos['id_pedido'])]
+    assert _buscar(app, 'rosa pas', 'cotizacion') == [('cotizacion', datos['id_cotizacion'])]
+    assert ('cotizacion', datos['id_cotizacion']) in _buscar(app, 'cotizacion')
+
+
+def test_triggers_sincronizan_el_indice(app, datos):
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        conn.execute("UPDATE clientes SET nombre_cliente = 'Mariela Ortiz' WHERE id_cliente = ?",
+                     (datos['id_cliente'],))
+        conn.execute("UPDATE combinaciones SET nombre_guardado = 'Azul Marino' WHERE id_combinacion = 20")
+        conn.commit()
+
+    assert ('pedido', datos['id_pedido']) in _buscar(app, 'ortiz')
+    assert _buscar(app, 'gomez', 'pedido') == []
+    assert _buscar(app, 'azul marino') == [('combinacion', 20), ('pedido', datos['id_pedido'])]
+
+    with app.test_request_context('/'):
+        OrdersManager.eliminar_pedido(datos['id_pedido'])
+    assert _buscar(app, 'ortiz', 'pedido') == []
+
+
+def test_api_buscar(app, datos):
+    cliente = app.test_client()
+    resultados = cliente.get('/api/buscar?q=mariana&tipo=cliente').get_json()
+    assert resultados == [{
+        'tipo': 'cliente',
+        'id': datos['id_cliente'],
+        'titulo': 'Mariana Gómez',
+        'detalle': 'GOMM800101AB1 mariana@correo.mx 5512345678',
+        'url': '/clientes',
+    }]
+    assert cliente.get('/api/buscar?q=').get_json() == []
+    assert cliente.get('/api/buscar?q=x&tipo=otro').status_code == 400
+
+
+def test_reconstruir_indice(app, datos):
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        conn.execute("DELETE FROM busqueda")
+        conn.commit()
+    assert _buscar(app, 'mariana') == []
+
+    assert mantenimiento_db.main(['busqueda']) == 0
+    assert _buscar(app, 'mariana', 'cliente') == [('cliente', datos['id_cliente'])]
@@ -0,0 +1,66 @@
+"""
+Costos de producción del catálogo en memoria con recálculo incremental
+"""
+import pytest
+
+import db_connection
+from modules import cost_manager
+from modules.bom_manager import BOMManager
+from modules.cost_manager import CostManager
+from modules.db_helpers import crear_producto_desde_combinacion
+from modules.inventory_manager import InventoryManager
+
+
+@pytest.fixture
+def listas(app):
+    with app.test_request_context('/'):
+        BOMManager.definir_lista(1, [{'id_material': 1, 'cantidad': 0.5},
+                                     {'id_material': 2, 'cantidad': 0.25, 'region': 'principal'}])
+        BOMManager.definir_lista(2, [{'id_material': 2, 'cantidad': 1}])
+
+
+def _por_diseno(costos):
+    return {c['id_combinacion']: c for c in costos}
+
+
+def test_costo_y_margen_por_diseno(app, listas):
+    costos = _por_diseno(app.test_client().get('/api/costos/catalogo').get_json())
+
+    assert set(costos) == {20, 15, 18}
+    assert (costos[20]['costo_produccion'], costos[20]['precio'], costos[20]['margen']) == (15, 180, 165)
+    assert costos[20]['margen_porcentaje'] == 91.7
+    assert (costos[15]['costo_produccion'], costos[15]['margen']) == (20, 200)
+    # El modelo 3 no tiene lista de materiales
+    assert costos[18]['costo_produccion'] is None and costos[18]['margen'] is None
+
+
+def test_cambio_de_precio_recalcula_solo_los_modelos_afectados(app, listas, monkeypatch):
+    with app.test_request_context('/'):
+        id_producto = crear_producto_desde_combinacion(20, 'Bolsa azul', 180)
+        antes = CostManager.obtener()
+        assert antes.costo_modelo == {1: 15, 2: 20}
+
+        # Sin recarga completa: solo se recalcula el modelo 1
+        monkeypatch.setattr(cost_manager, '_cargar', None)
+        InventoryManager.modificar_material(1, 'Tela cuadrillé', 'tela', 'm', 30, None)
+        despues = CostManager.obtener()
+
+        assert despues.version == antes.version + 1
+        assert despues.costo_modelo == {1: 20, 2: 20}
+        assert antes.costo_modelo[1] == 15
+
+        conn = db_connection.get_connection()
+        costo = conn.execute("SELECT costo_produccion FROM productos_terminados WHERE id_producto = ?",
+                             (id_producto,)).fetchone()[0]
+    assert costo == 20
+
+
+def test_cambio_externo_recarga(app, listas):
+    with app.test_request_context('/'):
+        assert CostManager.costo_modelo(2) == 20
+        conn = db_connection.get_connection()
+        conn.execute("UPDATE materiales SET costo_unitario = 8 WHERE id_material = 2")
+        conn.commit()
+    with app.test_request_context('/'):
+        assert CostManager.costo_modelo(2) == 8
+        assert CostManager.costo_modelo(1) == 12
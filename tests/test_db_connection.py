@@ -0,0 +1,100 @@
+import os
+import sqlite3
+
+import pytest
+
+import db_connection
+from db_connection import get_connection, PoolConexiones, PoolAgotadoError
+
+
+def test_misma_conexion_durante_la_solicitud(app):
+    with app.test_request_context('/'):
+        conn = get_connection()
+        conn.close()  # no debe cerrarla: sigue asignada a la solicitud
+        assert get_connection() is conn
+        assert conn.execute("SELECT 1").fetchone()[0] == 1
+
+
+def test_conexion_se_reutiliza_entre_solicitudes(app):
+    with app.test_request_context('/'):
+        primera = get_connection()
+    with app.test_request_context('/'):
+        segunda = get_connection()
+    assert primera is segunda
+
+
+def test_liberar_descarta_transaccion_pendiente(app):
+    with app.test_request_context('/'):
+        conn = get_connection()
+        conn.execute("INSERT INTO paletas_colores (nombre) VALUES ('temporal')")
+        assert conn.in_transaction
+
+    with app.test_request_context('/'):
+        conn = get_connection()
+        assert not conn.in_transaction
+        total = conn.execute(
+            "SELECT COUNT(*) FROM paletas_colores WHERE nombre = 'temporal'"
+        ).fetchone()[0]
+        assert total == 0
+
+
+def test_pool_agotado(db_temporal):
+    pool = PoolConexiones(db_temporal, tamano=1, timeout=0.05)
+    conn = pool.adquirir()
+    with pytest.raises(PoolAgotadoError):
+        pool.adquirir()
+    pool.liberar(conn)
+    assert pool.adquirir() is conn
+
+
+def test_fuera_de_solicitud_abre_conexion_independiente(db_temporal):
+    conn = get_connection()
+    assert not isinstance(conn, db_connection.ConexionPool)
+    conn.close()
+
+
+def test_perfil_aplicado_a_conexiones_del_pool(db_temporal):
+    db_connection.configurar(perfil='servidor')
+    try:
+        conn = db_connection.obtener_pool().adquirir()
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 15000
+        db_connection.obtener_pool().liberar(conn)
+    finally:
+        db_connection.configurar(perfil='escritorio')
+
+
+def test_checkpoint_trunca_wal_grande(db_temporal):
+    conn = db_connection.obtener_pool().adquirir()
+    conn.execute("CREATE TABLE relleno (datos BLOB)")
+    conn.executemany("INSERT INTO relleno VALUES (randomblob(4096))", [()] * 50)
+    conn.commit()
+
+    checkpointer = db_connection.CheckpointerWAL(db_temporal, intervalo=60, limite_wal=1024)
+    modo, busy, _, _ = checkpointer.checkpoint(conn)
+    assert modo == 'TRUNCATE'
+    assert busy == 0
+    assert os.path.getsize(db_temporal + '-wal') == 0
+    db_connection.obtener_pool().liberar(conn)
+
+
+def test_conexion_de_lectura_rechaza_escrituras(app):
+    with app.test_request_context('/'):
+        conn = db_connection.get_read_connection()
+        assert conn._pool.solo_lectura
+        assert db_connection.get_read_connection() is conn
+        assert conn.execute("SELECT COUNT(*) FROM pedidos").fetchone()[0] >= 0
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO paletas_colores (nombre) VALUES ('no')")
+
+
+def test_rutas_solo_lectura_usan_el_pool_de_lectura(app):
+    @db_connection.solo_lectura
+    def vista():
+        return db_connection.get_connection()
+
+    with app.test_request_context('/'):
+        assert vista()._pool.solo_lectura
+
+    assert app.test_client().get('/reportes').status_code == 200
@@ -0,0 +1,127 @@
+"""
+Verificación de materiales en lote y reservas de inventario
+"""
+import threading
+import time
+
+import db_connection
+from modules import inventory_manager
+from modules.bom_manager import BOMManager
+from modules.inventory_manager import InventoryManager
+from modules.orders_manager import OrdersManager
+from modules.quotation_manager import QuotationManager
+
+
+def _preparar(app):
+    """Stock inicial: material 1 = 70, material 2 = 100 (base de ejemplo)"""
+    with app.test_request_context('/'):
+        BOMManager.definir_lista(1, [{'id_material': 1, 'cantidad': 2}, {'id_material': 2, 'cantidad': 1}])
+        pedido = OrdersManager.crear_pedido(1, 20, 30, '2030-01-01')['id_pedido']
+        otro = OrdersManager.crear_pedido(1, 20, 10, '2030-01-02')['id_pedido']
+    return pedido, otro
+
+
+def test_verifica_todo_el_conjunto(app):
+    cliente = app.test_client()
+    datos = cliente.post('/api/verificar_materiales', json={'materiales': {'1': 80, '2': 10, '999': 1}}).get_json()
+    assert datos['disponible'] is False
+    assert {m['id_material']: m['faltante'] for m in datos['materiales']} == {1: 10, 2: 0, 999: 1}
+    assert cliente.post('/api/verificar_materiales', json={'materiales': [1, 2]}).status_code == 400
+
+    pedido, _ = _preparar(app)
+    datos = cliente.post('/api/verificar_materiales', json={'pedido': pedido}).get_json()
+    assert datos['disponible'] is True
+    assert {m['id_material']: m['requerido'] for m in datos['materiales']} == {1: 60, 2: 30}
+
+
+def test_reserva_evita_prometer_dos_veces(app):
+    pedido, otro = _preparar(app)
+    cliente = app.test_client()
+
+    primera = cliente.post('/api/verificar_materiales', json={'pedido': pedido, 'reservar_minutos': 30}).get_json()
+    assert primera['disponible'] and primera['reservado']
+
+    # Reservar de nuevo el mismo pedido reemplaza su reserva, no la duplica
+    repetida = cliente.post('/api/verificar_materiales', json={'pedido': pedido, 'reservar_minutos': 30}).get_json()
+    assert repetida['reservado']
+
+    segunda = cliente.post('/api/verificar_materiales', json={'pedido': otro, 'reservar_minutos': 30}).get_json()
+    assert segunda['disponible'] is False
+    assert 'reservado' not in segunda
+    material_1 = next(m for m in segunda['materiales'] if m['id_material'] == 1)
+    assert (material_1['reservado'], material_1['disponible'], material_1['faltante']) == (60, 10, 10)
+
+    with app.test_request_context('/'):
+        assert InventoryManager.liberar_reserva('pedido', pedido)['liberadas'] == 2
+        conn = db_connection.get_connection()
+        assert conn.execute("SELECT COUNT(*) FROM reservas_inventario").fetchone()[0] == 0
+
+    assert cliente.post('/api/verificar_materiales', json={'pedido': otro}).get_json()['disponible'] is True
+
+
+def test_reservas_concurrentes_sin_escritor_grupal(app, monkeypatch):
+    monkeypatch.setattr(db_connection, 'GROUP_COMMIT', False)
+    with app.test_request_context('/'):
+        BOMManager.definir_lista(1, [{'id_material': 1, 'cantidad': 2}])
+        pedidos = [OrdersManager.crear_pedido(1, 20, 30, '2030-01-01')['id_pedido'] for _ in range(2)]
+
+    # Entre leer el disponible y reservar, cada verificación se detiene un momento
+    def round_lento(*args):
+        time.sleep(0.05)
+        return round(*args)
+    monkeypatch.setattr(inventory_manager, 'round', round_lento, raising=False)
+
+    barrera = threading.Barrier(len(pedidos))
+    respuestas = []
+
+    def verificar(pedido):
+        cliente = app.test_client()
+        barrera.wait()
+        respuestas.append(cliente.post('/api/verificar_materiales',
+                                       json={'pedido': pedido, 'reservar_minutos': 30}).get_json())
+
+    hilos = [threading.Thread(target=verificar, args=(pedido,)) for pedido in pedidos]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    # 60 de 70 para cada pedido: solo uno puede quedar reservado
+    assert sorted(bool(r.get('reservado')) for r in respuestas) == [False, True]
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        assert conn.execute("SELECT SUM(cantidad) FROM reservas_inventario").fetchone()[0] == 60
+
+
+def test_cancelar_o_eliminar_libera_la_reserva(app):
+    pedido, otro = _preparar(app)
+    with app.test_request_context('/'):
+        cotizaciones = [
+            QuotationManager.crear_cotizacion(1, [{'id_combinacion': 20, 'cantidad': 1, 'precio_unitario': 180}])
+            ['id_cotizacion'] for _ in range(2)
+        ]
+    cliente = app.test_client()
+
+    def reservadas():
+        with app.test_request_context('/'):
+            conn = db_connection.get_connection()
+            return {tuple(r) for r in conn.execute(
+                "SELECT DISTINCT referencia_tipo, id_referencia FROM reservas_inventario")}
+
+    def reservar(referencia_tipo, id_referencia):
+        assert cliente.post('/api/verificar_materiales', json={
+            referencia_tipo: id_referencia, 'reservar_minutos': 30
+        }).get_json()['reservado']
+
+    reservar('pedido', otro)
+    reservar('cotizacion', cotizaciones[0])
+    reservar('cotizacion', cotizaciones[1])
+
+    cliente.post(f'/actualizar_pedido/{otro}', data={'fecha_entrega': '2030-01-02', 'estado': 'cancelado'})
+    cliente.put(f'/api/cotizacion/{cotizaciones[0]}/estado', json={'estado': 'rechazada'})
+    assert reservadas() == {('cotizacion', cotizaciones[1])}
+
+    cliente.post(f'/eliminar_cotizacion/{cotizaciones[1]}')
+    reservar('pedido', pedido)
+    cliente.get(f'/eliminar_pedido/{pedido}')
+    assert reservadas() == set()
@@ -0,0 +1,118 @@
+import threading
+
+import pytest
+
+import db_connection
+from db_connection import EscritorGrupal, get_connection
+
+
+def _insertar_paleta(nombre):
+    conn = get_connection()
+    conn.execute("INSERT INTO paletas_colores (nombre) VALUES (?)", (nombre,))
+    conn.commit()
+    conn.close()
+    return {'success': True}
+
+
+def _insertar_y_fallar(nombre):
+    conn = get_connection()
+    conn.execute("INSERT INTO paletas_colores (nombre) VALUES (?)", (nombre,))
+    return {'success': False, 'error': 'rechazada'}
+
+
+def _insertar_y_lanzar(nombre):
+    conn = get_connection()
+    conn.execute("INSERT INTO paletas_colores (nombre) VALUES (?)", (nombre,))
+    raise ValueError('falla a mitad de la operación')
+
+
+def _contar(db_temporal, prefijo):
+    conn = db_connection.PoolConexiones(db_temporal)._conectar()
+    try:
+        return conn.execute(
+            "SELECT COUNT(*) FROM paletas_colores WHERE nombre LIKE ?", (prefijo + '%',)
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_escrituras_concurrentes_se_agrupan(db_temporal):
+    escritor = EscritorGrupal(espera=0.01)
+    hilos = [
+        threading.Thread(target=escritor.enviar, args=(_insertar_paleta, f'grupo {i}'))
+        for i in range(40)
+    ]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert _contar(db_temporal, 'grupo ') == 40
+    assert escritor.operaciones == 40
+    assert escritor.lotes < 40
+
+
+def test_operacion_fallida_no_afecta_al_lote(db_temporal):
+    escritor = EscritorGrupal()
+    assert escritor.enviar(_insertar_y_fallar, 'rechazada')['success'] is False
+    with pytest.raises(ValueError):
+        escritor.enviar(_insertar_y_lanzar, 'lanzada')
+    assert escritor.enviar(_insertar_paleta, 'valida')['success'] is True
+
+    assert _contar(db_temporal, 'rechazada') == 0
+    assert _contar(db_temporal, 'lanzada') == 0
+    assert _contar(db_temporal, 'valida') == 1
+
+
+def test_ruta_registrar_pago_pasa_por_el_escritor(app, db_temporal):
+    cliente = app.test_client()
+    with app.test_request_context('/'):
+        conn = get_connection()
+        cur = conn.execute(
+            "INSERT INTO pedidos (id_cliente, estado, total) VALUES (1, 'finalizado', 500)"
+        )
+        id_pedido = cur.lastrowid
+        conn.commit()
+
+    operaciones = db_connection.obtener_escritor().operaciones
+    cliente.post(f'/registrar_pago/{id_pedido}', data={'metodo': 'efectivo', 'monto': '800'})
+    assert db_connection.obtener_escritor().operaciones == operaciones + 1
+
+    conn = db_connection.PoolConexiones(db_temporal)._conectar()
+    monto = conn.execute("SELECT SUM(monto) FROM pagos WHERE id_pedido = ?", (id_pedido,)).fetchone()[0]
+    conn.close()
+    assert monto == 500
+
+
+def test_rutas_de_clientes_y_catalogo_pasan_por_el_escritor(app, db_temporal):
+    cliente = app.test_client()
+    escritor = db_connection.obtener_escritor()
+    operaciones = escritor.operaciones
+    datos = {'nombre': 'cliente escritor', 'telefono': '1', 'correo': 'e@x.mx',
+             'tipo': 'minorista', 'direccion': 'calle'}
+
+    cliente.post('/agregar_cliente', data=datos)
+    conn = db_connection.PoolConexiones(db_temporal)._conectar()
+    id_cliente = conn.execute(
+        "SELECT id_cliente FROM clientes WHERE nombre_cliente = 'CLIENTE ESCRITOR'"
+    ).fetchone()[0]
+    cliente.post(f'/modificar_cliente/{id_cliente}', data={**datos, 'rfc': 'abc010101ab1'})
+    diseno = {'esquema_color': 'armonico', 'modelo_bolsa': '1', 'nombre_combinacion': 'Diseño escritor',
+              'color_principal': '#abcdef', 'color_asa': '#000000'}
+    cliente.post('/diseno_color', data=diseno)
+    # Nombre repetido: la operación se rechaza sin escribir
+    assert cliente.post('/diseno_color', data=diseno).status_code == 400
+    id_combinacion = conn.execute(
+        "SELECT id_combinacion FROM combinaciones WHERE nombre_guardado = 'Diseño escritor'"
+    ).fetchone()[0]
+    cliente.post(f'/eliminar_combinacion/{id_combinacion}')
+    cliente.post(f'/eliminar_cliente/{id_cliente}')
+    assert escritor.operaciones == operaciones + 6
+
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM colores WHERE codigo_hex = '#abcdef'").fetchone()[0] == 1
+        assert conn.execute("SELECT COUNT(*) FROM combinaciones WHERE nombre_guardado = 'Diseño escritor'"
+                            ).fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM clientes WHERE id_cliente = ?", (id_cliente,)).fetchone()[0] == 0
+    finally:
+        conn.close()
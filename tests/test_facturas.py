@@ -0,0 +1,162 @@
+"""
+Facturas emitidas con folio y PDF guardado en el almacén de facturas
+"""
+import os
+import zipfile
+from io import BytesIO
+
+import pytest
+
+import db_connection
+from modules import invoice_manager
+from modules.invoice_manager import InvoiceManager
+from modules.orders_manager import OrdersManager
+from modules.payments_manager import PaymentsManager
+
+
+def _crear_pedido(id_cliente, pagado=True):
+    conn = db_connection.get_connection()
+    id_pedido = OrdersManager.crear_pedido(id_cliente, 20, 2, '2030-01-01', 'finalizado')['id_pedido']
+    if pagado:
+        total = conn.execute("SELECT total FROM pedidos WHERE id_pedido = ?", (id_pedido,)).fetchone()[0]
+        PaymentsManager.registrar_pago(id_pedido, total, 'efectivo')
+    return id_pedido
+
+
+@pytest.fixture
+def pedido_pagado(app):
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        cur = conn.cursor()
+        cur.execute("INSERT INTO clientes (nombre_cliente, correo) VALUES ('CLIENTE SIN RFC', 'c@x.mx')")
+        id_cliente = cur.lastrowid
+        conn.commit()
+        id_pedido = _crear_pedido(id_cliente)
+    return {'id_cliente': id_cliente, 'id_pedido': id_pedido}
+
+
+def test_emision_unica_y_descarga_del_archivo_guardado(app, pedido_pagado, monkeypatch):
+    id_pedido = pedido_pagado['id_pedido']
+    cliente = app.test_client()
+    assert cliente.get(f'/facturas/{id_pedido}/pdf').status_code == 404
+
+    emitida = cliente.post(f'/generar_factura/{id_pedido}')
+    assert emitida.status_code == 200 and emitida.data.startswith(b'%PDF')
+
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        facturas = conn.execute("""
+            SELECT folio, rfc, razon_social, uso_cfdi, regimen_fiscal, correo_facturacion, ruta_pdf
+            FROM facturas WHERE id_pedido = ?
+        """, (id_pedido,)).fetchall()
+        facturables = PaymentsManager.obtener_pedidos_facturables()
+    assert len(facturas) == 1
+    folio, *fiscales, ruta_pdf = facturas[0]
+    assert folio.startswith('CB-') and ruta_pdf == f'{folio}.pdf'
+    # Sin datos fiscales: público en general
+    assert fiscales == ['XAXX010101000', 'PUBLICO EN GENERAL', 'S01', '616', 'c@x.mx']
+    assert [p['folio'] for p in facturables if p['id_pedido'] == id_pedido] == [folio]
+
+    # Las descargas siguientes no vuelven a generar el PDF
+    monkeypatch.setattr(invoice_manager, 'escribir_factura', None)
+    descarga = cliente.get(f'/facturas/{id_pedido}/pdf')
+    assert descarga.status_code == 200 and descarga.data == emitida.data
+    assert f'factura_{folio}.pdf' in descarga.headers['Content-Disposition']
+    assert cliente.post(f'/generar_factura/{id_pedido}').data == emitida.data
+
+    etag = descarga.headers['ETag']
+    assert cliente.get(f'/facturas/{id_pedido}/pdf', headers={'If-None-Match': etag}).status_code == 304
+    parcial = cliente.get(f'/facturas/{id_pedido}/pdf', headers={'Range': 'bytes=0-99'})
+    assert parcial.status_code == 206 and parcial.data == emitida.data[:100]
+
+
+def test_regenerar_conserva_folio_y_actualiza_datos(app, pedido_pagado):
+    id_pedido = pedido_pagado['id_pedido']
+    cliente = app.test_client()
+    primera = cliente.post(f'/generar_factura/{id_pedido}')
+    etag = cliente.get(f'/facturas/{id_pedido}/pdf').headers['ETag']
+
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        conn.execute("""
+            UPDATE clientes SET rfc = 'ABC010101AB1', razon_social = 'BOLSAS SA'
+            WHERE id_cliente = ?
+        """, (pedido_pagado['id_cliente'],))
+        conn.commit()
+
+    regenerada = cliente.post(f'/generar_factura/{id_pedido}', data={'regenerar': '1'})
+    assert regenerada.status_code == 200 and regenerada.data != primera.data
+    assert cliente.get(f'/facturas/{id_pedido}/pdf', headers={'If-None-Match': etag}).status_code == 200
+
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        facturas = conn.execute("SELECT folio, rfc, razon_social FROM facturas WHERE id_pedido = ?",
+                                (id_pedido,)).fetchall()
+    assert len(facturas) == 1
+    assert facturas[0][1:] == ('ABC010101AB1', 'BOLSAS SA')
+    assert primera.headers['Content-Disposition'] == regenerada.headers['Content-Disposition']
+
+    # Si el archivo se pierde, se vuelve a generar con lo guardado
+    os.remove(os.path.join(invoice_manager.directorio_facturas(), f'{facturas[0][0]}.pdf'))
+    assert cliente.get(f'/facturas/{id_pedido}/pdf').data.startswith(b'%PDF')
+    assert cliente.post('/generar_factura/999999').status_code == 404
+
+
+def test_emision_sin_escritor_grupal(app, pedido_pagado, monkeypatch):
+    monkeypatch.setattr(db_connection, 'GROUP_COMMIT', False)
+    id_pedido = pedido_pagado['id_pedido']
+    cliente = app.test_client()
+
+    emitida = cliente.post(f'/generar_factura/{id_pedido}')
+    assert emitida.status_code == 200 and emitida.data.startswith(b'%PDF')
+    regenerada = cliente.post(f'/generar_factura/{id_pedido}', data={'regenerar': '1'})
+    assert regenerada.status_code == 200
+
+    with app.test_request_context('/'):
+        os.remove(InvoiceManager.ruta_pdf(InvoiceManager.obtener_factura(id_pedido)))
+    assert cliente.get(f'/facturas/{id_pedido}/pdf').status_code == 200
+
+
+def test_lote_en_paralelo_y_zip(app, pedido_pagado, monkeypatch):
+    monkeypatch.setattr(invoice_manager, 'PROCESOS_FACTURAS', 2)
+    with app.test_request_context('/'):
+        pagados = [pedido_pagado['id_pedido']] + [_crear_pedido(pedido_pagado['id_cliente']) for _ in range(3)]
+        sin_pagar = _crear_pedido(pedido_pagado['id_cliente'], pagado=False)
+
+    cliente = app.test_client()
+    # Uno ya emitido se reutiliza dentro del lote
+    individual = cliente.post(f"/generar_factura/{pagados[0]}").data
+
+    respuesta = cliente.post('/facturas/lote', json={'pedidos': pagados + [sin_pagar, 999999]})
+    assert respuesta.status_code == 200 and respuesta.mimetype == 'application/zip'
+    with zipfile.ZipFile(BytesIO(respuesta.data)) as archivo:
+        nombres = archivo.namelist()
+        contenidos = [archivo.read(nombre) for nombre in nombres]
+    assert len(nombres) == 4 and all(c.startswith(b'%PDF') for c in contenidos)
+    assert contenidos[0] == individual
+
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        folios = dict(conn.execute("SELECT id_pedido, folio FROM facturas").fetchall())
+    assert set(folios) == set(pagados)
+    assert nombres == [f'factura_{folios[i]}.pdf' for i in pagados]
+
+    # Del formulario de /facturacion, sin pedidos facturables o sin selección
+    assert cliente.post('/facturas/lote', data={'pedidos': [str(sin_pagar)]}).status_code == 400
+    assert cliente.post('/facturas/lote', data={}).status_code == 400
+    assert cliente.post('/facturas/lote', json={'pedidos': ['abc']}).status_code == 400
+
+
+def test_lote_sin_escritor_grupal(app, pedido_pagado, monkeypatch):
+    monkeypatch.setattr(db_connection, 'GROUP_COMMIT', False)
+    with app.test_request_context('/'):
+        pagados = [pedido_pagado['id_pedido'], _crear_pedido(pedido_pagado['id_cliente'])]
+
+    respuesta = app.test_client().post('/facturas/lote', data={'pedidos': [str(p) for p in pagados]})
+    assert respuesta.status_code == 200
+    with zipfile.ZipFile(BytesIO(respuesta.data)) as archivo:
+        assert len(archivo.namelist()) == 2
+
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        assert conn.execute("SELECT COUNT(*) FROM facturas").fetchone()[0] == 2
@@ -0,0 +1,68 @@
+"""
+Huella de contenido para detectar pedidos duplicados al aprobar cotizaciones
+"""
+import db_connection
+from modules.quotation_manager import QuotationManager
+
+
+def _cotizacion(lineas, id_cliente):
+    return QuotationManager.crear_cotizacion(id_cliente, [
+        {'id_combinacion': c, 'cantidad': n, 'precio_unitario': 180} for c, n in lineas
+    ])['id_cotizacion']
+
+
+def test_huella_canonica(app):
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        a = _cotizacion([(20, 2), (15, 1)], 1)
+        b = _cotizacion([(15, 1), (20, 1), (20, 1)], 1)
+        huellas = dict(conn.execute(
+            "SELECT id_cotizacion, huella FROM cotizaciones WHERE id_cotizacion IN (?, ?)", (a, b)
+        ).fetchall())
+    assert huellas[a] == huellas[b] == '15:1,20:2'
+
+
+def test_huella_con_cantidades_grandes(app):
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        ids = [_cotizacion([(20, n)], 1) for n in (1000000, 1000001)]
+        huellas = [h for h, in conn.execute(
+            "SELECT huella FROM cotizaciones WHERE id_cotizacion IN (?, ?) ORDER BY id_cotizacion", ids
+        )]
+    assert huellas == ['20:1000000', '20:1000001']
+
+
+def test_aprobar_detecta_duplicados(app):
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        cur = conn.cursor()
+        cur.execute("INSERT INTO clientes (nombre_cliente) VALUES ('CLIENTE HUELLA')")
+        id_cliente = cur.lastrowid
+        conn.commit()
+
+        primera = _cotizacion([(20, 2), (15, 1)], id_cliente)
+        igual = _cotizacion([(15, 1), (20, 2)], id_cliente)
+        distinta = _cotizacion([(20, 3), (15, 1)], id_cliente)
+
+        assert QuotationManager.actualizar_estado_cotizacion(primera, 'aprobada')['success']
+        repetida = QuotationManager.actualizar_estado_cotizacion(igual, 'aprobada')
+        assert repetida == {'success': False, 'error': 'Ya existe un pedido idéntico para esta cotización'}
+        assert QuotationManager.actualizar_estado_cotizacion(distinta, 'aprobada')['success']
+
+        # Un pedido cancelado no bloquea la aprobación
+        conn.execute("UPDATE pedidos SET estado = 'cancelado' WHERE id_cliente = ?", (id_cliente,))
+        conn.commit()
+        assert QuotationManager.actualizar_estado_cotizacion(igual, 'aprobada')['success']
+
+        huellas = [h for h, in conn.execute(
+            "SELECT huella FROM pedidos WHERE id_cliente = ? ORDER BY id_pedido", (id_cliente,)
+        )]
+        assert huellas == ['15:1,20:2', '15:1,20:3', '15:1,20:2']
+
+        plan = ' '.join(fila[3] for fila in conn.execute("""
+            EXPLAIN QUERY PLAN
+            SELECT id_pedido FROM pedidos
+            WHERE id_cliente = 1 AND huella = 'x' AND ABS(total - 1) < 0.01
+            AND estado NOT IN ('cancelado') LIMIT 1
+        """))
+    assert 'idx_pedidos_huella' in plan
@@ -0,0 +1,144 @@
+"""
+Kardex de inventario: movimientos atómicos y existencias a una fecha
+"""
+import sqlite3
+import threading
+
+import pytest
+
+import db_connection
+from modules.inventory_manager import InventoryManager
+from modules.migraciones import _kardex_en_hora_local, _sql_tabla_movimientos, _TRIGGERS_KARDEX
+
+
+@pytest.fixture
+def material(app):
+    with app.test_request_context('/'):
+        resultado = InventoryManager.agregar_material('Lona prueba', 'tela', 'm', 12.5)
+    return resultado['id_material']
+
+
+def _fijar_fechas(app, fechas):
+    """Reescribe fechas de movimientos (el kardex no admite UPDATE: se desactiva el trigger)"""
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        conn.execute("DROP TRIGGER IF EXISTS trg_movimientos_sin_actualizar")
+        for id_movimiento, fecha in fechas.items():
+            conn.execute("UPDATE movimientos_inventario SET fecha = ? WHERE id_movimiento = ?",
+                         (fecha, id_movimiento))
+        conn.commit()
+
+
+def test_movimientos_y_saldos(app, material):
+    with app.test_request_context('/'):
+        assert InventoryManager.registrar_movimiento(material, 'entrada', 100, 'pedido', 7, 'ana')['nueva_cantidad'] == 100
+        assert InventoryManager.registrar_movimiento(material, 'salida', 30)['nueva_cantidad'] == 70
+        assert InventoryManager.registrar_movimiento(material, 'salida', 80) == {
+            'success': False, 'error': 'Stock insuficiente'
+        }
+        assert InventoryManager.registrar_movimiento(material, 'salida', -1)['success'] is False
+        assert InventoryManager.actualizar_stock(material, -5)['nueva_cantidad'] == 65
+
+        kardex = InventoryManager.obtener_kardex(material)
+        assert [(m['tipo'], m['cantidad'], m['saldo']) for m in kardex] == [
+            ('ajuste', -5, 65), ('salida', -30, 70), ('entrada', 100, 100)
+        ]
+        assert (kardex[2]['referencia_tipo'], kardex[2]['id_referencia'], kardex[2]['usuario']) == ('pedido', 7, 'ana')
+
+        conn = db_connection.get_connection()
+        with pytest.raises(Exception):
+            conn.execute("DELETE FROM movimientos_inventario WHERE id_material = ?", (material,))
+        conn.rollback()
+
+
+def test_salidas_concurrentes_no_pierden_actualizaciones(app, material):
+    with app.test_request_context('/'):
+        InventoryManager.registrar_movimiento(material, 'entrada', 100)
+
+    exitos = []
+
+    def trabajador():
+        # Fuera de una solicitud: cada hilo usa su propia conexión
+        for _ in range(20):
+            if InventoryManager.registrar_movimiento(material, 'salida', 1)['success']:
+                exitos.append(1)
+
+    hilos = [threading.Thread(target=trabajador) for _ in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert len(exitos) == 100
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        stock = conn.execute("SELECT cantidad FROM inventario_materiales WHERE id_material = ?",
+                             (material,)).fetchone()[0]
+        suma = conn.execute("SELECT SUM(cantidad) FROM movimientos_inventario WHERE id_material = ?",
+                            (material,)).fetchone()[0]
+    assert stock == suma == 0
+
+
+def test_existencias_a_una_fecha_desde_el_corte(app, material):
+    with app.test_request_context('/'):
+        ids = [InventoryManager.registrar_movimiento(material, 'entrada', n)['id_movimiento']
+               for n in (10, 20)]
+    _fijar_fechas(app, {ids[0]: '2025-01-05 10:00:00', ids[1]: '2025-02-05 10:00:00'})
+
+    with app.test_request_context('/'):
+        corte = InventoryManager.tomar_corte()
+        assert corte['success']
+        conn = db_connection.get_connection()
+        conn.execute("UPDATE cortes_inventario SET fecha_corte = '2025-02-10 00:00:00'")
+        conn.commit()
+        salida = InventoryManager.registrar_movimiento(material, 'salida', 5)['id_movimiento']
+    _fijar_fechas(app, {salida: '2025-03-01 09:00:00'})
+
+    def cantidad(fecha):
+        with app.test_request_context('/'):
+            return next(e['cantidad'] for e in InventoryManager.obtener_existencias_en(fecha)
+                        if e['id_material'] == material)
+
+    assert cantidad('2024-12-31') == 0
+    assert cantidad('2025-01-31') == 10
+    assert cantidad('2025-02-20') == 30
+    assert cantidad('2025-03-01') == 25
+
+    datos = app.test_client().get('/api/inventario/existencias?fecha=2025-02-20').get_json()
+    lona = next(m for m in datos['materiales'] if m['id_material'] == material)
+    assert lona['valor_total'] == 30 * 12.5
+    assert app.test_client().get('/api/inventario/existencias?fecha=ayer').status_code == 400
+
+
+def test_movimientos_y_cortes_en_hora_local(app, material, hora_mexico):
+    with app.test_request_context('/'):
+        assert InventoryManager.tomar_corte()['success']
+        InventoryManager.registrar_movimiento(material, 'entrada', 50)
+        conn = db_connection.get_connection()
+        ahora = conn.execute("SELECT datetime('now','localtime')").fetchone()[0]
+        assert next(e['cantidad'] for e in InventoryManager.obtener_existencias_en(ahora)
+                    if e['id_material'] == material) == 50
+
+    datos = app.test_client().get('/api/inventario/existencias').get_json()
+    assert next(m['cantidad'] for m in datos['materiales'] if m['id_material'] == material) == 50
+
+
+def test_migracion_convierte_fechas_utc(hora_mexico):
+    conn = sqlite3.connect(':memory:')
+    cur = conn.cursor()
+    cur.execute("CREATE TABLE materiales (id_material INTEGER PRIMARY KEY)")
+    cur.execute(_sql_tabla_movimientos().replace(",'localtime'", ''))
+    cur.execute("""
+        INSERT INTO movimientos_inventario (id_material, tipo, cantidad, saldo, fecha)
+        VALUES (1, 'entrada', 5, 5, '2025-01-01 12:00:00')
+    """)
+    for trigger in _TRIGGERS_KARDEX:
+        cur.execute(trigger)
+
+    _kardex_en_hora_local(cur)
+
+    assert cur.execute("SELECT fecha FROM movimientos_inventario").fetchone()[0] == '2025-01-01 06:00:00'
+    sql = cur.execute("SELECT sql FROM sqlite_master WHERE name = 'movimientos_inventario'").fetchone()[0]
+    assert "datetime('now','localtime')" in sql
+    with pytest.raises(sqlite3.IntegrityError):
+        cur.execute("DELETE FROM movimientos_inventario")
@@ -0,0 +1,101 @@
+"""
+Paginación por clave en listados y APIs
+"""
+import pytest
+
+import db_connection
+from modules.orders_manager import OrdersManager
+from modules.quotation_manager import QuotationManager
+from modules.paginacion import paginar, decodificar_cursor, codificar_cursor, limitar_tamano
+
+
+@pytest.fixture
+def datos(app):
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        cur = conn.cursor()
+        clientes = []
+        for i in range(7):
+            cur.execute("INSERT INTO clientes (nombre_cliente) VALUES (?)", (f'CLIENTE {i}',))
+            clientes.append(cur.lastrowid)
+        conn.commit()
+
+        pedidos = [OrdersManager.crear_pedido(c, 20, 1, '2030-01-01')['id_pedido'] for c in clientes]
+        # Misma fecha de emisión: el id desempata
+        cotizaciones = [
+            QuotationManager.crear_cotizacion(c, [{'id_combinacion': 20, 'cantidad': 1, 'precio_unitario': 180}])
+            ['id_cotizacion'] for c in clientes
+        ]
+        conn.execute("UPDATE cotizaciones SET fecha_emision = '2030-01-01 10:00:00'")
+        conn.commit()
+    return {'clientes': clientes, 'pedidos': pedidos, 'cotizaciones': cotizaciones}
+
+
+def _recorrer(cliente, url, campo, tamano=3):
+    vistos = []
+    despues = ''
+    while True:
+        pagina = cliente.get(f'{url}?tamano={tamano}&despues={despues}').get_json()
+        assert len(pagina['items']) <= tamano
+        vistos.extend(item[campo] for item in pagina['items'])
+        if not pagina['siguiente']:
+            return vistos
+        despues = pagina['siguiente']
+
+
+def test_apis_recorren_todo_sin_repetir(app, datos):
+    cliente = app.test_client()
+
+    clientes = _recorrer(cliente, '/api/clientes', 'id_cliente')
+    assert clientes == sorted(clientes)
+    assert set(datos['clientes']) <= set(clientes)
+
+    assert _recorrer(cliente, '/api/pedidos', 'id_pedido') == sorted(datos['pedidos'], reverse=True)
+    assert _recorrer(cliente, '/api/cotizaciones', 'id_cotizacion') == sorted(datos['cotizaciones'], reverse=True)
+    assert _recorrer(cliente, '/api/reportes/pedidos', 'id_pedido') == sorted(datos['pedidos'], reverse=True)
+
+    # Solo los diseños con modelo válido (20, 18 y 15 en la base de ejemplo)
+    assert _recorrer(cliente, '/api/catalogo', 'id_combinacion', tamano=2) == [20, 18, 15]
+
+
+def test_paginas_html_enlazan_la_siguiente(app, datos):
+    cliente = app.test_client()
+    for url in ('/clientes', '/pedidos', '/cotizacion', '/reportes'):
+        primera = cliente.get(f'{url}?tamano=2')
+        assert primera.status_code == 200
+        assert b'Siguiente' in primera.data
+        assert b'Inicio' not in primera.data
+
+    pedidos = cliente.get('/api/pedidos?tamano=2').get_json()
+    segunda = cliente.get(f"/pedidos?tamano=2&despues={pedidos['siguiente']}")
+    assert b'Inicio' in segunda.data
+
+
+def test_cursor_invalido_y_tamano_maximo(app, datos):
+    cliente = app.test_client()
+    primera = cliente.get('/api/pedidos?tamano=3').get_json()
+    assert cliente.get('/api/pedidos?tamano=3&despues=basura').get_json() == primera
+    assert cliente.get('/api/pedidos?tamano=5000').get_json()['tamano'] == 100
+    assert limitar_tamano('0') == 1
+    assert decodificar_cursor(codificar_cursor((1, 2)), 1) is None
+
+
+def test_cursor_con_valores_no_enlazables(app, datos):
+    cliente = app.test_client()
+    apis = {'/api/clientes': 1, '/api/catalogo': 2, '/api/pedidos': 1,
+            '/api/cotizaciones': 2, '/api/reportes/pedidos': 1}
+    for url, longitud in apis.items():
+        primera = cliente.get(f'{url}?tamano=2').get_json()
+        for valor in ([1], {'a': 1}, None):
+            despues = codificar_cursor([valor] * longitud)
+            respuesta = cliente.get(f'{url}?tamano=2&despues={despues}')
+            assert respuesta.status_code == 200, url
+            assert respuesta.get_json() == primera, url
+
+
+def test_paginar_agrupa_lineas_del_mismo_registro():
+    filas = [{'id': 9}, {'id': 9}, {'id': 8}, {'id': 7}]
+    pagina = paginar(filas, 2, lambda f: (f['id'],))
+    assert pagina['items'] == filas[:3]
+    assert decodificar_cursor(pagina['siguiente'], 1) == (8,)
+    assert paginar(filas, 3, lambda f: (f['id'],))['siguiente'] is None
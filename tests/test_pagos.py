@@ -0,0 +1,103 @@
+"""
+Libro de pagos: total_pagado, saldo y estado_pago mantenidos por triggers
+"""
+import pytest
+
+import db_connection
+import mantenimiento_db
+from modules.orders_manager import OrdersManager
+from modules.payments_manager import PaymentsManager
+
+
+@pytest.fixture
+def pedido(app):
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        cur = conn.cursor()
+        cur.execute("INSERT INTO clientes (nombre_cliente) VALUES ('CLIENTE PAGOS')")
+        id_cliente = cur.lastrowid
+        conn.commit()
+        # combinación 20 es 'simple': 180 por pieza
+        return OrdersManager.crear_pedido(id_cliente, 20, 2, '2030-01-01', 'finalizado')['id_pedido']
+
+
+def _libro(id_pedido):
+    conn = db_connection.get_connection()
+    row = conn.execute(
+        "SELECT total, total_pagado, saldo, estado_pago FROM pedidos WHERE id_pedido = ?",
+        (id_pedido,)
+    ).fetchone()
+    conn.close()
+    return tuple(row)
+
+
+def test_triggers_mantienen_el_saldo(app, pedido):
+    with app.test_request_context('/'):
+        assert _libro(pedido) == (360, 0, 360, 'pendiente')
+
+        PaymentsManager.registrar_pago(pedido, 100.10, 'efectivo')
+        assert _libro(pedido) == (360, 100.1, 259.9, 'parcial')
+
+        # El excedente se recorta al saldo
+        resultado = PaymentsManager.registrar_pago(pedido, 1000, 'tarjeta')
+        assert resultado['monto'] == pytest.approx(259.9)
+        assert _libro(pedido) == (360, 360, 0, 'pagado')
+
+        conn = db_connection.get_connection()
+        conn.execute("DELETE FROM pagos WHERE id_pedido = ? AND metodo = 'efectivo'", (pedido,))
+        conn.commit()
+        assert _libro(pedido) == (360, 259.9, 100.1, 'parcial')
+
+        conn.execute("UPDATE pedidos SET total = 200 WHERE id_pedido = ?", (pedido,))
+        conn.commit()
+        assert _libro(pedido) == (200, 259.9, 0, 'pagado')
+
+
+def test_obtener_pedido_no_depende_del_orden_de_columnas(app, pedido):
+    # Las columnas del libro (y la huella) se agregaron al final de pedidos
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        id_cliente, fecha_pedido = conn.execute(
+            "SELECT id_cliente, fecha_pedido FROM pedidos WHERE id_pedido = ?", (pedido,)
+        ).fetchone()
+        assert OrdersManager.obtener_pedido(pedido) == {
+            'id_pedido': pedido,
+            'id_cliente': id_cliente,
+            'fecha_pedido': fecha_pedido,
+            'fecha_entrega': '2030-01-01',
+            'estado': 'finalizado',
+            'total': 360,
+            'nombre_cliente': 'CLIENTE PAGOS',
+            'nombre_producto': conn.execute(
+                "SELECT nombre_guardado FROM combinaciones WHERE id_combinacion = 20"
+            ).fetchone()[0] or 'Producto sin nombre',
+            'cantidad': 2
+        }
+
+    pagina = app.test_client().get(f'/editar_pedido/{pedido}').data
+    assert b'CLIENTE PAGOS' in pagina
+
+
+def test_listados_usan_el_libro(app, pedido):
+    cliente = app.test_client()
+    assert b'CLIENTE PAGOS' not in cliente.get('/facturacion').data
+
+    cliente.post(f'/registrar_pago/{pedido}', data={'metodo': 'efectivo', 'monto': '360'})
+    assert b'CLIENTE PAGOS' in cliente.get('/facturacion').data
+    assert b'CLIENTE PAGOS' in cliente.get('/pagos').data
+
+
+def test_verificar_y_reparar_saldos(app, pedido):
+    with app.test_request_context('/'):
+        PaymentsManager.registrar_pago(pedido, 50, 'efectivo')
+        conn = db_connection.get_connection()
+        # Desajuste deliberado: el libro dice 0 pagado
+        conn.execute("UPDATE pedidos SET total_pagado = 0 WHERE id_pedido = ?", (pedido,))
+        conn.commit()
+
+    assert mantenimiento_db.main(['saldos']) == 1
+    assert mantenimiento_db.main(['saldos', '--reparar']) == 0
+    assert mantenimiento_db.main(['saldos']) == 0
+
+    with app.test_request_context('/'):
+        assert _libro(pedido) == (360, 50, 310, 'parcial')
@@ -0,0 +1,88 @@
+"""
+PDFs con encabezado compartido (form XObject) y logo decodificado una vez
+"""
+import re
+
+import db_connection
+from modules import pdf_renderer
+from modules.orders_manager import OrdersManager
+from modules.quotation_manager import QuotationManager
+
+
+def _paginas(pdf):
+    return len(re.findall(rb'/Type /Page\b', pdf))
+
+
+def test_historial_largo_reutiliza_encabezado_y_logo(app):
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        cur = conn.cursor()
+        cur.execute("INSERT INTO clientes (nombre_cliente) VALUES ('CLIENTE PDF')")
+        id_cliente = cur.lastrowid
+        conn.commit()
+        for _ in range(40):
+            QuotationManager.crear_cotizacion(
+                id_cliente, [{'id_combinacion': 20, 'cantidad': 2, 'precio_unitario': 180}]
+            )
+
+    respuesta = app.test_client().get('/exportar_todas_cotizaciones')
+    pdf = respuesta.data
+    assert respuesta.status_code == 200 and pdf.startswith(b'%PDF')
+    assert _paginas(pdf) > 5
+    # Un solo encabezado y un solo logo en todo el documento
+    assert pdf.count(b'/Subtype /Form') == 1
+    assert pdf.count(b'/Subtype /Image') == 1
+    assert pdf_renderer.obtener_logo() is pdf_renderer.obtener_logo()
+
+
+def test_cotizacion_y_factura(app):
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        cur = conn.cursor()
+        cur.execute("INSERT INTO clientes (nombre_cliente, rfc) VALUES ('CLIENTE FACTURA', 'XAXX010101000')")
+        id_cliente = cur.lastrowid
+        conn.commit()
+        id_cotizacion = QuotationManager.crear_cotizacion(
+            id_cliente, [{'id_combinacion': c, 'cantidad': 1, 'precio_unitario': 200} for c in (20, 15, 18) * 6]
+        )['id_cotizacion']
+        id_pedido = OrdersManager.crear_pedido(id_cliente, 15, 3, '2030-01-01')['id_pedido']
+
+    cliente = app.test_client()
+    cotizacion = cliente.get(f'/exportar_cotizacion/{id_cotizacion}')
+    assert cotizacion.status_code == 200
+    assert _paginas(cotizacion.data) == 3
+    assert cliente.get('/exportar_cotizacion/999999').status_code == 404
+
+    factura = cliente.post(f'/generar_factura/{id_pedido}')
+    assert factura.status_code == 200
+    assert factura.data.startswith(b'%PDF') and _paginas(factura.data) == 1
+
+
+def test_historial_filtrado_por_lotes(app):
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        cur = conn.cursor()
+        cur.execute("INSERT INTO clientes (nombre_cliente) VALUES ('CLIENTE FILTRO')")
+        id_cliente = cur.lastrowid
+        conn.commit()
+        ids = [QuotationManager.crear_cotizacion(
+            id_cliente, [{'id_combinacion': 20, 'cantidad': n, 'precio_unitario': 180}]
+        )['id_cotizacion'] for n in range(1, 6)]
+        for id_cotizacion, fecha in zip(ids, ('2024-01-10', '2024-02-01', '2024-02-29 18:30:00',
+                                              '2024-03-01', '2023-12-31')):
+            conn.execute("UPDATE cotizaciones SET fecha_emision = ? WHERE id_cotizacion = ?",
+                         (fecha, id_cotizacion))
+        conn.execute("UPDATE cotizaciones SET estado = 'rechazada' WHERE id_cotizacion = ?", (ids[1],))
+        conn.commit()
+
+        filtros = ('2024-01-01', '2024-02-29', id_cliente)
+        cotizaciones = list(QuotationManager.iterar_cotizaciones(*filtros, lote=2))
+        assert [c['id_cotizacion'] for c in cotizaciones] == [ids[2], ids[1], ids[0]]
+        assert [c['cantidad_total'] for c in cotizaciones] == [3, 2, 1]
+        assert QuotationManager.contar_cotizaciones(*filtros) == 3
+        assert QuotationManager.contar_cotizaciones(*filtros, estado='rechazada') == 1
+
+    cliente = app.test_client()
+    respuesta = cliente.get(f'/exportar_todas_cotizaciones?desde=2024-01-01&id_cliente={id_cliente}&estado=pendiente')
+    assert respuesta.status_code == 200 and respuesta.data.startswith(b'%PDF')
+    assert cliente.get('/exportar_todas_cotizaciones?hasta=29-02-2024').status_code == 400
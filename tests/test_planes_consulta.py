@@ -0,0 +1,228 @@
+"""
+Regresión de planes de consulta: ninguna consulta de los managers o rutas
+debe recorrer completa (SCAN) una tabla que se filtra o se une por clave.
+Los recorridos legítimos (listados completos, agregados globales) se declaran
+explícitamente por caso.
+"""
+import re
+
+import pytest
+
+import db_connection
+from modules.orders_manager import OrdersManager
+from modules.quotation_manager import QuotationManager
+from modules.inventory_manager import InventoryManager
+from modules.bom_manager import BOMManager
+from modules.jobs_manager import JobsManager
+from modules.invoice_manager import InvoiceManager
+
+SENTENCIAS_ANALIZABLES = ('SELECT', 'UPDATE', 'DELETE', 'WITH')
+
+
+@pytest.fixture
+def sentencias(app, monkeypatch):
+    """
+    Registra cada sentencia SQL (con parámetros expandidos) que ejecuta el pool
+    """
+    capturadas = []
+    conectar_original = db_connection.PoolConexiones._conectar
+
+    def conectar_con_traza(self):
+        conn = conectar_original(self)
+        conn.set_trace_callback(capturadas.append)
+        return conn
+
+    monkeypatch.setattr(db_connection.PoolConexiones, '_conectar', conectar_con_traza)
+    db_connection.configurar()
+    return capturadas
+
+
+@pytest.fixture
+def datos(app):
+    """
+    Inserta un cliente con cotización, pedido y pago para ejercitar todas las consultas
+    """
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        cur = conn.cursor()
+        cur.execute("INSERT INTO clientes (nombre_cliente) VALUES ('CLIENTE PRUEBA')")
+        id_cliente = cur.lastrowid
+        conn.commit()
+
+    with app.test_request_context('/'):
+        cotizacion = QuotationManager.crear_cotizacion(
+            id_cliente, [{'id_combinacion': 20, 'cantidad': 3, 'precio_unitario': 180}]
+        )
+        pedido = OrdersManager.crear_pedido(id_cliente, 20, 3, '2030-01-01', 'finalizado')
+        conn = db_connection.get_connection()
+        conn.execute(
+            "INSERT INTO pagos (id_pedido, monto, metodo) VALUES (?, 100, 'efectivo')",
+            (pedido['id_pedido'],)
+        )
+        conn.commit()
+
+    return {
+        'id_cliente': id_cliente,
+        'id_cotizacion': cotizacion['id_cotizacion'],
+        'id_pedido': pedido['id_pedido'],
+    }
+
+
+def _recorridos(conn, sql):
+    """
+    Devuelve los nombres (tabla o alias) que el plan recorre completos
+    """
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    nombres = set()
+    for fila in plan:
+        coincidencia = re.match(r'SCAN (\w+)', fila[3])
+        if coincidencia and coincidencia.group(1) != 'CONSTANT':
+            nombres.add(coincidencia.group(1))
+    return nombres
+
+
+def _verificar(db_temporal, capturadas, permitidos):
+    conn = db_connection.PoolConexiones(db_temporal)._conectar()
+    try:
+        analizadas = 0
+        for sql in capturadas:
+            texto = sql.strip()
+            if not texto.upper().startswith(SENTENCIAS_ANALIZABLES):
+                continue
+            # Sentencias internas de FTS5 sobre sus tablas sombra
+            if "'main'." in texto:
+                continue
+            analizadas += 1
+            inesperados = _recorridos(conn, texto) - set(permitidos)
+            assert not inesperados, f"SCAN de {sorted(inesperados)} en:\n{texto}"
+        assert analizadas, "El caso no ejecutó ninguna consulta"
+    finally:
+        conn.close()
+
+
+# Recarga de la caché de referencia: lee las tablas completas una vez por versión
+RECARGA_REFERENCIA = {'modelos_bolsas', 'paletas_colores', 'colores'}
+
+# (id, llamada, recorridos permitidos)
+CASOS_MANAGERS = [
+    ('obtener_pedidos', lambda d: OrdersManager.obtener_pedidos(), {'p', 'pedidos'}),
+    # Página por clave: solo se recorre la subconsulta ya acotada
+    ('obtener_pedidos_pagina',
+     lambda d: OrdersManager.obtener_pedidos(10, d['id_pedido'] + 1), {'p'}),
+    ('obtener_pedido', lambda d: OrdersManager.obtener_pedido(d['id_pedido']), set()),
+    ('actualizar_pedido',
+     lambda d: OrdersManager.actualizar_pedido(d['id_pedido'], '2030-01-02', 'finalizado'), set()),
+    ('crear_pedido', lambda d: OrdersManager.crear_pedido(d['id_cliente'], 20, 1, '2030-01-01'), set()),
+    # Una sola pasada clasifica todos los pedidos (pedidos y su ventana n);
+    # 'todos' sin límite es un listado completo
+    ('obtener_pedidos_por_estado',
+     lambda d: OrdersManager.obtener_pedidos_por_estado(), {'pedidos', 'n', 'p'}),
+    ('obtener_pedidos_por_estado_pagina',
+     lambda d: OrdersManager.obtener_pedidos_por_estado(10, d['id_pedido'] + 1), {'pedidos', 'n', 'p'}),
+    # Lee solo tablas de resumen: ni pedidos ni detalle_pedido se recorren
+    ('obtener_estadisticas_dashboard',
+     lambda d: OrdersManager.obtener_estadisticas_dashboard(), {'resumen_estado', 'resumen_cliente', 'rp'}),
+    ('obtener_cotizaciones', lambda d: QuotationManager.obtener_cotizaciones(), {'c', 'cotizaciones'}),
+    ('obtener_cotizaciones_pagina',
+     lambda d: QuotationManager.obtener_cotizaciones(10, ('2100-01-01', 0)), {'c'}),
+    ('iterar_cotizaciones', lambda d: list(QuotationManager.iterar_cotizaciones()), {'c'}),
+    ('iterar_cotizaciones_filtradas', lambda d: list(QuotationManager.iterar_cotizaciones(
+        '2020-01-01', '2100-01-01', d['id_cliente'], 'pendiente')), set()),
+    ('contar_cotizaciones_filtradas',
+     lambda d: QuotationManager.contar_cotizaciones('2020-01-01', None, d['id_cliente']), set()),
+    ('obtener_cotizacion_detalle',
+     lambda d: QuotationManager.obtener_cotizacion_detalle(d['id_cotizacion']), set()),
+    ('aprobar_cotizacion',
+     lambda d: QuotationManager.actualizar_estado_cotizacion(d['id_cotizacion'], 'aprobada'), set()),
+    # Lote: se recorre solo la lista de ids recibida
+    ('aprobar_cotizaciones',
+     lambda d: QuotationManager.aprobar_cotizaciones([d['id_cotizacion']]), {'json_each'}),
+    ('duplicar_cotizacion', lambda d: QuotationManager.duplicar_cotizacion(d['id_cotizacion']), set()),
+    # Modelos desde la caché de referencia: solo se listan las combinaciones
+    ('obtener_productos_disponibles',
+     lambda d: QuotationManager.obtener_productos_disponibles(), {'combinaciones', *RECARGA_REFERENCIA}),
+    ('generar_reporte_cotizaciones',
+     lambda d: QuotationManager.generar_reporte_cotizaciones('2000-01-01', '2100-01-01'), set()),
+    ('obtener_inventario_completo', lambda d: InventoryManager.obtener_inventario_completo(), {'m'}),
+    ('obtener_materiales', lambda d: InventoryManager.obtener_materiales(), {'materiales'}),
+    ('verificar_disponibilidad', lambda d: InventoryManager.verificar_disponibilidad(1, 5), set()),
+    # Salida: UPDATE condicional sobre ux_inventario_material (las entradas son un UPSERT)
+    ('actualizar_stock', lambda d: InventoryManager.actualizar_stock(1, -5), set()),
+    ('obtener_kardex', lambda d: InventoryManager.obtener_kardex(1), set()),
+    # Un paso por material; sus movimientos desde el último corte son un rango del índice
+    ('obtener_existencias_en',
+     lambda d: InventoryManager.obtener_existencias_en('2100-01-01'), {'m'}),
+    # Se recorre solo el diccionario recibido (json_each)
+    ('calcular_costo_produccion',
+     lambda d: InventoryManager.calcular_costo_produccion({1: 2, 2: 1}), {'j'}),
+    # Solo se recorren los ids recibidos y las líneas ya filtradas por índice
+    ('calcular_requerimientos',
+     lambda d: BOMManager.calcular_requerimientos([d['id_pedido']], [d['id_cotizacion']]),
+     {'json_each', 'lineas', 'b'}),
+    # Solo se recorre el conjunto recibido; reservas e inventario por índice
+    ('verificar_requerimientos',
+     lambda d: InventoryManager.verificar_requerimientos({1: 5, 2: 1}, 'pedido', d['id_pedido'], 10),
+     {'json_each', 'r'}),
+    ('liberar_reserva', lambda d: InventoryManager.liberar_reserva('pedido', d['id_pedido']), set()),
+    ('obtener_trabajo', lambda d: JobsManager.obtener('no-existe'), set()),
+    ('registrar_trabajo', lambda d: JobsManager._registrar('t1', 'factura', {}, 'clave', 'huella'), set()),
+    ('obtener_factura', lambda d: InvoiceManager.obtener_factura(d['id_pedido']), set()),
+    ('registrar_factura', lambda d: InvoiceManager._registrar(d['id_pedido']), set()),
+    ('registrar_lote_facturas',
+     lambda d: InvoiceManager._registrar_lote([d['id_pedido']]), {'json_each'}),
+    ('modificar_material', lambda d: InventoryManager.modificar_material(1, 'Tela cuadrillé', 'tela', 'm', 25, None), set()),
+    # Umbral global: compara la cantidad de cada material
+    ('obtener_materiales_bajo_stock', lambda d: InventoryManager.obtener_materiales_bajo_stock(), set()),
+    ('obtener_alertas_stock', lambda d: InventoryManager.obtener_alertas_stock(0), set()),
+    ('eliminar_cotizacion', lambda d: QuotationManager.eliminar_cotizacion(d['id_cotizacion']), set()),
+    ('eliminar_pedido', lambda d: OrdersManager.eliminar_pedido(d['id_pedido']), set()),
+]
+
+
+@pytest.mark.parametrize('llamada,permitidos',
+                         [c[1:] for c in CASOS_MANAGERS], ids=[c[0] for c in CASOS_MANAGERS])
+def test_planes_managers(app, datos, sentencias, db_temporal, llamada, permitidos):
+    with app.test_request_context('/'):
+        llamada(datos)
+    _verificar(db_temporal, sentencias, permitidos)
+
+
+# (id, método, url, recorridos permitidos)
+CASOS_RUTAS = [
+    # Historial: últimos 50 pagos recorriendo idx_pagos_fecha
+    ('pagos', 'get', '/pagos', {'pg'}),
+    ('facturacion', 'get', '/facturacion', set()),
+    ('registrar_pago', 'post_pago', '/registrar_pago/{id_pedido}', set()),
+    ('colores_paleta', 'get', '/api/colores_paleta/1', RECARGA_REFERENCIA),
+    ('eliminar_cliente', 'get', '/eliminar_cliente/{id_cliente}', set()),
+    ('eliminar_combinacion', 'post', '/eliminar_combinacion/15', set()),
+    ('generar_factura', 'post', '/generar_factura/{id_pedido}', set()),
+]
+
+
+@pytest.mark.parametrize('metodo,url,permitidos',
+                         [c[1:] for c in CASOS_RUTAS], ids=[c[0] for c in CASOS_RUTAS])
+def test_planes_rutas(app, datos, sentencias, db_temporal, metodo, url, permitidos):
+    cliente = app.test_client()
+    url = url.format(**datos)
+    if metodo == 'get':
+        cliente.get(url)
+    elif metodo == 'post_pago':
+        cliente.post(url, data={'metodo': 'efectivo', 'monto': '10'})
+    else:
+        cliente.post(url)
+    _verificar(db_temporal, sentencias, permitidos)
+
+
+def test_diseno_color_busca_por_indice(app, sentencias, db_temporal):
+    cliente = app.test_client()
+    cliente.post('/diseno_color', data={
+        'esquema_color': 'armonico',
+        'modelo_bolsa': '1',
+        'nombre_combinacion': 'Nueva prueba',
+        'color_principal': '#123456',
+        'color_asa': '#000000',
+    })
+    consultas = [s for s in sentencias if 'WHERE' in s]
+    assert consultas
+    _verificar(db_temporal, consultas, set())
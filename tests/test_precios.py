@@ -0,0 +1,88 @@
+"""
+Precios por modelo con escalas por volumen
+"""
+import db_connection
+from modules.orders_manager import OrdersManager
+from modules.pricing_manager import PricingManager
+
+
+def _escala(app, id_modelo, cantidad_minima, precio):
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        conn.execute("""
+            INSERT INTO precios_modelo (id_modelo, cantidad_minima, precio_unitario)
+            VALUES (?, ?, ?)
+        """, (id_modelo, cantidad_minima, precio))
+        conn.commit()
+
+
+def test_precios_base_migrados(app):
+    with app.test_request_context('/'):
+        lineas = PricingManager.cotizar_lineas([
+            {'id_combinacion': 20, 'cantidad': 2},
+            {'id_combinacion': '15', 'cantidad': '1'},
+            {'id_combinacion': 9999, 'cantidad': 1},
+        ])
+    assert [(l['id_modelo'], l['precio_unitario'], l['subtotal']) for l in lineas] == [
+        (1, 180.0, 360.0), (2, 220.0, 220.0), (None, 180.0, 180.0)
+    ]
+
+
+def test_escalas_por_volumen(app):
+    _escala(app, 1, 10, 160.0)
+    _escala(app, 1, 50, 150.0)
+
+    with app.test_request_context('/'):
+        assert [PricingManager.precio_unitario(1, c) for c in (1, 9, 10, 49, 50, 500)] == [
+            180.0, 180.0, 160.0, 160.0, 150.0, 150.0
+        ]
+        pedido = OrdersManager.crear_pedido(1, 20, 12, '2030-01-01')
+        assert pedido['total'] == 12 * 160.0
+        assert OrdersManager.crear_pedido(1, 9999, 1, '2030-01-01')['success'] is False
+
+    productos = app.test_client().get('/api/productos_cotizacion').get_json()
+    blue = next(p for p in productos if p['id_combinacion'] == 20)
+    assert blue['precio'] == 180.0
+    assert blue['escalas'] == [
+        {'cantidad_minima': 1, 'precio': 180.0},
+        {'cantidad_minima': 10, 'precio': 160.0},
+        {'cantidad_minima': 50, 'precio': 150.0},
+    ]
+
+
+def test_cotizacion_de_muchas_lineas_en_una_consulta(app):
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        cur = conn.cursor()
+        cur.execute("INSERT INTO clientes (nombre_cliente) VALUES ('CLIENTE PRECIOS')")
+        id_cliente = cur.lastrowid
+        conn.commit()
+        PricingManager.precio_unitario(1)   # caché cargada
+
+        sentencias = []
+        conn.set_trace_callback(sentencias.append)
+        lineas = PricingManager.cotizar_lineas(
+            [{'id_combinacion': (20, 15, 18)[i % 3], 'cantidad': 1} for i in range(60)]
+        )
+        conn.set_trace_callback(None)
+
+    assert len(lineas) == 60
+    assert len([s for s in sentencias if 'FROM combinaciones' in s]) == 1
+
+    datos = {'id_cliente': id_cliente}
+    for i in range(1, 4):
+        datos[f'productos[{i}][id_combinacion]'] = (20, 15, 18)[i - 1]
+        datos[f'productos[{i}][cantidad]'] = 2
+    app.test_client().post('/generar_cotizacion', data=datos)
+
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        precios = conn.execute("""
+            SELECT d.costo_unitario
+            FROM detalle_cotizacion d
+            JOIN cotizaciones c ON c.id_cotizacion = d.id_cotizacion
+            WHERE c.id_cliente = ?
+            ORDER BY d.id_material
+        """, (id_cliente,)).fetchall()
+    # Combinaciones 15, 18 y 20: modelos combinado, especial y simple
+    assert [p[0] for p in precios] == [220.0, 250.0, 180.0]
@@ -0,0 +1,62 @@
+"""
+Caché de modelos, paletas y colores invalidada por el contador versiones_datos
+"""
+import db_connection
+from modules.reference_cache import ReferenceCache
+
+
+def _contar_consultas(app, funcion):
+    """Ejecuta funcion en una solicitud nueva y cuenta las sentencias SQL"""
+    sentencias = []
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        conn.set_trace_callback(sentencias.append)
+        resultado = funcion()
+        conn.set_trace_callback(None)
+    return resultado, sentencias
+
+
+def test_mapas_de_referencia(app):
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        id_color, codigo_hex = conn.execute(
+            "SELECT id_color, codigo_hex FROM colores ORDER BY id_color LIMIT 1"
+        ).fetchone()
+        tipo = conn.execute("SELECT tipo FROM modelos_bolsas WHERE id_modelo = 1").fetchone()[0]
+
+        assert ReferenceCache.id_color(codigo_hex) == id_color
+        assert ReferenceCache.hex_color(id_color) == codigo_hex
+        assert ReferenceCache.tipo_modelo(1) == tipo
+        assert ReferenceCache.tipo_modelo(None) is None
+
+
+def test_solo_revisa_el_contador_mientras_no_cambie(app):
+    _contar_consultas(app, ReferenceCache.modelos)
+
+    modelos, sentencias = _contar_consultas(app, lambda: (ReferenceCache.modelos(),
+                                                         ReferenceCache.paletas(),
+                                                         ReferenceCache.id_color('#000000')))
+    assert modelos[0]
+    assert sentencias == ["SELECT version FROM versiones_datos WHERE nombre = 'referencia'"]
+
+
+def test_cambios_invalidan_la_cache(app):
+    with app.test_request_context('/'):
+        assert ReferenceCache.id_color('#ABCDEF') is None
+
+    # Escritura desde otra conexión, como lo haría otro worker
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        cur = conn.cursor()
+        cur.execute("INSERT INTO colores (nombre_color, codigo_hex, id_paleta) VALUES ('Prueba', '#ABCDEF', 1)")
+        id_color = cur.lastrowid
+        cur.execute("UPDATE modelos_bolsas SET tipo = 'especial' WHERE id_modelo = 1")
+        conn.commit()
+
+    with app.test_request_context('/'):
+        assert ReferenceCache.id_color('#ABCDEF') == id_color
+        assert ReferenceCache.tipo_modelo(1) == 'especial'
+        assert {'nombre': 'Prueba', 'hex': '#ABCDEF'} in ReferenceCache.colores_paleta(1)
+
+    respuesta = app.test_client().get('/api/colores_paleta/1').get_json()
+    assert {'nombre': 'Prueba', 'hex': '#ABCDEF'} in respuesta
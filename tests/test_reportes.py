@@ -0,0 +1,61 @@
+"""
+Clasificación de pedidos para /reportes en una sola pasada
+"""
+from datetime import datetime, timedelta
+
+import db_connection
+from modules.orders_manager import OrdersManager
+
+
+def _dia(delta):
+    return (datetime.now() + timedelta(days=delta)).strftime('%Y-%m-%d')
+
+
+def test_grupos_limitados_con_conteos(app):
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        cur = conn.cursor()
+        cur.execute("INSERT INTO clientes (nombre_cliente) VALUES ('CLIENTE REPORTES')")
+        id_cliente = cur.lastrowid
+        conn.commit()
+
+        def pedido(dias, estado):
+            return OrdersManager.crear_pedido(id_cliente, 20, 1, _dia(dias), estado)['id_pedido']
+
+        por_entregar = [pedido(d, 'pendiente') for d in (9, 3, 0, 7, 5, 1, 2)]
+        entregados = [pedido(d, 'entregado') for d in (-4, -1, -9)]
+        vencidos = [pedido(d, e) for d, e in ((-2, 'en_proceso'), (-8, 'finalizado'))]
+        pedido(-3, 'cancelado')
+        pedido(4, 'cancelado')
+
+        datos = OrdersManager.obtener_pedidos_por_estado(limite_grupo=5)
+
+    assert datos['conteos'] == {'por_entregar': 7, 'entregados': 3, 'vencidos': 2, 'todos': 14}
+
+    # Por entregar: la entrega más próxima primero, solo 5
+    assert [p[0] for p in datos['por_entregar']] == [
+        por_entregar[2], por_entregar[5], por_entregar[6], por_entregar[1], por_entregar[4]
+    ]
+    # Entregados: el más reciente primero; vencidos: el más atrasado primero
+    assert [p[0] for p in datos['entregados']] == [entregados[1], entregados[0], entregados[2]]
+    assert [p[0] for p in datos['vencidos']] == [vencidos[1], vencidos[0]]
+
+    fila = datos['vencidos'][0]
+    assert fila[1:3] == ('CLIENTE REPORTES', 'Blue Simple')
+    assert fila[4:6] == (_dia(-8), 'finalizado')
+    assert len(datos['todos']) == 14
+
+
+def test_pagina_de_reportes_muestra_conteos(app):
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        cur = conn.cursor()
+        cur.execute("INSERT INTO clientes (nombre_cliente) VALUES ('CLIENTE VENCIDO')")
+        id_cliente = cur.lastrowid
+        conn.commit()
+        for dias in range(1, 8):
+            OrdersManager.crear_pedido(id_cliente, 20, 1, _dia(-dias), 'pendiente')
+
+    html = app.test_client().get('/reportes').get_data(as_text=True)
+    assert 'Ver todos (7)' in html
+    assert html.count('class="fecha-vencida"') == 5
@@ -0,0 +1,100 @@
+"""
+Tablas de resumen del dashboard: deben coincidir con los agregados sobre pedidos
+"""
+import db_connection
+import mantenimiento_db
+from modules.orders_manager import OrdersManager
+
+
+def _estadisticas_por_agregado(conn):
+    """
+    Cálculo directo sobre pedidos y detalle_pedido (el que hacía el dashboard)
+    """
+    cur = conn.cursor()
+    por_estado = {
+        row[0]: {'cantidad': row[1], 'monto': round(row[2] or 0, 2)}
+        for row in cur.execute("SELECT estado, COUNT(*), SUM(total) FROM pedidos GROUP BY estado")
+    }
+    mes = cur.execute("""
+        SELECT COUNT(*), COALESCE(SUM(total), 0) FROM pedidos
+        WHERE strftime('%Y-%m', fecha_pedido) = strftime('%Y-%m', 'now') AND estado != 'cancelado'
+    """).fetchone()
+    return {
+        'total_pedidos': cur.execute(
+            "SELECT COUNT(*) FROM pedidos WHERE estado != 'cancelado'").fetchone()[0],
+        'por_estado': por_estado,
+        'ingresos_totales': cur.execute(
+            "SELECT COALESCE(SUM(total), 0) FROM pedidos WHERE estado = 'entregado'").fetchone()[0],
+        'pedidos_mes': mes[0],
+        'ingresos_mes': mes[1],
+        'clientes_activos': cur.execute(
+            "SELECT COUNT(DISTINCT id_cliente) FROM pedidos WHERE estado != 'cancelado'").fetchone()[0],
+        'productos_top': [tuple(r) for r in cur.execute("""
+            SELECT COALESCE(comb.nombre_guardado, 'Diseño sin nombre'), SUM(dp.cantidad) AS total_vendido
+            FROM detalle_pedido dp
+            LEFT JOIN pedidos p ON dp.id_pedido = p.id_pedido
+            LEFT JOIN combinaciones comb ON dp.id_producto = comb.id_combinacion
+            WHERE p.estado != 'cancelado'
+            GROUP BY dp.id_producto HAVING total_vendido > 0
+            ORDER BY total_vendido DESC LIMIT 5
+        """)],
+        'ventas_mensuales': [tuple(r) for r in cur.execute("""
+            SELECT strftime('%Y-%m', fecha_pedido) AS mes, COUNT(*), COALESCE(SUM(total), 0)
+            FROM pedidos
+            WHERE fecha_pedido >= date('now', '-6 months') AND estado != 'cancelado'
+            GROUP BY mes ORDER BY mes ASC
+        """)],
+    }
+
+
+def _comparar(app):
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        esperado = _estadisticas_por_agregado(conn)
+        conn.close()
+        obtenido = OrdersManager.obtener_estadisticas_dashboard()
+    assert obtenido == esperado
+
+
+def test_resumenes_siguen_los_cambios(app):
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        cur = conn.cursor()
+        cur.execute("INSERT INTO clientes (nombre_cliente) VALUES ('CLIENTE A')")
+        cliente_a = cur.lastrowid
+        cur.execute("INSERT INTO clientes (nombre_cliente) VALUES ('CLIENTE B')")
+        cliente_b = cur.lastrowid
+        conn.commit()
+
+        p1 = OrdersManager.crear_pedido(cliente_a, 20, 3, '2030-01-01')['id_pedido']
+        p2 = OrdersManager.crear_pedido(cliente_b, 15, 2, '2030-01-01', 'entregado')['id_pedido']
+        p3 = OrdersManager.crear_pedido(cliente_b, 20, 1, '2030-01-01')['id_pedido']
+        # Pedido de hace meses: solo cuenta en ventas_mensuales
+        cur.execute("UPDATE pedidos SET fecha_pedido = date('now', '-2 months') WHERE id_pedido = ?", (p3,))
+        conn.commit()
+    _comparar(app)
+
+    with app.test_request_context('/'):
+        OrdersManager.actualizar_pedido(p1, '2030-01-01', 'cancelado')
+    _comparar(app)
+
+    with app.test_request_context('/'):
+        OrdersManager.actualizar_pedido(p1, '2030-01-01', 'entregado')
+        OrdersManager.eliminar_pedido(p2)
+    _comparar(app)
+
+
+def test_reconstruir_resumenes(app):
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        cur = conn.cursor()
+        cur.execute("INSERT INTO clientes (nombre_cliente) VALUES ('CLIENTE C')")
+        id_cliente = cur.lastrowid
+        conn.commit()
+        OrdersManager.crear_pedido(id_cliente, 20, 4, '2030-01-01')
+        conn.execute("DELETE FROM resumen_producto")
+        conn.execute("UPDATE resumen_estado SET pedidos = 99")
+        conn.commit()
+
+    assert mantenimiento_db.main(['resumenes']) == 0
+    _comparar(app)
@@ -0,0 +1,62 @@
+"""
+Traza de SQL por solicitud: conteo, formas repetidas y posibles N+1
+"""
+import pytest
+
+from modules import sql_monitor
+
+
+@pytest.fixture
+def app_traza(app):
+    app.config['SQL_TRAZA'] = True
+    yield app
+    app.config['SQL_TRAZA'] = None
+
+
+def test_normalizar_sql_agrupa_valores():
+    a = sql_monitor.normalizar_sql("SELECT * FROM pagos WHERE id_pedido = 3 AND metodo = 'efectivo'")
+    b = sql_monitor.normalizar_sql("SELECT *  FROM pagos\n WHERE id_pedido = 15 AND metodo = 'tarjeta'")
+    assert a == b
+    assert sql_monitor.normalizar_sql("WHERE id IN (?, ?, ?)") == "WHERE id IN (?)"
+
+
+def test_traza_marca_n1():
+    traza = sql_monitor.TrazaSQL('/prueba', umbral_n1=3)
+    for id_pedido in range(4):
+        traza.registrar(f"SELECT SUM(monto) FROM pagos WHERE id_pedido = {id_pedido}", 0.001)
+    traza.registrar("SELECT * FROM pedidos", 0.01)
+
+    resumen = traza.resumen()
+    assert resumen['consultas'] == 5
+    assert resumen['lentas'][0]['sql'] == "SELECT * FROM pedidos"
+    assert resumen['posibles_n1'] == [{
+        'sql': "SELECT SUM(monto) FROM pagos WHERE id_pedido = ?",
+        'veces': 4,
+        'tiempo_ms': 4.0,
+    }]
+
+
+def test_cabeceras_y_endpoint(app_traza):
+    cliente = app_traza.test_client()
+    respuesta = cliente.get('/inventario')
+    assert int(respuesta.headers['X-SQL-Consultas']) > 0
+    assert 'X-SQL-Tiempo-Ms' in respuesta.headers
+    assert respuesta.headers['X-SQL-N1'] == '0'
+
+    debug = cliente.get('/_debug/sql').get_json()
+    assert debug['solicitudes'][0]['ruta'] == '/inventario'
+
+
+def test_escrituras_cuentan_en_la_solicitud(app_traza):
+    cliente = app_traza.test_client()
+    respuesta = cliente.post('/agregar_material', data={
+        'nombre_material': 'Hilo traza', 'tipo': 'hilo', 'unidad_medida': 'metro', 'costo_unitario': '2'
+    })
+    reciente = cliente.get('/_debug/sql').get_json()['solicitudes'][0]
+    assert reciente['ruta'] == '/agregar_material'
+    assert any('INSERT INTO materiales' in s['sql'] for s in reciente['lentas'])
+    assert int(respuesta.headers['X-SQL-Consultas']) >= 2
+
+
+def test_endpoint_oculto_sin_traza(app):
+    assert app.test_client().get('/_debug/sql').status_code == 404
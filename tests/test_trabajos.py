@@ -0,0 +1,131 @@
+"""
+Trabajos de exportación en segundo plano con reutilización por huella
+"""
+import os
+import time
+
+import db_connection
+from modules import jobs_manager
+from modules.jobs_manager import JobsManager
+from modules.orders_manager import OrdersManager
+from modules.quotation_manager import QuotationManager
+
+
+def _esperar(cliente, id_trabajo, limite=15):
+    fin = time.time() + limite
+    while time.time() < fin:
+        estado = cliente.get(f'/api/jobs/{id_trabajo}').get_json()
+        if estado['estado'] in ('terminado', 'error'):
+            return estado
+        time.sleep(0.05)
+    raise AssertionError('El trabajo no terminó a tiempo')
+
+
+def _crear_trabajo(cliente, tipo, parametros=None):
+    return cliente.post('/api/jobs', json={'tipo': tipo, 'parametros': parametros or {}})
+
+
+def test_historial_en_segundo_plano_y_reutilizacion(app):
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        cur = conn.cursor()
+        cur.execute("INSERT INTO clientes (nombre_cliente) VALUES ('CLIENTE TRABAJOS')")
+        id_cliente = cur.lastrowid
+        conn.commit()
+        QuotationManager.crear_cotizacion(id_cliente, [{'id_combinacion': 20, 'cantidad': 1, 'precio_unitario': 180}])
+
+    cliente = app.test_client()
+    respuesta = _crear_trabajo(cliente, 'historial_cotizaciones', {'id_cliente': str(id_cliente), 'estado': ''})
+    assert respuesta.status_code == 202
+    trabajo = respuesta.get_json()
+    assert trabajo['reutilizado'] is False
+
+    estado = _esperar(cliente, trabajo['id_trabajo'])
+    assert (estado['estado'], estado['progreso']) == ('terminado', 1)
+    assert estado['parametros'] == {'id_cliente': id_cliente}
+    descarga = cliente.get(estado['url_resultado'])
+    assert descarga.status_code == 200 and descarga.data.startswith(b'%PDF')
+
+    # Misma solicitud con los datos sin cambios: mismo trabajo
+    repetido = _crear_trabajo(cliente, 'historial_cotizaciones', {'id_cliente': id_cliente}).get_json()
+    assert repetido == {**trabajo, 'reutilizado': True}
+
+    # Una cotización nueva cambia la huella y descarta el resultado viejo
+    with app.test_request_context('/'):
+        QuotationManager.crear_cotizacion(id_cliente, [{'id_combinacion': 15, 'cantidad': 2, 'precio_unitario': 220}])
+    nuevo = _crear_trabajo(cliente, 'historial_cotizaciones', {'id_cliente': id_cliente}).get_json()
+    assert nuevo['id_trabajo'] != trabajo['id_trabajo']
+    assert _esperar(cliente, nuevo['id_trabajo'])['estado'] == 'terminado'
+    assert cliente.get(f"/api/jobs/{trabajo['id_trabajo']}").status_code == 404
+    assert os.listdir(os.path.join(os.path.dirname(db_connection.DB_PATH), 'trabajos')) == [
+        f"{nuevo['id_trabajo']}.pdf"
+    ]
+
+
+def test_excel_factura_y_errores(app):
+    cliente = app.test_client()
+
+    excel = _crear_trabajo(cliente, 'inventario_excel').get_json()
+    estado = _esperar(cliente, excel['id_trabajo'])
+    assert estado['estado'] == 'terminado'
+    assert cliente.get(estado['url_resultado']).data[:2] == b'PK'
+
+    factura = _crear_trabajo(cliente, 'factura', {'id_pedido': 999999}).get_json()
+    estado = _esperar(cliente, factura['id_trabajo'])
+    assert estado['estado'] == 'error'
+    assert cliente.get(f"/api/jobs/{factura['id_trabajo']}/resultado").status_code == 409
+
+    assert _crear_trabajo(cliente, 'factura').status_code == 400
+    assert _crear_trabajo(cliente, 'factura', {'id_pedido': 'abc'}).status_code == 400
+    assert _crear_trabajo(cliente, 'respaldo').status_code == 400
+    assert cliente.get('/api/jobs/no-existe').status_code == 404
+
+
+def test_trabajos_sin_escritor_grupal(app, monkeypatch):
+    monkeypatch.setattr(db_connection, 'GROUP_COMMIT', False)
+    with app.test_request_context('/'):
+        conn = db_connection.get_connection()
+        cur = conn.cursor()
+        cur.execute("INSERT INTO clientes (nombre_cliente) VALUES ('CLIENTE TRABAJOS')")
+        conn.commit()
+        id_pedido = OrdersManager.crear_pedido(cur.lastrowid, 20, 1, '2030-01-01')['id_pedido']
+
+    cliente = app.test_client()
+    excel = _crear_trabajo(cliente, 'inventario_excel').get_json()
+    estado = _esperar(cliente, excel['id_trabajo'])
+    assert (estado['estado'], estado['progreso']) == ('terminado', 1)
+    assert _crear_trabajo(cliente, 'inventario_excel').get_json()['reutilizado'] is True
+
+    # El trabajo de factura emite la factura (escribe en facturas)
+    factura = _crear_trabajo(cliente, 'factura', {'id_pedido': id_pedido}).get_json()
+    estado = _esperar(cliente, factura['id_trabajo'])
+    assert estado['estado'] == 'terminado'
+    assert cliente.get(estado['url_resultado']).data.startswith(b'%PDF')
+
+
+def test_solicitud_igual_durante_el_registro_reutiliza(app, monkeypatch):
+    # Sin ejecutar los trabajos, para que el primero siga pendiente
+    enviados = []
+    monkeypatch.setattr(jobs_manager, '_obtener_pool',
+                        lambda: type('Pool', (), {'submit': lambda self, *a: enviados.append(a[2])})())
+
+    # La segunda solicitud llega justo cuando el escritor terminó de registrar la primera
+    escribir_original = jobs_manager.escribir
+    segunda = []
+
+    def escribir_y_repetir(funcion, *args, **kwargs):
+        resultado = escribir_original(funcion, *args, **kwargs)
+        if funcion == JobsManager._registrar and not segunda:
+            segunda.append(None)
+            segunda[0] = JobsManager.enviar(app, 'inventario_excel')
+        return resultado
+
+    monkeypatch.setattr(jobs_manager, 'escribir', escribir_y_repetir)
+    with app.app_context():
+        primera = JobsManager.enviar(app, 'inventario_excel')
+    try:
+        assert segunda[0] == {**primera, 'reutilizado': True}
+        assert enviados == [primera['id_trabajo']]
+    finally:
+        for id_trabajo in enviados:
+            jobs_manager._en_curso.discard(id_trabajo)